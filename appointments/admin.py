@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Appointment
+from .models import Appointment, PatientAppointmentStats
 
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
@@ -7,3 +7,10 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_filter = ['status', 'appointment_date']
     search_fields = ['appointment_id', 'patient__first_name', 'patient__last_name']
     readonly_fields = ['appointment_id', 'created_at', 'updated_at']
+
+
+@admin.register(PatientAppointmentStats)
+class PatientAppointmentStatsAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'total', 'completed', 'no_show', 'cancelled', 'updated_at']
+    search_fields = ['patient__patient_id', 'patient__first_name', 'patient__last_name']
+    readonly_fields = ['patient', 'total', 'completed', 'no_show', 'cancelled', 'updated_at']
@@ -1,43 +1,91 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from .models import Appointment
+from .availability import SlotUnavailable, claims_slot, free_slots, reserve
 from .serializers import AppointmentSerializer
-import joblib
-import os
-from django.conf import settings
+from ml_models.features import noshow_matrix
+from ml_models.predict import NoShowPrediction
 
 class AppointmentViewSet(viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
     
+    def perform_create(self, serializer):
+        self._book(serializer)
+    
+    def perform_update(self, serializer):
+        self._book(serializer)
+    
+    def _book(self, serializer):
+        """
+        Save through reserve() when the change claims a slot, so that two
+        requests cannot take one slot
+        """
+        instance = serializer.instance
+        data = serializer.validated_data
+        
+        def current(field):
+            return data[field] if field in data else getattr(instance, field, None)
+        
+        if not claims_slot(
+            instance, current('doctor').pk, current('appointment_date'), current('appointment_time'),
+            current('status'),
+        ):
+            serializer.save()
+            return
+        try:
+            reserve(
+                current('doctor').pk, current('appointment_date'), current('appointment_time'),
+                serializer.save, exclude=instance.pk if instance else None,
+            )
+        except SlotUnavailable as e:
+            raise ValidationError({'appointment_time': [str(e)]})
+    
+    @action(detail=False, methods=['get'])
+    def free_slots(self, request):
+        """Next free slots: ?specialization=&doctor=&count=10&days=14"""
+        try:
+            count = min(int(request.query_params.get('count', 10)), 100)
+            days = min(int(request.query_params.get('days', 14)), 60)
+            doctor = request.query_params.get('doctor')
+            doctor = int(doctor) if doctor else None
+        except ValueError:
+            return Response({'error': 'count, days and doctor must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if count < 1 or days < 1:
+            return Response({'error': 'count and days must be positive'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        slots = free_slots(
+            specialization=request.query_params.get('specialization'),
+            doctor_id=doctor, count=count, days=days,
+        )
+        return Response({
+            'slots': [
+                {
+                    'doctor': slot['doctor'],
+                    'date': slot['date'].isoformat(),
+                    'start': slot['start'].strftime('%H:%M'),
+                    'end': slot['end'].strftime('%H:%M'),
+                }
+                for slot in slots
+            ],
+        })
+    
     @action(detail=True, methods=['post'])
     def predict_noshow(self, request, pk=None):
         appointment = self.get_object()
         
         try:
-            model_path = os.path.join(settings.ML_MODELS_PATH, 'noshow_prediction_model.pkl')
-            model = joblib.load(model_path)
-            
-            previous_no_shows = Appointment.objects.filter(
-                patient=appointment.patient,
-                status='no_show'
-            ).count()
-            
-            features = [[
-                appointment.patient.age,
-                float(appointment.distance_from_hospital or 5),
-                1 if appointment.weather_condition == 'rainy' else 0,
-                previous_no_shows,
-                1 if appointment.sms_sent else 0,
-            ]]
-            
-            probability = model.predict_proba(features)[0][1]
+            _, features = noshow_matrix(Appointment.objects.filter(pk=appointment.pk))
+            result = NoShowPrediction().predict_noshow_matrix(features)[0]
             
             return Response({
                 'appointment_id': appointment.appointment_id,
-                'no_show_probability': float(probability),
-                'risk_level': 'High' if probability > 0.7 else 'Medium' if probability > 0.4 else 'Low',
+                'no_show_probability': result['noshow_probability'],
+                'risk_level': result['risk_level'],
             })
         except Exception as e:
             return Response(
@@ -0,0 +1,263 @@
+"""
+Doctor availability as bitmaps
+
+A doctor's schedule (available_days, available_time_start/end) is parsed
+into a weekday bitmask (bit 0 = Monday) and a day bitmap with one bit per
+APPOINTMENT_SLOT_MINUTES slot of working time. Booked appointments are
+turned into a bitmap per doctor and date with one query over the window,
+so the free slots of a day are `working & ~booked` and finding the next N
+free slots of a specialization is bit arithmetic over a few hundred
+integers.
+
+An appointment occupies the slot its time falls in. book() and reserve()
+check the slot and save while holding a row lock on the doctor, so
+concurrent bookings of the same doctor are serialized and cannot both take
+the last free slot.
+"""
+
+import heapq
+import re
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from doctors.models import Doctor
+
+from .models import Appointment
+
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+# Appointments that do not hold their slot
+FREE_STATUSES = ['cancelled']
+
+
+class SlotUnavailable(Exception):
+    """The requested appointment slot is outside the schedule or taken"""
+
+
+def slot_minutes():
+    return getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30)
+
+
+def weekday_mask(available_days):
+    """
+    Bitmask of the weekdays in 'Mon,Tue,Wed' (full names, any case and
+    ranges such as 'Mon-Fri' are accepted; unknown names are ignored)
+    """
+    mask = 0
+    for part in re.split(r'[,;/\s]+', (available_days or '').lower()):
+        bounds = [WEEKDAYS.index(name[:3]) for name in part.split('-') if name[:3] in WEEKDAYS]
+        if not bounds:
+            continue
+        first, last = bounds[0], bounds[-1]
+        day = first
+        while True:
+            mask |= 1 << day
+            if day == last:
+                break
+            day = (day + 1) % 7
+    return mask
+
+
+def slot_index(at, minutes=None):
+    """Slot of the day a time falls in"""
+    return (at.hour * 60 + at.minute) // (minutes or slot_minutes())
+
+
+def slot_time(index, minutes=None):
+    start = index * (minutes or slot_minutes())
+    return time(start // 60, start % 60)
+
+
+def working_bitmap(start, end, minutes=None):
+    """Bits of the slots that start at or after `start` and end by `end`"""
+    minutes = minutes or slot_minutes()
+    first = -(-(start.hour * 60 + start.minute) // minutes)
+    last = (end.hour * 60 + end.minute) // minutes
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+class Schedule:
+    __slots__ = ('doctor_id', 'weekdays', 'slots')
+
+    def __init__(self, doctor_id, available_days, start, end, minutes=None):
+        self.doctor_id = doctor_id
+        self.weekdays = weekday_mask(available_days)
+        self.slots = working_bitmap(start, end, minutes)
+
+    def working(self, day):
+        """Slot bitmap of a date"""
+        return self.slots if self.weekdays >> day.weekday() & 1 else 0
+
+
+def schedules(doctors):
+    """Schedules of a Doctor queryset, read with one query"""
+    minutes = slot_minutes()
+    return [
+        Schedule(pk, days, start, end, minutes)
+        for pk, days, start, end in doctors.values_list(
+            'id', 'available_days', 'available_time_start', 'available_time_end'
+        )
+    ]
+
+
+def booked_bitmaps(doctor_ids, start, end, exclude=None):
+    """{(doctor id, date): bitmap of booked slots} for dates in [start, end]"""
+    minutes = slot_minutes()
+    appointments = Appointment.objects.filter(
+        doctor_id__in=doctor_ids, appointment_date__gte=start, appointment_date__lte=end,
+    ).exclude(status__in=FREE_STATUSES)
+    if exclude is not None:
+        appointments = appointments.exclude(pk=exclude)
+    booked = {}
+    for doctor_id, day, at in appointments.values_list('doctor_id', 'appointment_date', 'appointment_time'):
+        key = (doctor_id, day)
+        booked[key] = booked.get(key, 0) | 1 << slot_index(at, minutes)
+    return booked
+
+
+def slot_bits(bitmap):
+    """Indexes of the set bits, lowest first"""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+def free_slots(specialization=None, doctor_id=None, count=10, days=14, now=None):
+    """
+    The next `count` free slots within `days` days, earliest first.
+
+    Args:
+        specialization: only doctors with this specialization
+        doctor_id: only this doctor
+
+    Returns:
+        list of dicts with doctor id, date, start and end time
+    """
+    now = timezone.localtime(now)
+    minutes = slot_minutes()
+    doctors = Doctor.objects.filter(is_available=True)
+    if specialization:
+        doctors = doctors.filter(specialization=specialization)
+    if doctor_id is not None:
+        doctors = doctors.filter(pk=doctor_id)
+    doctor_schedules = [schedule for schedule in schedules(doctors) if schedule.weekdays and schedule.slots]
+    if not doctor_schedules:
+        return []
+
+    first_day = now.date()
+    last_day = first_day + timedelta(days=days - 1)
+    booked = booked_bitmaps([schedule.doctor_id for schedule in doctor_schedules], first_day, last_day)
+    # Slots of today that have started are gone
+    past = (1 << (slot_index(now.time(), minutes) + 1)) - 1
+
+    found = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        wanted = count - len(found)
+        # Max-heap (negated) of the `wanted` earliest slots of the day so far
+        day_slots = []
+        for schedule in doctor_schedules:
+            free = schedule.working(day) & ~booked.get((schedule.doctor_id, day), 0)
+            if offset == 0:
+                free &= ~past
+            for index in slot_bits(free):
+                if len(day_slots) < wanted:
+                    heapq.heappush(day_slots, (-index, -schedule.doctor_id))
+                elif index < -day_slots[0][0]:
+                    heapq.heapreplace(day_slots, (-index, -schedule.doctor_id))
+                else:
+                    # This doctor's later slots are no earlier than all kept
+                    break
+        for index, doctor in sorted((-index, -doctor) for index, doctor in day_slots):
+            start = datetime.combine(day, slot_time(index, minutes))
+            found.append({
+                'doctor': doctor,
+                'date': day,
+                'start': start.time(),
+                'end': (start + timedelta(minutes=minutes)).time(),
+            })
+        if len(found) >= count:
+            break
+    return found
+
+
+def check_slot(doctor, day, at, exclude=None):
+    """Raise SlotUnavailable unless `doctor` can see a patient at `at` on `day`"""
+    minutes = slot_minutes()
+    if not doctor.is_available:
+        raise SlotUnavailable('The doctor is not taking appointments')
+    schedule = Schedule(
+        doctor.pk, doctor.available_days, doctor.available_time_start, doctor.available_time_end, minutes
+    )
+    index = slot_index(at, minutes)
+    if not schedule.working(day) >> index & 1:
+        raise SlotUnavailable(
+            f'The doctor does not work at {at.strftime("%H:%M")} on {day.strftime("%A")}s'
+        )
+    if booked_bitmaps([doctor.pk], day, day, exclude=exclude).get((doctor.pk, day), 0) >> index & 1:
+        start = slot_time(index, minutes)
+        raise SlotUnavailable(f'The {start.strftime("%H:%M")} slot of {day} is already booked')
+
+
+def reserve(doctor_id, day, at, save, exclude=None):
+    """
+    Call `save` once the slot is checked, inside a transaction that holds a
+    row lock on the doctor, so concurrent bookings of the same doctor are
+    checked one after the other.
+
+    Args:
+        exclude: pk of the appointment being rescheduled
+
+    Raises:
+        SlotUnavailable: when the slot is outside the schedule or taken
+    """
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    if isinstance(at, str):
+        at = time.fromisoformat(at)
+    with transaction.atomic():
+        doctor = Doctor.objects.select_for_update().get(pk=doctor_id)
+        check_slot(doctor, day, at, exclude=exclude)
+        return save()
+
+
+def claims_slot(stored, doctor_id, day, at, status):
+    """
+    Whether saving an appointment takes a slot it does not hold yet: a new
+    appointment, one moved to another doctor, date or time, or one
+    reopened after it was cancelled. Other updates (status changes, notes)
+    need no slot check.
+
+    Args:
+        stored: the appointment as saved before this change, or None
+    """
+    if status in FREE_STATUSES:
+        return False
+    if stored is None or stored.status in FREE_STATUSES:
+        return True
+    return (stored.doctor_id, stored.appointment_date, stored.appointment_time) != (doctor_id, day, at)
+
+
+def book(appointment):
+    """
+    Save an appointment, checking its slot when it claims one (see
+    claims_slot).
+    """
+    stored = Appointment.objects.filter(pk=appointment.pk).first() if appointment.pk else None
+    if not claims_slot(
+        stored, appointment.doctor_id, appointment.appointment_date, appointment.appointment_time,
+        appointment.status,
+    ):
+        appointment.save()
+    else:
+        reserve(
+            appointment.doctor_id, appointment.appointment_date, appointment.appointment_time,
+            appointment.save, exclude=appointment.pk,
+        )
+    return appointment
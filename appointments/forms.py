@@ -1,5 +1,6 @@
 from django import forms
 from .models import Appointment
+from .availability import SlotUnavailable, check_slot, claims_slot
 
 class AppointmentForm(forms.ModelForm):
     class Meta:
@@ -13,3 +14,18 @@ class AppointmentForm(forms.ModelForm):
             'appointment_time': forms.TimeInput(attrs={'type': 'time'}),
             'reason': forms.Textarea(attrs={'rows': 3}),
         }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        doctor = cleaned_data.get('doctor')
+        day = cleaned_data.get('appointment_date')
+        at = cleaned_data.get('appointment_time')
+        status = cleaned_data.get('status', self.instance.status)
+        stored = self.instance if self.instance.pk else None
+        if doctor and day and at and claims_slot(stored, doctor.pk, day, at, status):
+            # Early feedback; book() checks again under the doctor's lock
+            try:
+                check_slot(doctor, day, at, exclude=self.instance.pk)
+            except SlotUnavailable as e:
+                self.add_error('appointment_time', str(e))
+        return cleaned_data
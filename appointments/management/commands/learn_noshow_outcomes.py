@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from appointments.services import learn_noshow_outcomes, mark_learned_outcomes
+from ml_models import versions
+from ml_models.online import DEFAULT_LEARNING_RATE, OnlineNoShowModel
+import time
+
+class Command(BaseCommand):
+    help = 'Update the online no-show model from completed and no-show appointments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Outcomes learned per batch (default: 1000)')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when there are no new outcomes (default: 5)')
+        parser.add_argument('--checkpoint-every', type=int, default=500,
+                            help='Write a checkpoint after this many new outcomes (default: 500)')
+        parser.add_argument('--checkpoint-interval', type=float, default=60.0,
+                            help='Write a checkpoint at least this often, in seconds, while learning (default: 60)')
+        parser.add_argument('--learning-rate', type=float, default=DEFAULT_LEARNING_RATE,
+                            help=f'SGD step size for a new online model (default: {DEFAULT_LEARNING_RATE})')
+        parser.add_argument('--once', action='store_true',
+                            help='Learn the pending outcomes, checkpoint and exit instead of running as a worker')
+
+    def handle(self, *args, **options):
+        online = self._open(options)
+        last_checkpoint = time.monotonic()
+        try:
+            while True:
+                if versions.current_version() != online.version:
+                    # Another version was activated: continue from its coefficients
+                    self._checkpoint(online)
+                    online = self._open(options)
+
+                learned = learn_noshow_outcomes(online, batch_size=options['batch_size'])
+                due = (
+                    online.unsaved >= options['checkpoint_every']
+                    or time.monotonic() - last_checkpoint >= options['checkpoint_interval']
+                    or not learned
+                )
+                if online.unsaved and due:
+                    self._checkpoint(online)
+                    last_checkpoint = time.monotonic()
+                if learned:
+                    continue
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self._checkpoint(online)
+            self.stdout.write('Stopped')
+
+    def _open(self, options):
+        try:
+            online = OnlineNoShowModel(learning_rate=options['learning_rate'])
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(f'No no-show model to learn from: {e}')
+        self.stdout.write(
+            f"Online no-show model for version {online.version or '(unversioned)'}: "
+            f"{online.state['samples']} outcomes learned so far"
+        )
+        return online
+
+    def _checkpoint(self, online):
+        if not online.unsaved:
+            return
+        learned = online.unsaved
+        path = online.checkpoint()
+        # Only now: a crash before the checkpoint leaves them to be learned again
+        mark_learned_outcomes(online)
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Checkpointed after {learned} new outcomes ({online.state['samples']} in total) to {path}"
+        ))
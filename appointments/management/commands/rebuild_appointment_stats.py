@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from appointments.services import rebuild_patient_stats
+import time
+
+class Command(BaseCommand):
+    help = 'Recount the per-patient appointment outcome stats and correct any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('patients', nargs='*', type=int,
+                            help='Patient ids to recount (default: all)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows per bulk write batch (default: 1000)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        changes = rebuild_patient_stats(options['patients'] or None, chunk_size=options['chunk_size'])
+
+        created = 0
+        for patient_id, (stored, counts) in changes.items():
+            if stored is None:
+                created += 1
+                continue
+            self.stdout.write(self.style.WARNING(
+                f"⚠ Patient {patient_id}: " + ', '.join(
+                    f'{field} {stored[field]} -> {counts[field]}'
+                    for field in counts if stored[field] != counts[field]
+                )
+            ))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Rebuilt patient appointment stats ({created} created, '
+            f'{len(changes) - created} corrected) in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from appointments.services import rescore_upcoming_appointments
+import time
+
+class Command(BaseCommand):
+    help = 'Re-score no-show probability for all open appointments in the next N days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+                            help='Number of days ahead to re-score (default: 7)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows per bulk_update batch (default: 1000)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rescore_upcoming_appointments(
+            days=options['days'],
+            chunk_size=options['chunk_size'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Re-scored {count} appointments in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoShowOutcome',
+            fields=[
+                ('appointment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='noshow_outcome', serialize=False, to='appointments.appointment')),
+                ('did_come', models.BooleanField()),
+                ('distance_from_hospital', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('weather_condition', models.CharField(blank=True, max_length=50)),
+                ('previous_no_shows', models.IntegerField(default=0)),
+                ('sms_sent', models.BooleanField(default=False)),
+                ('recorded_at', models.DateTimeField(db_index=True)),
+                ('learned_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'db_table': 'noshow_outcomes',
+                'ordering': ['recorded_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def build_stats(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    PatientAppointmentStats = apps.get_model('appointments', 'PatientAppointmentStats')
+    rows = (
+        Appointment.objects.values('patient_id')
+        .annotate(
+            total=models.Count('id'),
+            completed=models.Count('id', filter=models.Q(status='completed')),
+            no_show=models.Count('id', filter=models.Q(status='no_show')),
+            cancelled=models.Count('id', filter=models.Q(status='cancelled')),
+        )
+        .order_by()
+    )
+    now = timezone.now()
+    PatientAppointmentStats.objects.bulk_create(
+        [PatientAppointmentStats(updated_at=now, **row) for row in rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0002_risk_score_queue'),
+        ('appointments', '0003_noshow_outcome'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientAppointmentStats',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='appointment_stats', serialize=False, to='patients.patient')),
+                ('total', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('no_show', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'patient appointment stats',
+                'db_table': 'patient_appointment_stats',
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from patients.models import Patient
 from doctors.models import Doctor
 
@@ -11,6 +12,9 @@ class Appointment(models.Model):
         ('no_show', 'No Show'),
     ]
     
+    # Final statuses that tell whether the patient came (see NoShowOutcome)
+    OUTCOME_STATUSES = ['completed', 'no_show']
+    
     appointment_id = models.CharField(max_length=20, unique=True, editable=False)
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointments')
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='appointments')
@@ -34,14 +38,123 @@ class Appointment(models.Model):
         ordering = ['appointment_date', 'appointment_time']
     
     def save(self, *args, **kwargs):
-        if not self.appointment_id:
-            last_appointment = Appointment.objects.order_by('-id').first()
-            if last_appointment:
-                last_id = int(last_appointment.appointment_id.split('-')[1])
-                self.appointment_id = f'APT-{last_id + 1:06d}'
-            else:
-                self.appointment_id = 'APT-000001'
-        super().save(*args, **kwargs)
+        # The patient's PatientAppointmentStats change in the same transaction
+        with transaction.atomic():
+            if not self.appointment_id:
+                last_appointment = Appointment.objects.order_by('-id').first()
+                if last_appointment:
+                    last_id = int(last_appointment.appointment_id.split('-')[1])
+                    self.appointment_id = f'APT-{last_id + 1:06d}'
+                else:
+                    self.appointment_id = 'APT-000001'
+            super().save(*args, **kwargs)
+            # Learned by the online no-show model (learn_noshow_outcomes)
+            if self.status in self.OUTCOME_STATUSES:
+                NoShowOutcome.record(self)
     
     def __str__(self):
         return f"{self.appointment_id} - {self.patient.full_name} - Dr. {self.doctor.user.get_full_name()}"
+
+
+class NoShowOutcome(models.Model):
+    """
+    Whether the patient came to a finalized appointment, with the no-show
+    features as they were when the outcome was recorded
+    """
+    appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, primary_key=True, related_name='noshow_outcome')
+    did_come = models.BooleanField()
+    distance_from_hospital = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    weather_condition = models.CharField(max_length=50, blank=True)
+    previous_no_shows = models.IntegerField(default=0)
+    sms_sent = models.BooleanField(default=False)
+    recorded_at = models.DateTimeField(db_index=True)
+    learned_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    
+    class Meta:
+        db_table = 'noshow_outcomes'
+        ordering = ['recorded_at']
+    
+    def __str__(self):
+        return f"{self.appointment_id} - {'came' if self.did_come else 'no show'}"
+    
+    @classmethod
+    def record(cls, appointment):
+        """
+        Record the outcome of a finalized appointment. Saving it again with
+        the same outcome changes nothing; a corrected outcome is recorded
+        again and learned again.
+        """
+        did_come = appointment.status == 'completed'
+        if cls.objects.filter(appointment_id=appointment.pk, did_come=did_come).exists():
+            return
+        no_shows = PatientAppointmentStats.no_show_counts([appointment.patient_id])
+        previous_no_shows = max(
+            no_shows.get(appointment.patient_id, 0) - (appointment.status == 'no_show'), 0
+        )
+        cls.objects.update_or_create(appointment_id=appointment.pk, defaults={
+            'did_come': did_come,
+            'distance_from_hospital': appointment.distance_from_hospital,
+            'weather_condition': appointment.weather_condition,
+            'previous_no_shows': previous_no_shows,
+            'sms_sent': appointment.sms_sent,
+            'recorded_at': timezone.now(),
+            'learned_at': None,
+        })
+
+
+class PatientAppointmentStats(models.Model):
+    """
+    Outcome counts of a patient's appointments, kept current by the signal
+    handlers in appointments.signals and rebuilt by rebuild_appointment_stats
+    """
+    # Counter field -> the status it counts (None counts every appointment)
+    COUNTED_STATUSES = {
+        'total': None,
+        'completed': 'completed',
+        'no_show': 'no_show',
+        'cancelled': 'cancelled',
+    }
+    
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='appointment_stats')
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    no_show = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'patient_appointment_stats'
+        verbose_name_plural = 'patient appointment stats'
+    
+    def __str__(self):
+        return f"{self.patient_id}: {self.total} appointments, {self.no_show} no-shows"
+    
+    @classmethod
+    def counts(cls, status):
+        """{counter field: 1} for one appointment with this status"""
+        return {
+            field: 1 for field, counted in cls.COUNTED_STATUSES.items()
+            if counted is None or counted == status
+        }
+    
+    @classmethod
+    def no_show_counts(cls, patient_ids):
+        """
+        Map patient id -> number of no-show appointments, read from the stats
+        rows. Patients without a row (no appointment saved through the ORM
+        yet, or rows written by bulk_create) are counted from Appointment.
+        """
+        patient_ids = set(patient_ids)
+        counts = dict(
+            cls.objects.filter(patient_id__in=patient_ids).values_list('patient_id', 'no_show')
+        )
+        missing = patient_ids - set(counts)
+        if missing:
+            counts.update(
+                Appointment.objects
+                .filter(patient_id__in=missing, status='no_show')
+                .values('patient_id')
+                .annotate(no_shows=models.Count('id'))
+                .values_list('patient_id', 'no_shows')
+            )
+        return counts
@@ -0,0 +1,220 @@
+"""
+Bulk ML scoring, online learning and patient appointment stats services
+for appointments
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from ml_models.features import noshow_matrix, noshow_matrix_from_values
+from ml_models.predict import NoShowPrediction
+from .models import Appointment, NoShowOutcome, PatientAppointmentStats
+
+OPEN_STATUSES = ['scheduled', 'confirmed']
+
+
+def rescore_upcoming_appointments(days=7, chunk_size=1000, start=None):
+    """
+    Recompute no_show_probability for every open appointment in the next `days` days.
+
+    The feature matrix for all appointments is scored in a single model call
+    and the results are written back with bulk_update in chunks of
+    `chunk_size` rows.
+
+    Returns:
+        number of appointments scored
+    """
+    start = start or date.today()
+    upcoming = Appointment.objects.filter(
+        appointment_date__gte=start,
+        appointment_date__lte=start + timedelta(days=days),
+        status__in=OPEN_STATUSES,
+    )
+    ids, matrix = noshow_matrix(upcoming)
+    if not ids:
+        return 0
+
+    probabilities = np.round(NoShowPrediction().noshow_probabilities(matrix), 2)
+
+    updates = [
+        Appointment(id=appointment_id, no_show_probability=Decimal(f'{probability:.2f}'))
+        for appointment_id, probability in zip(ids, probabilities.tolist())
+    ]
+    for offset in range(0, len(updates), chunk_size):
+        with transaction.atomic():
+            Appointment.objects.bulk_update(
+                updates[offset:offset + chunk_size], ['no_show_probability']
+            )
+    return len(updates)
+
+
+def learn_noshow_outcomes(online_model, batch_size=1000):
+    """
+    Feed up to `batch_size` not yet learned outcomes into the online no-show model.
+
+    The batch is not marked as learned here: it is added to
+    online_model.pending and marked by mark_learned_outcomes() once the
+    model has been checkpointed, so that outcomes learned by a worker that
+    dies before its next checkpoint are learned again. Outcomes pending in
+    this worker are skipped meanwhile.
+
+    Returns:
+        number of outcomes learned
+    """
+    started = timezone.now()
+    pending_ids = [appointment_id for _, ids in online_model.pending for appointment_id in ids]
+    outcomes = list(
+        NoShowOutcome.objects
+        .filter(learned_at__isnull=True)
+        .exclude(appointment_id__in=pending_ids)
+        .order_by('recorded_at')
+        .values_list(
+            'appointment_id', 'distance_from_hospital', 'weather_condition',
+            'sms_sent', 'previous_no_shows', 'did_come',
+        )[:batch_size]
+    )
+    if not outcomes:
+        return 0
+
+    ids = [outcome[0] for outcome in outcomes]
+    # The no-show count was snapshotted per outcome, so it is keyed by appointment
+    X = noshow_matrix_from_values(
+        [outcome[:4] for outcome in outcomes],
+        {outcome[0]: outcome[4] for outcome in outcomes},
+    )
+    y = np.array([outcome[5] for outcome in outcomes], dtype=np.int64)
+    online_model.learn(X, y)
+    online_model.pending.append((started, ids))
+    return len(outcomes)
+
+
+def mark_learned_outcomes(online_model):
+    """
+    Mark the outcomes learned since the last checkpoint as learned; call it
+    right after online_model.checkpoint(). An outcome recorded again
+    (corrected) after its batch was read stays unlearned.
+
+    Returns:
+        number of outcomes marked
+    """
+    marked = 0
+    now = timezone.now()
+    for started, ids in online_model.pending:
+        marked += NoShowOutcome.objects.filter(
+            appointment_id__in=ids,
+            recorded_at__lte=started,
+        ).update(learned_at=now)
+    online_model.pending = []
+    return marked
+
+
+def stats_deltas(old, new):
+    """
+    Changes to PatientAppointmentStats when an appointment goes from `old`
+    to `new`, each a (patient id, status) pair or None (not saved / deleted).
+
+    Returns:
+        {patient id: {counter field: delta}} without zero deltas
+    """
+    deltas = {}
+    for values, sign in [(old, -1), (new, 1)]:
+        if values is None:
+            continue
+        patient_id, status = values
+        fields = deltas.setdefault(patient_id, {})
+        for field, count in PatientAppointmentStats.counts(status).items():
+            fields[field] = fields.get(field, 0) + sign * count
+    return {
+        patient_id: {field: delta for field, delta in fields.items() if delta}
+        for patient_id, fields in deltas.items()
+        if any(fields.values())
+    }
+
+
+def apply_stats_deltas(deltas):
+    """
+    Add deltas to the stats rows with UPDATE ... SET field = field + delta.
+    A patient without a row yet gets one recounted from Appointment, which
+    already includes the change. If a concurrent transaction creates that
+    row first, its recount cannot see this uncommitted change, so the
+    deltas are added to its row instead.
+    """
+    for patient_id, fields in deltas.items():
+        if add_stats_deltas(patient_id, fields):
+            continue
+        counts = patient_stats_rows([patient_id]).get(patient_id)
+        if counts is None:
+            continue
+        try:
+            # Savepoint: a conflict must not abort the appointment's transaction
+            with transaction.atomic():
+                PatientAppointmentStats.objects.create(patient_id=patient_id, **counts)
+        except IntegrityError:
+            add_stats_deltas(patient_id, fields)
+
+
+def add_stats_deltas(patient_id, fields):
+    """F() update of one patient's row; False when the row does not exist"""
+    updates = {field: F(field) + delta for field, delta in fields.items()}
+    return bool(
+        PatientAppointmentStats.objects.filter(patient_id=patient_id).update(updated_at=timezone.now(), **updates)
+    )
+
+
+def patient_stats_rows(patient_ids=None):
+    """{patient id: {counter field: count}} counted from Appointment"""
+    appointments = Appointment.objects.all()
+    if patient_ids is not None:
+        appointments = appointments.filter(patient_id__in=patient_ids)
+    aggregates = {
+        field: Count('id') if status is None else Count('id', filter=Q(status=status))
+        for field, status in PatientAppointmentStats.COUNTED_STATUSES.items()
+    }
+    return {
+        row.pop('patient_id'): row
+        for row in appointments.values('patient_id').annotate(**aggregates).order_by()
+    }
+
+
+def rebuild_patient_stats(patient_ids=None, chunk_size=1000):
+    """
+    Recount PatientAppointmentStats from Appointment, for some patients or
+    (patient_ids=None) everyone. Rows of patients without appointments are
+    deleted.
+
+    Returns:
+        {patient id: (stored counts or None, recounted counts)} for the rows
+        that were created, corrected or deleted
+    """
+    fields = list(PatientAppointmentStats.COUNTED_STATUSES)
+    with transaction.atomic():
+        # Locked before counting: signal deltas of appointments the count
+        # cannot see wait for the rebuild and are added to the new counts
+        stored = PatientAppointmentStats.objects.select_for_update()
+        if patient_ids is not None:
+            stored = stored.filter(patient_id__in=patient_ids)
+        stored = {row[0]: dict(zip(fields, row[1:])) for row in stored.values_list('patient_id', *fields)}
+        counted = patient_stats_rows(patient_ids)
+
+        changes = {}
+        create, update = [], []
+        for patient_id, counts in counted.items():
+            if stored.get(patient_id) == counts:
+                continue
+            changes[patient_id] = (stored.get(patient_id), counts)
+            rows = update if patient_id in stored else create
+            rows.append(PatientAppointmentStats(patient_id=patient_id, updated_at=timezone.now(), **counts))
+        removed = set(stored) - set(counted)
+        for patient_id in removed:
+            changes[patient_id] = (stored[patient_id], dict.fromkeys(fields, 0))
+
+        PatientAppointmentStats.objects.filter(patient_id__in=removed).delete()
+        # Rows created meanwhile by the signal handlers already hold current counts
+        PatientAppointmentStats.objects.bulk_create(create, batch_size=chunk_size, ignore_conflicts=True)
+        PatientAppointmentStats.objects.bulk_update(update, fields + ['updated_at'], batch_size=chunk_size)
+    return changes
@@ -0,0 +1,35 @@
+"""
+Signal handlers keeping PatientAppointmentStats current
+"""
+
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Appointment
+from .services import apply_stats_deltas, stats_deltas
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_stats_values(sender, instance, using, raw, **kwargs):
+    instance._stats_values = None
+    if raw or instance.pk is None:
+        return
+    stored = sender.objects.using(using).filter(pk=instance.pk)
+    if connections[using].in_atomic_block:
+        # Concurrent saves of one appointment must not both count its old status
+        stored = stored.select_for_update()
+    instance._stats_values = stored.values_list('patient_id', 'status').first()
+
+
+@receiver(post_save, sender=Appointment)
+def count_saved_appointment(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    old_values = None if created else getattr(instance, '_stats_values', None)
+    apply_stats_deltas(stats_deltas(old_values, (instance.patient_id, instance.status)))
+
+
+@receiver(post_delete, sender=Appointment)
+def count_deleted_appointment(sender, instance, **kwargs):
+    apply_stats_deltas(stats_deltas((instance.patient_id, instance.status), None))
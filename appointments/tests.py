@@ -0,0 +1,198 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import User
+from doctors.models import Doctor
+from patients.models import Patient
+
+from . import services
+from .availability import free_slots
+from .models import Appointment, NoShowOutcome, PatientAppointmentStats
+
+
+def add_doctor(username, start):
+    user = User.objects.create(username=username, role='doctor')
+    return Doctor.objects.create(
+        user=user, license_number=username, specialization='general', qualification='MD',
+        consultation_fee=100, available_days='Mon-Fri',
+        available_time_start=start, available_time_end=time(17, 0),
+    )
+
+
+def add_patient(first_name='Abebe'):
+    return Patient.objects.create(
+        first_name=first_name, last_name='Kebede', date_of_birth=date(1980, 1, 1), gender='M',
+        phone='0911000000', address='Addis Ababa', emergency_contact_name='Almaz',
+        emergency_contact_phone='0911000001',
+    )
+
+
+class RescoreUpcomingAppointmentsTest(TestCase):
+    def setUp(self):
+        doctor = add_doctor('doctor', time(8, 0))
+        self.patient = add_patient()
+        self.appointments = {}
+        statuses = [(22, 9, 'scheduled'), (23, 9, 'confirmed'), (23, 10, 'no_show'), (31, 9, 'scheduled')]
+        for day, hour, status in statuses:
+            self.appointments[(day, hour)] = Appointment.objects.create(
+                patient=self.patient, doctor=doctor, appointment_date=date(2024, 1, day),
+                appointment_time=time(hour, 0), reason='Checkup', status=status,
+                distance_from_hospital=day, weather_condition='rainy',
+            )
+
+    def probability(self, day, hour):
+        return Appointment.objects.get(pk=self.appointments[(day, hour)].pk).no_show_probability
+
+    def test_open_appointments_in_the_window_are_scored_in_one_call(self):
+        # The probability is the distance / 100, so each row's score is recognizable
+        noshow_probabilities = mock.Mock(side_effect=lambda matrix: matrix[:, 0] / 100)
+        with mock.patch.object(services.NoShowPrediction, 'noshow_probabilities', noshow_probabilities):
+            self.assertEqual(services.rescore_upcoming_appointments(days=7, chunk_size=1, start=date(2024, 1, 22)), 2)
+
+        noshow_probabilities.assert_called_once()
+        matrix = noshow_probabilities.call_args.args[0]
+        # distance, previous no-shows, sms sent, weather code
+        self.assertEqual(sorted(matrix.tolist()), [[22, 1, 0, 1], [23, 1, 0, 1]])
+        self.assertEqual(self.probability(22, 9), Decimal('0.22'))
+        self.assertEqual(self.probability(23, 9), Decimal('0.23'))
+        self.assertIsNone(self.probability(23, 10))
+        self.assertIsNone(self.probability(31, 9))
+
+
+class FreeSlotsTest(TestCase):
+    def test_earliest_slots_across_doctors(self):
+        """A doctor listed after `count` slots were found still fills them with earlier slots"""
+        late_1 = add_doctor('late1', time(13, 0))
+        late_2 = add_doctor('late2', time(13, 0))
+        early = add_doctor('early', time(8, 0))
+        # Monday 06:00, before anyone's first slot
+        now = timezone.make_aware(datetime(2024, 1, 22, 6, 0))
+
+        slots = free_slots(specialization='general', count=3, now=now)
+
+        self.assertEqual(
+            [(slot['doctor'], slot['start']) for slot in slots],
+            [(early.pk, time(8, 0)), (early.pk, time(8, 30)), (early.pk, time(9, 0))],
+        )
+        self.assertTrue(all(slot['date'] == date(2024, 1, 22) for slot in slots))
+        self.assertNotIn(late_1.pk, [slot['doctor'] for slot in slots])
+        self.assertNotIn(late_2.pk, [slot['doctor'] for slot in slots])
+
+
+class PatientAppointmentStatsTest(TestCase):
+    def test_row_created_concurrently(self):
+        """Losing the race to create a patient's row adds the deltas to the winner's row"""
+        patient = add_patient()
+        doctor = add_doctor('doctor', time(8, 0))
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, appointment_date=date(2024, 1, 22),
+            appointment_time=time(9, 0), reason='Checkup',
+        )
+        # The row (total 1) was committed by another transaction booking for this patient
+        update = services.add_stats_deltas
+        calls = []
+
+        def add_stats_deltas(patient_id, fields):
+            # The first UPDATE ran before the other transaction committed its row
+            calls.append(patient_id)
+            return len(calls) > 1 and update(patient_id, fields)
+
+        with mock.patch.object(services, 'add_stats_deltas', add_stats_deltas):
+            services.apply_stats_deltas({patient.pk: {'total': 1}})
+
+        self.assertEqual(PatientAppointmentStats.objects.get(patient=patient).total, 2)
+        # The surrounding transaction is still usable
+        appointment.status = 'no_show'
+        appointment.save()
+        self.assertEqual(PatientAppointmentStats.objects.get(patient=patient).no_show, 1)
+
+    def test_rebuild(self):
+        patient, other = add_patient(), add_patient('Kebede')
+        doctor = add_doctor('doctor', time(8, 0))
+        for hour, status in [(9, 'completed'), (10, 'no_show')]:
+            Appointment.objects.create(
+                patient=patient, doctor=doctor, appointment_date=date(2024, 1, 22),
+                appointment_time=time(hour, 0), reason='Checkup', status=status,
+            )
+        # Writes that bypass the signal handlers
+        Appointment.objects.filter(status='no_show').update(status='cancelled')
+        PatientAppointmentStats.objects.create(patient=other, total=1)
+
+        changes = services.rebuild_patient_stats()
+
+        self.assertEqual(set(changes), {patient.pk, other.pk})
+        stats = PatientAppointmentStats.objects.get(patient=patient)
+        self.assertEqual((stats.total, stats.completed, stats.no_show, stats.cancelled), (2, 1, 0, 1))
+        self.assertFalse(PatientAppointmentStats.objects.filter(patient=other).exists())
+        self.assertEqual(services.rebuild_patient_stats(), {})
+
+
+class AppointmentBookingApiTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='reception', role='receptionist'))
+        self.doctor = add_doctor('doctor', time(8, 0))
+        self.patient = add_patient()
+        # Two appointments in one slot, saved before double-booking was checked
+        self.first, self.second = [
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor, appointment_date=date(2024, 1, 22),
+                appointment_time=time(9, 0), reason='Checkup',
+            )
+            for _ in range(2)
+        ]
+
+    def patch(self, appointment, data):
+        return self.client.patch(f'/api/appointments/{appointment.pk}/', data, format='json')
+
+    def test_status_update_needs_no_free_slot(self):
+        self.assertEqual(self.patch(self.second, {'status': 'no_show'}).status_code, 200)
+        self.doctor.is_available = False
+        self.doctor.save()
+        self.assertEqual(self.patch(self.first, {'status': 'completed'}).status_code, 200)
+
+    def test_rescheduling_checks_the_slot(self):
+        third = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=date(2024, 1, 22),
+            appointment_time=time(10, 0), reason='Checkup',
+        )
+        response = self.patch(third, {'appointment_time': '09:00'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('appointment_time', response.json())
+        self.assertEqual(self.patch(third, {'appointment_time': '11:00'}).status_code, 200)
+
+    def test_reopening_a_cancelled_appointment_checks_the_slot(self):
+        self.patch(self.second, {'status': 'cancelled'})
+        self.assertEqual(self.patch(self.second, {'status': 'scheduled'}).status_code, 400)
+
+
+class LearnNoShowOutcomesTest(TestCase):
+    def setUp(self):
+        doctor = add_doctor('doctor', time(8, 0))
+        patient = add_patient()
+        for hour, status in [(9, 'completed'), (10, 'no_show')]:
+            Appointment.objects.create(
+                patient=patient, doctor=doctor, appointment_date=date(2024, 1, 22),
+                appointment_time=time(hour, 0), reason='Checkup', status=status,
+            )
+        self.online = mock.Mock(pending=[])
+
+    def test_outcomes_are_marked_only_after_the_checkpoint(self):
+        self.assertEqual(services.learn_noshow_outcomes(self.online), 2)
+        self.assertEqual(NoShowOutcome.objects.filter(learned_at__isnull=True).count(), 2)
+        # Pending outcomes are not learned twice by the same worker
+        self.assertEqual(services.learn_noshow_outcomes(self.online), 0)
+
+        self.assertEqual(services.mark_learned_outcomes(self.online), 2)
+        self.assertFalse(NoShowOutcome.objects.filter(learned_at__isnull=True).exists())
+        self.assertEqual(self.online.pending, [])
+
+    def test_a_new_worker_learns_unmarked_outcomes_again(self):
+        services.learn_noshow_outcomes(self.online)
+        # The worker died before checkpointing
+        self.assertEqual(services.learn_noshow_outcomes(mock.Mock(pending=[])), 2)
@@ -3,10 +3,10 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Appointment
 from .forms import AppointmentForm
+from .availability import SlotUnavailable, book
 from datetime import datetime
-import joblib
-import os
-from django.conf import settings
+from ml_models.features import noshow_matrix
+from ml_models.predict import NoShowPrediction
 
 @login_required
 def appointment_list(request):
@@ -33,34 +33,23 @@ def appointment_create(request):
     if request.method == 'POST':
         form = AppointmentForm(request.POST)
         if form.is_valid():
-            appointment = form.save()
+            try:
+                appointment = book(form.save(commit=False))
+            except SlotUnavailable as e:
+                form.add_error('appointment_time', str(e))
+                return render(request, 'appointments/appointment_form.html', {'form': form})
             
             # ML No-Show Prediction
             try:
-                model_path = os.path.join(settings.ML_MODELS_PATH, 'noshow_prediction_model.pkl')
-                if os.path.exists(model_path):
-                    model = joblib.load(model_path)
-                    
-                    # Calculate previous no-shows
-                    previous_no_shows = Appointment.objects.filter(
-                        patient=appointment.patient,
-                        status='no_show'
-                    ).count()
-                    
-                    features = [[
-                        appointment.patient.age,
-                        float(appointment.distance_from_hospital or 5),
-                        1 if appointment.weather_condition == 'rainy' else 0,
-                        previous_no_shows,
-                        1 if appointment.sms_sent else 0,
-                    ]]
-                    
-                    probability = model.predict_proba(features)[0][1]
-                    appointment.no_show_probability = round(probability, 2)
-                    appointment.save()
-                    
-                    if probability > 0.7:
-                        messages.warning(request, f'High no-show risk ({probability*100:.0f}%). Consider sending reminder.')
+                # Features include the patient's previous no-shows
+                _, features = noshow_matrix(Appointment.objects.filter(pk=appointment.pk))
+                result = NoShowPrediction().predict_noshow_matrix(features)[0]
+                probability = result['noshow_probability']
+                appointment.no_show_probability = round(probability, 2)
+                appointment.save()
+                
+                if probability > 0.7:
+                    messages.warning(request, f'High no-show risk ({probability*100:.0f}%). Consider sending reminder.')
             except Exception as e:
                 print(f"ML Prediction Error: {e}")
             
@@ -11,5 +11,8 @@ python manage.py collectstatic --no-input
 # Run migrations
 python manage.py migrate
 
+# Train the ML models on first deploy (later deploys keep the active version)
+python manage.py train_models --if-missing
+
 # Load sample data (only if database is empty)
 python manage.py load_sample_data || echo "Sample data may already exist"
@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import api_views
 
 router = DefaultRouter()
 
@@ -10,4 +11,6 @@ urlpatterns = [
     path('laboratory/', include('laboratory.api_urls')),
     path('pharmacy/', include('pharmacy.api_urls')),
     path('billing/', include('billing.api_urls')),
+    path('rollups/', include('rollups.api_urls')),
+    path('ml/models/', api_views.ml_model_status, name='ml_model_status'),
 ]
@@ -0,0 +1,18 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from ml_models.batching import batcher_stats
+from ml_models.cache import prediction_cache
+from ml_models.registry import registry
+from ml_models.shadow import shadow_stats
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def ml_model_status(request):
+    """Load time, memory and version of the models loaded in this worker"""
+    return Response({
+        'models': registry.stats(),
+        'prediction_cache': prediction_cache.stats(),
+        'micro_batching': batcher_stats(),
+        'shadow': shadow_stats(),
+    })
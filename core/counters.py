@@ -0,0 +1,203 @@
+"""
+Dashboard counters maintained incrementally
+
+Each counter is a row of the counters table holding a count that the
+dashboard would otherwise compute with COUNT(*) on every page load. Signal
+handlers (core.signals) adjust the rows on every save and delete of the
+counted models, inside the writing transaction, with UPDATE ... SET value =
+value + n so concurrent writers do not overwrite each other. The row lock
+taken by that UPDATE orders writers against reconcile(), which recounts
+while holding the same lock: a write is either committed before the
+recount sees it or adds its delta after the recount is stored, never both.
+A counter that does not exist yet is created by counting, by the first
+write or read that needs it.
+
+Writes that bypass signals (queryset.update(), bulk_create, raw SQL) make
+counters drift; the reconcile_counters command recounts them periodically.
+
+Every save or delete of a counted model also bumps its change sequence
+(`changes:<model>`), which is not a count and is never reconciled: the
+dashboard change feed (core.events) polls these to tell which lists to
+reload.
+"""
+
+from datetime import date
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from appointments.models import Appointment
+from laboratory.models import LabTest
+from patients.models import Patient
+from pharmacy.models import Medicine
+
+from .models import Counter
+
+# Medicines below this quantity are counted as low on stock
+LOW_STOCK_QUANTITY = 50
+
+APPOINTMENTS_PREFIX = 'appointments:'
+CHANGES_PREFIX = 'changes:'
+
+# Counted model -> (fields its counters depend on, counter names of a row's values)
+COUNTED = {
+    Patient: ([], lambda values: ['patients']),
+    Appointment: (['appointment_date'], lambda values: [appointments_counter(values['appointment_date'])]),
+    LabTest: (['status'], lambda values: ['pending_lab_tests'] if values['status'] == 'pending' else []),
+    Medicine: (['quantity'], lambda values: (
+        ['low_stock_medicines'] if values['quantity'] is not None and values['quantity'] < LOW_STOCK_QUANTITY else []
+    )),
+}
+
+
+def appointments_counter(day):
+    """Name of the counter of appointments on `day`"""
+    return f'{APPOINTMENTS_PREFIX}{day.isoformat() if isinstance(day, date) else day}'
+
+
+def changes_counter(model):
+    """Name of the change sequence of a counted model"""
+    return f'{CHANGES_PREFIX}{model._meta.model_name}'
+
+
+def is_change_sequence(name):
+    return name.startswith(CHANGES_PREFIX)
+
+
+def counted_queryset(name):
+    """Queryset whose count is the true value of a counter"""
+    if name == 'patients':
+        return Patient.objects.all()
+    if name == 'pending_lab_tests':
+        return LabTest.objects.filter(status='pending')
+    if name == 'low_stock_medicines':
+        return Medicine.objects.filter(quantity__lt=LOW_STOCK_QUANTITY)
+    if name.startswith(APPOINTMENTS_PREFIX):
+        return Appointment.objects.filter(appointment_date=name[len(APPOINTMENTS_PREFIX):])
+    raise ValueError(f'Unknown counter: {name}')
+
+
+def counter_names(model, values):
+    """Counters a row with these field values contributes to"""
+    return COUNTED[model][1](values)
+
+
+def instance_values(instance):
+    return {field: getattr(instance, field) for field in COUNTED[type(instance)][0]}
+
+
+def stored_values(instance):
+    """Counted fields of an instance's row as currently stored, or None for a new row"""
+    if instance._state.adding or instance.pk is None:
+        return None
+    fields = COUNTED[type(instance)][0]
+    if not fields:
+        return {}
+    return type(instance).objects.using(instance._state.db).filter(pk=instance.pk).values(*fields).first()
+
+
+def deltas(model, old_values, new_values):
+    """
+    {counter name: change} for a row going from old to new values (None:
+    absent), including the model's change sequence
+    """
+    changes = {changes_counter(model): 1}
+    for name in counter_names(model, old_values) if old_values is not None else []:
+        changes[name] = changes.get(name, 0) - 1
+    for name in counter_names(model, new_values) if new_values is not None else []:
+        changes[name] = changes.get(name, 0) + 1
+    return {name: change for name, change in changes.items() if change}
+
+
+def apply(changes, using=None):
+    """
+    Add changes to the counters in the current transaction, creating a
+    missing counter with its true value instead
+    """
+    counters = Counter.objects.using(using)
+    # A fixed order, so writers touching the same counters cannot deadlock
+    for name in sorted(changes):
+        change = changes[name]
+        if counters.filter(name=name).update(value=F('value') + change):
+            continue
+        # The count already includes this transaction's write
+        value = change if is_change_sequence(name) else counted_queryset(name).using(using).count()
+        _, created = counters.get_or_create(name=name, defaults={'value': value, 'reconciled_at': timezone.now()})
+        if not created:
+            # Created by another transaction since the UPDATE
+            counters.filter(name=name).update(value=F('value') + change)
+
+
+def reconcile(names=None):
+    """
+    Recount counters and store the true values.
+
+    Args:
+        names: counters to recount (default: every stored counter);
+            change sequences are skipped
+
+    Returns:
+        dict of counter name -> (stored value or None, true value)
+    """
+    if names is None:
+        names = list(Counter.objects.values_list('name', flat=True))
+    results = {}
+    for name in names:
+        if is_change_sequence(name):
+            continue
+        with transaction.atomic():
+            # The row exists and is locked before counting, so writers
+            # committing after the count add their deltas to the new value
+            counter, created = Counter.objects.get_or_create(
+                name=name, defaults={'value': 0, 'reconciled_at': timezone.now()}
+            )
+            stored = None if created else Counter.objects.select_for_update().get(name=name).value
+            value = counted_queryset(name).count()
+            Counter.objects.filter(name=name).update(value=value, reconciled_at=timezone.now())
+        results[name] = (stored, value)
+    return results
+
+
+def read(names):
+    """
+    Values of several counters in one query; counters that do not exist
+    yet are counted and stored, change sequences start at 0
+    """
+    values = dict(Counter.objects.filter(name__in=names).values_list('name', 'value'))
+    missing = [name for name in names if name not in values]
+    if missing:
+        values.update({name: value for name, (_, value) in reconcile(missing).items()})
+        for name in missing:
+            if is_change_sequence(name):
+                values[name] = Counter.objects.get_or_create(
+                    name=name, defaults={'value': 0, 'reconciled_at': timezone.now()}
+                )[0].value
+    return values
+
+
+def dashboard_names(today):
+    """Counter names of the dashboard, keyed by their template names"""
+    return {
+        'total_patients': 'patients',
+        'today_appointments': appointments_counter(today),
+        'pending_tests': 'pending_lab_tests',
+        'low_stock_medicines': 'low_stock_medicines',
+    }
+
+
+def dashboard_counters(today=None):
+    """The dashboard's counts, keyed by their template names"""
+    names = dashboard_names(today or timezone.localdate())
+    values = read(list(names.values()))
+    return {key: values[name] for key, name in names.items()}
+
+
+def prune_day_counters(before):
+    """Delete the appointment counters of days before `before`"""
+    stale = [
+        name for name in Counter.objects.filter(name__startswith=APPOINTMENTS_PREFIX).values_list('name', flat=True)
+        if name[len(APPOINTMENTS_PREFIX):] < before.isoformat()
+    ]
+    Counter.objects.filter(name__in=stale).delete()
+    return stale
@@ -0,0 +1,241 @@
+"""
+Live dashboard updates over server-sent events
+
+Every process serving /dashboard/events/ runs one ChangeFeed. While at least
+one client is connected, the feed reads the dashboard counters and the
+change sequences of the counted models (core.counters) in a single query
+every DASHBOARD_EVENTS_INTERVAL seconds. It reloads a dashboard list only
+when its model's change sequence moved: the pending lab tests and low-stock
+medicines once for everyone, the doctors' appointments of the day with one
+query for every connected doctor. Clients never query the database
+themselves; each waits for the feed to publish a new snapshot and sends
+only the counters and lists that differ from what it sent last.
+"""
+
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from appointments.models import Appointment
+from laboratory.models import LabTest
+from pharmacy.models import Medicine
+
+from . import counters
+
+# Entries per dashboard list, as rendered by core.views.dashboard
+LIST_SIZE = 5
+
+# List name -> model whose change sequence invalidates it
+LISTS = {
+    'my_appointments': Appointment,
+    'pending_lab_tests': LabTest,
+    'low_stock': Medicine,
+}
+
+# Lists shown to each role
+ROLE_LISTS = {
+    'doctor': 'my_appointments',
+    'lab_technician': 'pending_lab_tests',
+    'pharmacist': 'low_stock',
+}
+
+
+def appointment_entries(doctor_user_ids, today):
+    """Today's first appointments of each doctor, keyed by the doctor's user id"""
+    entries = {user_id: [] for user_id in doctor_user_ids}
+    rows = (
+        Appointment.objects.filter(doctor__user_id__in=doctor_user_ids, appointment_date=today)
+        .values_list(
+            'doctor__user_id', 'id', 'appointment_time', 'patient__first_name',
+            'patient__last_name', 'reason', 'status',
+        )
+        .order_by('appointment_time')
+    )
+    statuses = dict(Appointment.STATUS_CHOICES)
+    for user_id, pk, at, first_name, last_name, reason, status in rows:
+        if len(entries[user_id]) < LIST_SIZE:
+            entries[user_id].append({
+                'id': pk,
+                'time': at.strftime('%H:%M'),
+                'patient': f'{first_name} {last_name}',
+                'reason': ' '.join(reason.split()[:10]),
+                'status': statuses.get(status, status),
+            })
+    return entries
+
+
+def lab_test_entries():
+    return [
+        {
+            'id': pk,
+            'test_id': test_id,
+            'test_name': test_name,
+            'patient': f'{first_name} {last_name}',
+            'requested': timezone.localtime(requested).strftime('%Y-%m-%d %H:%M'),
+        }
+        for pk, test_id, test_name, first_name, last_name, requested in
+        LabTest.objects.filter(status='pending')
+        .values_list('id', 'test_id', 'test_name', 'patient__first_name', 'patient__last_name', 'requested_date')
+        [:LIST_SIZE]
+    ]
+
+
+def low_stock_entries():
+    return [
+        {'id': pk, 'name': name, 'quantity': quantity, 'unit': unit}
+        for pk, name, quantity, unit in
+        Medicine.objects.filter(quantity__lt=counters.LOW_STOCK_QUANTITY)
+        .order_by('quantity')
+        .values_list('id', 'name', 'quantity', 'unit')[:LIST_SIZE]
+    ]
+
+
+class Subscriber:
+    """One connected client: what it should see and what it was sent"""
+
+    def __init__(self, user_id, role):
+        self.user_id = user_id
+        self.list_name = ROLE_LISTS.get(role)
+        self.snapshot = None
+        self.changed = asyncio.Event()
+        self.sent_counters = {}
+        self.sent_list = None
+
+    def publish(self, snapshot):
+        self.snapshot = snapshot
+        self.changed.set()
+
+    def events(self):
+        """(event name, data) for what changed since the last call"""
+        snapshot = self.snapshot
+        events = []
+        changed = {
+            key: value for key, value in snapshot['counters'].items()
+            if self.sent_counters.get(key) != value
+        }
+        if changed:
+            self.sent_counters.update(changed)
+            events.append(('counters', changed))
+        if self.list_name:
+            if self.list_name == 'my_appointments':
+                entries = snapshot['my_appointments'].get(self.user_id, [])
+            else:
+                entries = snapshot[self.list_name]
+            if entries != self.sent_list:
+                self.sent_list = entries
+                events.append(('list', {'name': self.list_name, 'entries': entries}))
+        return events
+
+
+class ChangeFeed:
+    """Polls the counters table for all clients of this process"""
+
+    def __init__(self, interval=None):
+        self._interval = interval
+        self.subscribers = set()
+        self._task = None
+        self._sequences = {}
+        self._snapshot = None
+        self.polls = 0
+
+    @property
+    def interval(self):
+        if self._interval is not None:
+            return self._interval
+        return getattr(settings, 'DASHBOARD_EVENTS_INTERVAL', 2.0)
+
+    def subscribe(self, subscriber):
+        self.subscribers.add(subscriber)
+        if self._snapshot is not None and subscriber.list_name != 'my_appointments':
+            subscriber.publish(self._snapshot)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _run(self):
+        while self.subscribers:
+            started = time.monotonic()
+            try:
+                doctors = {s.user_id for s in self.subscribers if s.list_name == 'my_appointments'}
+                wanted = {s.list_name for s in self.subscribers}
+                self._snapshot = await sync_to_async(self.poll)(doctors, wanted)
+                for subscriber in list(self.subscribers):
+                    subscriber.publish(self._snapshot)
+            except Exception as e:
+                print(f"Dashboard Events Error: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        self._snapshot = None
+        self._sequences = {}
+
+    def poll(self, doctor_user_ids, wanted):
+        """New snapshot, reloading only the lists whose model changed"""
+        self.polls += 1
+        today = timezone.localdate()
+        names = counters.dashboard_names(today)
+        sequences = {name: counters.changes_counter(model) for name, model in LISTS.items()}
+        values = counters.read(list(names.values()) + list(sequences.values()))
+
+        previous = self._snapshot or {'my_appointments': {}}
+        snapshot = {
+            'day': today,
+            'counters': {key: values[name] for key, name in names.items()},
+            'my_appointments': {},
+        }
+        stale = {
+            name for name, sequence in sequences.items()
+            if self._sequences.get(name) != values[sequence] or previous.get('day') != today
+        }
+        self._sequences = {name: values[sequence] for name, sequence in sequences.items()}
+
+        if 'my_appointments' in stale:
+            load = doctor_user_ids
+        else:
+            snapshot['my_appointments'] = {
+                user_id: entries for user_id, entries in previous['my_appointments'].items()
+                if user_id in doctor_user_ids
+            }
+            load = doctor_user_ids - set(snapshot['my_appointments'])
+        if load:
+            snapshot['my_appointments'].update(appointment_entries(load, today))
+        for name, entries in [('pending_lab_tests', lab_test_entries), ('low_stock', low_stock_entries)]:
+            if name not in wanted:
+                continue
+            snapshot[name] = entries() if name in stale or name not in previous else previous[name]
+        return snapshot
+
+
+feed = ChangeFeed()
+
+
+def sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+async def stream(subscriber):
+    """
+    Server-sent events for one client. The stream ends after
+    DASHBOARD_EVENTS_MAX_SECONDS and the browser reconnects, so a connection
+    whose client left unnoticed is released in bounded time.
+    """
+    heartbeat = getattr(settings, 'DASHBOARD_EVENTS_HEARTBEAT', 15.0)
+    deadline = time.monotonic() + getattr(settings, 'DASHBOARD_EVENTS_MAX_SECONDS', 300.0)
+    feed.subscribe(subscriber)
+    try:
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            try:
+                await asyncio.wait_for(subscriber.changed.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            subscriber.changed.clear()
+            for event, data in subscriber.events():
+                yield sse(event, data)
+    finally:
+        feed.unsubscribe(subscriber)
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+from ml_models import benchmark
+import json
+
+class Command(BaseCommand):
+    help = 'Benchmark latency, throughput and memory of the ML predictors and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('predictors', nargs='*',
+                            help='Predictors to benchmark: disease, risk, noshow (default: all)')
+        parser.add_argument('--output', '-o', default='benchmark_results.json',
+                            help='JSON file to write (default: benchmark_results.json)')
+        parser.add_argument('--batch-sizes', default=','.join(map(str, benchmark.DEFAULT_BATCH_SIZES)),
+                            help='Comma-separated batch sizes (default: 1,10,100,1000,10000)')
+        parser.add_argument('--single-calls', type=int, default=1000,
+                            help='Single-row calls timed per predictor (default: 1000)')
+        parser.add_argument('--batch-repeat', type=int, default=20,
+                            help='Timed repetitions per batch size (default: 20)')
+        parser.add_argument('--load-repeat', type=int, default=3,
+                            help='Times each model file is loaded to time it (default: 3)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed for the synthetic inputs (default: 0)')
+        parser.add_argument('--compare',
+                            help='Earlier results file to compare against')
+
+    def handle(self, *args, **options):
+        unknown = set(options['predictors']) - set(benchmark.predictors())
+        if unknown:
+            raise CommandError(f"Unknown predictor(s): {', '.join(sorted(unknown))}")
+        try:
+            batch_sizes = [int(size) for size in options['batch_sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError('--batch-sizes must be a comma-separated list of integers')
+
+        results = benchmark.run(
+            names=options['predictors'] or None,
+            batch_sizes=batch_sizes,
+            single_calls=options['single_calls'],
+            batch_repeat=options['batch_repeat'],
+            load_repeat=options['load_repeat'],
+            seed=options['seed'],
+            log=self.stdout.write,
+        )
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+
+        for model_file, model in results['models'].items():
+            self.stdout.write(
+                f"  {model_file:32} load p50 {model['load_ms']['p50']:9.2f} ms  "
+                f"memory {model['memory_bytes'] / 1024 / 1024:7.1f} MB"
+            )
+        for name, result in results['predictors'].items():
+            single = result['single']
+            self.stdout.write(
+                f"  {name:8} single p50 {single['p50']:.3f} ms  p95 {single['p95']:.3f} ms  "
+                f"p99 {single['p99']:.3f} ms  cold {result['cold_first_call_ms']:.1f} ms"
+            )
+            for size, summary in result['batch'].items():
+                self.stdout.write(
+                    f"  {name:8} batch {size:>6}  p50 {summary['p50']:9.3f} ms  "
+                    f"p99 {summary['p99']:9.3f} ms  {summary['rows_per_sec']:12.0f} rows/s"
+                )
+
+        linear = results.get('noshow_linear_scorer')
+        if linear and 'skipped' not in linear:
+            self.stdout.write(
+                f"  noshow closed-form scorer: identical={linear['identical']} "
+                f"(max diff {linear['max_abs_diff']:.1e}), single x{linear['single_speedup']}, "
+                f"batch x{linear['batch_speedup']}"
+            )
+            if not linear['identical']:
+                self.stdout.write(self.style.WARNING('⚠ Closed-form no-show scores differ from sklearn'))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            self.stdout.write(f"\nCompared with {options['compare']} "
+                              f"(commit {baseline.get('environment', {}).get('commit')}):")
+            for metric, old, new, ratio in benchmark.compare(baseline, results):
+                self.stdout.write(f'  {metric:48} {old:>12} -> {new:>12}  x{ratio}')
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Benchmark results written to {options['output']}"))
@@ -0,0 +1,116 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from ml_models import compaction
+from ml_models.forest import CompiledForest, compact_name
+from ml_models.registry import file_checksum, registry
+from ml_models.versions import MANIFEST_FILE
+import joblib
+import json
+import os
+import shutil
+import tempfile
+
+class Command(BaseCommand):
+    help = 'Write compact (fewer trees, pruned, float32) forests next to the active models'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', default=list(compaction.FORESTS),
+                            help='Pickled forest files of the active model version to compact')
+        parser.add_argument('--max-drop', type=float, default=0.005,
+                            help='Largest accepted validation accuracy (disease) or r2 (risk) loss (default: 0.005)')
+        parser.add_argument('--prune-tolerance', type=float, default=0.01,
+                            help='Collapse subtrees whose leaves differ from their root by at most this (default: 0.01)')
+        parser.add_argument('--keep-float64', action='store_true',
+                            help='Do not downcast thresholds and values to float32')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what compaction would achieve without writing anything')
+
+    def handle(self, *args, **options):
+        base_path = registry.base_path
+        for model_file in options['models']:
+            if model_file not in compaction.FORESTS:
+                raise CommandError(f'{model_file} is not a forest model: {", ".join(compaction.FORESTS)}')
+            source = os.path.join(base_path, model_file)
+            if not os.path.exists(source):
+                self.stdout.write(self.style.WARNING(f'⚠ {model_file} not found, skipped'))
+                continue
+
+            sklearn_model = joblib.load(source)
+            forest = CompiledForest.from_sklearn(sklearn_model)
+            X_val, y_val = compaction.validation_set(
+                compaction.FORESTS[model_file], settings.DATASETS_PATH, base_path, settings.ML_FEATURE_CACHE_PATH
+            )
+            compact = compaction.compact(
+                forest, X_val, y_val,
+                max_drop=options['max_drop'],
+                prune_tolerance=options['prune_tolerance'],
+                quantize=not options['keep_float64'],
+            )
+            report = compact.compaction
+
+            target = os.path.dirname(os.path.join(base_path, compact_name(model_file)))
+            memory = None
+            if not options['dry_run']:
+                compact.save(target)
+                # Resident memory of a worker that reads the whole model in
+                memory = {
+                    'pickle': compaction.resident_cost(source),
+                    'compiled': self._memory(forest),
+                    'compact': compaction.resident_cost(target),
+                }
+                self._record(base_path, model_file, target, dict(report, resident_bytes=memory))
+
+            self.stdout.write(
+                f"{model_file}: {report['trees_before']} -> {report['trees_after']} trees, "
+                f"{report['nodes_before']} -> {report['nodes_after']} nodes, "
+                f"{report['bytes_before'] / 1024:.0f} KB -> {report['bytes_after'] / 1024:.0f} KB "
+                f"({1 - report['bytes_after'] / report['bytes_before']:.0%} smaller)"
+            )
+            self.stdout.write(
+                f"  validation {report['metric']}: {report['score_before']:.4f} -> {report['score_after']:.4f} "
+                f"({report['score_delta']:+.4f})"
+            )
+            if memory:
+                self.stdout.write(
+                    f"  resident memory when loaded: pickle {memory['pickle'] / 1024:.0f} KB, "
+                    f"compiled {memory['compiled'] / 1024:.0f} KB, compact {memory['compact'] / 1024:.0f} KB"
+                )
+            if report['score_delta'] < -options['max_drop']:
+                self.stdout.write(self.style.WARNING(
+                    f'⚠ Pruning and float32 alone lose more than {options["max_drop"]}; '
+                    f'lower --prune-tolerance or use --keep-float64'
+                ))
+            elif options['dry_run']:
+                self.stdout.write(self.style.SUCCESS(f'✓ {model_file} can be compacted (dry run, nothing written)'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✓ {model_file} -> {os.path.basename(target)}/'))
+
+    def _memory(self, forest):
+        """Resident memory of the full compiled forest, which may not be on disk yet"""
+        scratch = tempfile.mkdtemp(prefix='compact-')
+        try:
+            forest.save(scratch)
+            return compaction.resident_cost(scratch)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def _record(self, base_path, model_file, target, report):
+        """Add the compact form to the version manifest, so that partial retrains carry it over"""
+        manifest_path = os.path.join(base_path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        entry = manifest['models'].get(model_file)
+        if entry is None:
+            return
+        meta = os.path.join(target, 'meta.json')
+        entry['compact'] = {
+            'path': os.path.relpath(meta, base_path),
+            'sha256': file_checksum(meta),
+            'report': report,
+        }
+        tmp_path = f'{manifest_path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
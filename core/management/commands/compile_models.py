@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from ml_models.forest import CompiledForest, compiled_name
+from ml_models.registry import registry
+import joblib
+import numpy as np
+import os
+
+FOREST_MODELS = ['disease_prediction_model.pkl', 'risk_scoring_model.pkl']
+
+class Command(BaseCommand):
+    help = 'Export the trained random forests to the compiled, memory-mappable runtime format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', default=FOREST_MODELS,
+                            help='Pickled forest files of the active model version to compile')
+        parser.add_argument('--check-rows', type=int, default=2000,
+                            help='Random rows used to verify outputs against sklearn (default: 2000)')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        for model_file in options['models']:
+            source = os.path.join(registry.base_path, model_file)
+            if not os.path.exists(source):
+                self.stdout.write(self.style.WARNING(f'⚠ {model_file} not found, skipped'))
+                continue
+
+            forest = joblib.load(source)
+            compiled = CompiledForest.from_sklearn(forest)
+
+            # Random inputs spanning every threshold the forest uses
+            low = np.full(compiled.n_features_in_, np.inf)
+            high = np.full(compiled.n_features_in_, -np.inf)
+            internal = ~compiled.is_leaf
+            np.minimum.at(low, compiled.feature[internal], compiled.threshold[internal])
+            np.maximum.at(high, compiled.feature[internal], compiled.threshold[internal])
+            low[np.isinf(low)], high[np.isinf(high)] = 0.0, 1.0
+            X = rng.uniform(low - 1, high + 1, size=(options['check_rows'], compiled.n_features_in_))
+
+            method = 'predict_proba' if compiled.kind == 'classifier' else 'predict'
+            if not np.array_equal(getattr(forest, method)(X), getattr(compiled, method)(X)):
+                raise CommandError(f'Compiled {model_file} does not reproduce sklearn output')
+
+            target = os.path.dirname(os.path.join(registry.base_path, compiled_name(model_file)))
+            compiled.save(target)
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {model_file} -> {os.path.basename(target)}/ '
+                f'({compiled.n_estimators} trees, {compiled.n_nodes} nodes, outputs identical)'
+            ))
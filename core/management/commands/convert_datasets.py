@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from ml_models.columnar import convert_csv
+from ml_models.training import DATASETS
+import os
+import time
+
+class Command(BaseCommand):
+    help = 'Convert the training CSVs into the columnar, memory-mappable dataset format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*',
+                            help='CSV files to convert (default: the training datasets in DATASETS_PATH)')
+        parser.add_argument('--output-dir',
+                            help='Directory for the converted datasets (default: next to each CSV)')
+        parser.add_argument('--chunk-size', type=int, default=500000,
+                            help='CSV rows read at a time (default: 500000)')
+
+    def handle(self, *args, **options):
+        files = options['files'] or [
+            os.path.join(settings.DATASETS_PATH, f'{name}.csv') for name in DATASETS.values()
+        ]
+        for csv_path in files:
+            if not os.path.exists(csv_path):
+                self.stdout.write(self.style.WARNING(f'⚠ {csv_path} not found, skipped'))
+                continue
+            base_name = os.path.splitext(os.path.basename(csv_path))[0]
+            output_dir = options['output_dir'] or os.path.dirname(os.path.abspath(csv_path))
+            path = os.path.join(output_dir, base_name)
+
+            started = time.perf_counter()
+            try:
+                manifest = convert_csv(csv_path, path, chunk_size=options['chunk_size'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f'{csv_path}: {e}')
+            size = sum(os.path.getsize(os.path.join(path, column['file'])) for column in manifest['columns'])
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ {csv_path} -> {path}: {manifest['rows']} rows, {len(manifest['columns'])} columns, "
+                f"{size / 1024 / 1024:.1f} MB in {time.perf_counter() - started:.1f}s"
+            ))
@@ -0,0 +1,127 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from ml_models import drift
+from ml_models.registry import file_checksum, registry
+from ml_models.training import FEATURES, dataset_path, load_features
+from ml_models.versions import MANIFEST_FILE
+import json
+import os
+import shutil
+
+class Command(BaseCommand):
+    help = 'Compare the inputs seen by every worker with the training distribution (PSI and KS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', default=drift.MODELS,
+                            help='Models to report: disease, risk, noshow (default: all)')
+        parser.add_argument('--since', type=float,
+                            help='Only merge worker counts updated within this many hours')
+        parser.add_argument('--min-rows', type=int, default=100,
+                            help='Fewest live rows needed to score a model (default: 100)')
+        parser.add_argument('--build-reference', action='store_true',
+                            help='Write missing training references of the active models from DATASETS_PATH first')
+        parser.add_argument('--prune-hours', type=float, default=settings.ML_DRIFT_RETENTION_HOURS,
+                            help='Delete worker files not updated for this many hours first '
+                                 '(default: ML_DRIFT_RETENTION_HOURS; 0 keeps them)')
+        parser.add_argument('--reset', action='store_true',
+                            help='Delete the counts written by the workers, after reporting')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        unknown = set(options['models']) - set(drift.MODELS)
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(sorted(unknown))}")
+
+        references = {}
+        for name in options['models']:
+            path = os.path.join(registry.base_path, drift.reference_name(name))
+            if not os.path.exists(path) and options['build_reference']:
+                self._build_reference(name, path)
+            if os.path.exists(path):
+                references[name] = drift.Reference.load(path)
+            elif not options['json']:
+                self.stdout.write(self.style.WARNING(
+                    f'⚠ No training reference for {name}; retrain it or use --build-reference'
+                ))
+
+        if options['prune_hours']:
+            pruned = drift.prune_worker_files(str(settings.ML_DRIFT_PATH), options['prune_hours'] * 3600)
+            if pruned and not options['json']:
+                self.stdout.write(f'Deleted {len(pruned)} stale worker file(s)')
+
+        max_age = options['since'] * 3600 if options['since'] is not None else None
+        counts, workers = drift.merged_counts(str(settings.ML_DRIFT_PATH), references, max_age)
+
+        report = {'workers': workers, 'models': {}}
+        for name, reference in references.items():
+            flat = counts.get(name)
+            rows = int(reference.split(flat)[0].sum()) if flat is not None else 0
+            entry = {'rows': rows, 'reference_sha256': reference.checksum}
+            if rows >= options['min_rows']:
+                entry['features'] = drift.compare(reference, flat)
+                entry['max_psi'] = max(feature['psi'] for feature in entry['features'])
+                entry['status'] = drift.psi_status(entry['max_psi'])
+            report['models'][name] = entry
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print(report, options['min_rows'])
+
+        if options['reset']:
+            shutil.rmtree(str(settings.ML_DRIFT_PATH), ignore_errors=True)
+            if not options['json']:
+                self.stdout.write(self.style.SUCCESS('✓ Worker counts deleted'))
+
+    def _print(self, report, min_rows):
+        self.stdout.write(f"Merged counts of {report['workers']} worker(s)")
+        for name, entry in report['models'].items():
+            if 'features' not in entry:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠ {name}: {entry['rows']} rows seen, fewer than {min_rows}; not scored"
+                ))
+                continue
+            self.stdout.write(f"\n{name}: {entry['rows']} rows")
+            self.stdout.write(f"  {'feature':<26} {'psi':>8} {'ks':>8} {'out of range':>13}  status")
+            for feature in sorted(entry['features'], key=lambda feature: -feature['psi']):
+                self.stdout.write(
+                    f"  {feature['feature']:<26} {feature['psi']:>8.4f} {feature['ks']:>8.4f} "
+                    f"{feature['out_of_range']:>13.2%}  {drift.psi_status(feature['psi'])}"
+                )
+            if entry['status'] == 'stable':
+                self.stdout.write(self.style.SUCCESS(f'✓ {name} inputs match the training data'))
+            else:
+                drifted = [
+                    feature['feature'] for feature in entry['features']
+                    if feature['psi'] >= drift.PSI_MODERATE
+                ]
+                self.stdout.write(self.style.WARNING(
+                    f"⚠ {name} inputs drifted ({entry['status']}): {', '.join(drifted)}"
+                ))
+
+    def _build_reference(self, name, path):
+        """Reference for a model trained before train_models wrote one"""
+        X, _, checksum, _ = load_features(
+            name, dataset_path(settings.DATASETS_PATH, name), settings.ML_FEATURE_CACHE_PATH
+        )
+        data = drift.build_reference(name, X, FEATURES[name])
+        data['dataset_sha256'] = checksum
+        drift.write_reference(path, data)
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {os.path.basename(path)} from {len(X)} rows'))
+
+        manifest_path = os.path.join(os.path.dirname(path), MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest['models'][os.path.basename(path)] = {
+            'model': name,
+            'sha256': file_checksum(path),
+            'bytes': os.path.getsize(path),
+            'features': FEATURES[name],
+        }
+        tmp_path = f'{manifest_path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
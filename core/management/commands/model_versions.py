@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from ml_models import versions
+
+class Command(BaseCommand):
+    help = 'List trained model versions, or switch the version being served'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--activate', metavar='VERSION',
+                            help='Serve VERSION from now on')
+        parser.add_argument('--rollback', action='store_true',
+                            help='Serve the version before the current one')
+
+    def handle(self, *args, **options):
+        if options['activate'] or options['rollback']:
+            if getattr(settings, 'ML_MODEL_VERSION', ''):
+                self.stdout.write(self.style.WARNING(
+                    f'⚠ ML_MODEL_VERSION pins {settings.ML_MODEL_VERSION}; '
+                    f'the change takes effect once the pin is removed'
+                ))
+            version = options['activate'] or versions.previous_version()
+            if not version:
+                raise CommandError('There is no earlier model version to roll back to')
+            try:
+                previous = versions.activate(version)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Serving model version {version} (was {previous or "unversioned"}); '
+                f'workers switch within {settings.ML_MODEL_RELOAD_INTERVAL:g}s'
+            ))
+            return
+
+        current = versions.current_version()
+        available = versions.list_versions()
+        if not available:
+            self.stdout.write('No model versions yet; run `python manage.py train_models`')
+            return
+        for version in available:
+            manifest = versions.read_manifest(version)
+            summary = []
+            for file_name, entry in manifest['models'].items():
+                for key, value in entry.get('metrics', {}).items():
+                    summary.append(f"{entry['model']}.{key}={value:.3f}")
+            marker = '*' if version == current else ' '
+            self.stdout.write(f"{marker} {version}  {manifest['created_at']}  {' '.join(summary)}")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core import counters
+import time
+
+class Command(BaseCommand):
+    help = 'Recount the dashboard counters and correct any drift'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        today = timezone.localdate()
+        pruned = counters.prune_day_counters(today)
+        names = set(counters.Counter.objects.values_list('name', flat=True))
+        names.update(counters.dashboard_names(today).values())
+        results = counters.reconcile(sorted(names))
+
+        corrected = 0
+        for name, (stored, value) in results.items():
+            if stored is None:
+                self.stdout.write(f'  {name}: created with {value}')
+            elif stored != value:
+                corrected += 1
+                self.stdout.write(self.style.WARNING(f'⚠ {name}: {stored} -> {value} ({value - stored:+d})'))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Reconciled {len(results)} counters ({corrected} corrected, '
+            f'{len(pruned)} past days removed) in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from ml_models import training, versions
+import time
+
+class Command(BaseCommand):
+    help = 'Train the ML models in parallel and publish them as a new model version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*',
+                            help='Models to train: disease, risk, noshow (default: all)')
+        parser.add_argument('--processes', type=int,
+                            help='Worker processes (default: one per model)')
+        parser.add_argument('--n-jobs', type=int,
+                            help='Threads per random forest (default: CPUs divided between the workers)')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Rebuild the feature matrices instead of using the feature cache')
+        parser.add_argument('--no-activate', action='store_true',
+                            help='Publish the new version without serving it')
+        parser.add_argument('--if-missing', action='store_true',
+                            help='Only train when no model version is active (for deploy scripts)')
+
+    def handle(self, *args, **options):
+        unknown = set(options['models']) - set(training.FITTERS)
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(sorted(unknown))}")
+        if options['if_missing'] and versions.current_version():
+            self.stdout.write(f'Model version {versions.current_version()} is active, nothing to do')
+            return
+
+        started = time.perf_counter()
+        try:
+            manifest = training.train_all(
+                settings.ML_MODELS_PATH,
+                settings.DATASETS_PATH,
+                cache_dir=None if options['no_cache'] else settings.ML_FEATURE_CACHE_PATH,
+                processes=options['processes'],
+                n_jobs=options['n_jobs'],
+                names=options['models'] or None,
+                activate=not options['no_activate'],
+                log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for file_name, entry in manifest['models'].items():
+            if 'metrics' not in entry:
+                continue
+            metrics = ', '.join(f'{key}={value:.4f}' for key, value in entry['metrics'].items())
+            cached = ' (cached features)' if entry['dataset']['feature_cache_hit'] else ''
+            self.stdout.write(
+                f"  {file_name:32} {metrics}  trained in {entry['timing']['training_seconds']:.1f}s{cached}"
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Model version {manifest['version']} written in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from ml_models import tuning
+import json
+import time
+
+def depth(value):
+    return None if value.lower() == 'none' else int(value)
+
+class Command(BaseCommand):
+    help = 'Search forest hyperparameters for accuracy, latency and size, and report the Pareto front'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*',
+                            help='Models to tune: disease, risk (default: both)')
+        parser.add_argument('--n-estimators', type=int, nargs='+',
+                            help=f"Forest sizes to try (default: {tuning.DEFAULT_GRID['n_estimators']})")
+        parser.add_argument('--max-depth', type=depth, nargs='+',
+                            help="Depths to try, 'none' for unlimited (default: 6 10 14 none)")
+        parser.add_argument('--min-samples-leaf', type=int, nargs='+',
+                            help=f"Leaf sizes to try (default: {tuning.DEFAULT_GRID['min_samples_leaf']})")
+        parser.add_argument('--folds', type=int, default=5,
+                            help='Cross-validation folds (default: 5)')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Seed of the fold split (default: 42)')
+        parser.add_argument('--processes', type=int,
+                            help='Worker processes (default: one per CPU)')
+        parser.add_argument('--latency-calls', type=int, default=200,
+                            help='Single-row predictions timed per candidate (default: 200)')
+        parser.add_argument('--min-accuracy', type=float,
+                            help='Accuracy floor for the recommended disease model')
+        parser.add_argument('--min-r2', type=float,
+                            help='R2 floor for the recommended risk model')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Do not read or write cached matrices and folds')
+        parser.add_argument('--output', '-o', default='tuning_results.json',
+                            help='File to write every candidate to (default: tuning_results.json)')
+
+    def handle(self, *args, **options):
+        unknown = set(options['models']) - set(tuning.MODELS)
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(sorted(unknown))}")
+        space = {
+            key: options[key] for key in ['n_estimators', 'max_depth', 'min_samples_leaf']
+            if options[key]
+        }
+        min_scores = {'disease': options['min_accuracy'], 'risk': options['min_r2']}
+
+        started = time.perf_counter()
+        report = tuning.tune(
+            settings.DATASETS_PATH,
+            names=options['models'] or None,
+            space=space,
+            folds=options['folds'],
+            seed=options['seed'],
+            processes=options['processes'],
+            cache_dir=None if options['no_cache'] else settings.ML_FEATURE_CACHE_PATH,
+            latency_calls=options['latency_calls'],
+            min_scores=min_scores,
+            log=self.stdout.write,
+        )
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for name, result in report.items():
+            metric = result['metric']
+            self.stdout.write(f"\n{name}: Pareto front of {len(result['candidates'])} candidates")
+            self.stdout.write(
+                f"  {'n_estimators':>12} {'max_depth':>9} {'min_leaf':>8} {metric:>9} "
+                f"{'p50 ms':>8} {'p95 ms':>8} {'rows/s':>10} {'size KB':>9}"
+            )
+            front = sorted(
+                (candidate for candidate in result['candidates'] if candidate['pareto']),
+                key=lambda candidate: candidate['latency']['single_ms']['p50'],
+            )
+            for candidate in front:
+                params, latency = candidate['params'], candidate['latency']
+                self.stdout.write(
+                    f"  {params['n_estimators']:>12} {str(params['max_depth']):>9} "
+                    f"{params['min_samples_leaf']:>8} {candidate['score']:>9.4f} "
+                    f"{latency['single_ms']['p50']:>8.3f} {latency['single_ms']['p95']:>8.3f} "
+                    f"{latency['rows_per_second']:>10.0f} {candidate['compiled_bytes'] / 1024:>9.1f}"
+                )
+            recommended = result['recommended']
+            if recommended:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✓ Recommended for {name}: {recommended['params']} "
+                    f"({metric}={recommended['score']:.4f})"
+                ))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠ No {name} candidate reaches {metric} >= {result['min_score']}"
+                ))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"✓ Results written to {options['output']} in {elapsed:.1f}s"))
@@ -76,3 +76,20 @@ class AuditLog(models.Model):
     
     def __str__(self):
         return f"{self.user} - {self.action} - {self.model_name} - {self.timestamp}"
+
+
+class Counter(models.Model):
+    """
+    A dashboard count kept up to date incrementally (see core.counters)
+    instead of being counted on every page load
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    reconciled_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'counters'
+    
+    def __str__(self):
+        return f"{self.name} = {self.value}"
@@ -0,0 +1,30 @@
+"""
+Signal handlers keeping the dashboard counters (core.counters) current
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters
+
+
+@receiver(pre_save)
+def remember_counted_values(sender, instance, using, **kwargs):
+    if sender in counters.COUNTED:
+        instance._counted_values = counters.stored_values(instance)
+
+
+@receiver(post_save)
+def count_saved(sender, instance, created, using, **kwargs):
+    if sender not in counters.COUNTED:
+        return
+    old_values = None if created else getattr(instance, '_counted_values', None)
+    counters.apply(
+        counters.deltas(sender, old_values, counters.instance_values(instance)), using=using
+    )
+
+
+@receiver(post_delete)
+def count_deleted(sender, instance, using, **kwargs):
+    if sender in counters.COUNTED:
+        counters.apply(counters.deltas(sender, counters.instance_values(instance), None), using=using)
@@ -0,0 +1,56 @@
+from datetime import date
+
+from django.db import transaction
+from django.test import TestCase
+
+from patients.models import Patient
+
+from . import counters
+from .models import Counter
+
+
+def patient(first_name='Abebe', patient_id=''):
+    return Patient(
+        patient_id=patient_id, first_name=first_name, last_name='Kebede', date_of_birth=date(1980, 1, 1), gender='M',
+        phone='0911000000', address='Addis Ababa', emergency_contact_name='Almaz',
+        emergency_contact_phone='0911000001',
+    )
+
+
+def stored(name):
+    return Counter.objects.filter(name=name).values_list('value', flat=True).first()
+
+
+class CountersTest(TestCase):
+    def test_first_write_creates_the_counter_by_counting(self):
+        # Saved without signals, so no counter exists yet
+        Patient.objects.bulk_create([patient(patient_id='PAT-900001'), patient('Kebede', 'PAT-900002')])
+        self.assertIsNone(stored('patients'))
+
+        patient('Almaz').save()
+
+        self.assertEqual(stored('patients'), 3)
+        self.assertEqual(stored(counters.changes_counter(Patient)), 1)
+
+    def test_deltas_are_applied_in_the_writing_transaction(self):
+        self.assertEqual(counters.read(['patients']), {'patients': 0})
+        try:
+            with transaction.atomic():
+                patient().save()
+                self.assertEqual(stored('patients'), 1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(stored('patients'), 0)
+
+        patient().save()
+        self.assertEqual(counters.read(['patients']), {'patients': 1})
+
+    def test_reconcile(self):
+        counters.read(['patients'])
+        Patient.objects.bulk_create([patient(patient_id='PAT-900001'), patient('Kebede', 'PAT-900002')])
+
+        self.assertEqual(counters.reconcile(['patients']), {'patients': (0, 2)})
+        self.assertEqual(counters.reconcile(['pending_lab_tests']), {'pending_lab_tests': (None, 0)})
+        Patient.objects.first().delete()
+        self.assertEqual(stored('patients'), 1)
@@ -6,5 +6,6 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/events/', views.dashboard_events, name='dashboard_events'),
     path('profile/', views.profile_view, name='profile'),
 ]
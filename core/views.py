@@ -1,14 +1,18 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Count, Q
-from datetime import datetime, timedelta
-from patients.models import Patient
+from django.utils import timezone
 from appointments.models import Appointment
 from laboratory.models import LabTest
 from pharmacy.models import Medicine
 from billing.models import Bill
+from .counters import dashboard_counters
+from .events import Subscriber, stream
 
 def login_view(request):
     if request.user.is_authenticated:
@@ -36,14 +40,13 @@ def logout_view(request):
 @login_required
 def dashboard(request):
     user = request.user
-    today = datetime.now().date()
+    # Same local day as the change feed and reconcile_counters
+    today = timezone.localdate()
     
+    # Maintained counts, read with one query (see core.counters)
     context = {
         'user': user,
-        'total_patients': Patient.objects.count(),
-        'today_appointments': Appointment.objects.filter(appointment_date=today).count(),
-        'pending_tests': LabTest.objects.filter(status='pending').count(),
-        'low_stock_medicines': Medicine.objects.filter(quantity__lt=50).count(),
+        **dashboard_counters(today),
     }
     
     if user.role == 'doctor':
@@ -64,6 +67,30 @@ def dashboard(request):
     
     return render(request, 'core/dashboard.html', context)
 
+def dashboard_subscriber(request):
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    return Subscriber(user.id, user.role)
+
+async def dashboard_events(request):
+    """
+    Server-sent events with the dashboard counters and role list as they
+    change (see core.events). Only served under ASGI: WSGI buffers an async
+    stream to the end and would hold a worker for the whole connection, so
+    there the response is 204, which tells EventSource not to reconnect.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    subscriber = await sync_to_async(dashboard_subscriber)(request)
+    if subscriber is None:
+        return HttpResponse(status=401)
+    response = StreamingHttpResponse(stream(subscriber), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def profile_view(request):
     return render(request, 'core/profile.html', {'user': request.user})
@@ -1,11 +1,33 @@
-import pandas as pd
+"""
+Synthetic training datasets for the Ethiopian Hospital ML models
+
+Every column is drawn at once from a NumPy random generator, and rows are
+produced in chunks, so millions of rows can be generated quickly in bounded
+memory and streamed to CSV or to the columnar format (ml_models/columnar.py).
+Chunk i always draws from the i-th child of the seed, so the same seed and
+chunk size reproduce the same rows.
+
+Usage:
+    python datasets/generate_datasets.py                       # 2000 rows each, CSV
+    python datasets/generate_datasets.py --rows 10000000 --format columnar
+"""
+
+import argparse
+import os
+import sys
+import time
+
 import numpy as np
-from datetime import datetime, timedelta
-import random
+import pandas as pd
 
-# Set random seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from ml_models.columnar import CATEGORY, Column, ColumnarWriter  # noqa: E402
+
+SEED = 42
+DEFAULT_ROWS = 2000
+DEFAULT_CHUNK_SIZE = 1000000
 
 # Ethiopian regions and woredas
 regions_woredas = {
@@ -68,195 +90,270 @@ disease_patterns = {
     },
 }
 
-def generate_disease_dataset(n_samples=2000):
-    data = []
-    diseases = list(disease_patterns.keys())
-    
-    for _ in range(n_samples):
-        disease = random.choice(diseases)
-        pattern = disease_patterns[disease]
-        
-        # Generate patient data
-        age = random.randint(*pattern['age_range'])
-        gender = random.choice(['M', 'F'])
-        region = random.choice(list(regions_woredas.keys()))
-        woreda = random.choice(regions_woredas[region])
-        
-        # Generate symptoms
-        symptoms = {}
-        for symptom in ['fever', 'headache', 'fatigue', 'cough', 'vomiting', 'diarrhea', 'joint_pain', 'rash']:
-            prob = pattern['symptoms'].get(symptom, 0.1)
-            symptoms[symptom] = 1 if random.random() < prob else 0
-        
-        # Generate test results
-        malaria_test = pattern['malaria_test']
-        rdt_result = malaria_test
-        
-        # Generate vitals
-        bp_systolic = random.randint(*pattern['bp_systolic'])
-        bp_diastolic = random.randint(*pattern['bp_diastolic'])
-        glucose = random.randint(*pattern['glucose'])
-        
-        row = {
-            'age': age,
-            'gender': gender,
-            'region': region,
-            'woreda': woreda,
-            **symptoms,
-            'malaria_test': malaria_test,
-            'rdt_result': rdt_result,
-            'blood_pressure_systolic': bp_systolic,
-            'blood_pressure_diastolic': bp_diastolic,
-            'glucose_level': glucose,
-            'diagnosis': disease,
-        }
-        data.append(row)
-    
-    df = pd.DataFrame(data)
-    return df
-
-def generate_risk_dataset(n_samples=2000):
-    data = []
-    
-    for _ in range(n_samples):
-        age = random.randint(18, 80)
-        pregnancy = 1 if random.random() < 0.15 and age < 45 else 0
-        glucose = random.randint(70, 250)
-        bp_systolic = random.randint(90, 190)
-        bp_diastolic = random.randint(60, 120)
-        heart_rate = random.randint(55, 120)
-        weight = random.randint(45, 120)
-        height = random.randint(150, 190)
-        bmi = weight / ((height/100) ** 2)
-        
-        # Calculate risk score
-        risk_score = 0.0
-        
-        # Age risk
-        if age > 60:
-            risk_score += 0.2
-        elif age > 45:
-            risk_score += 0.1
-        
-        # Pregnancy risk
-        if pregnancy:
-            risk_score += 0.15
-            if age > 35:
-                risk_score += 0.1
-        
-        # Glucose risk
-        if glucose > 180:
-            risk_score += 0.25
-        elif glucose > 140:
-            risk_score += 0.15
-        elif glucose < 70:
-            risk_score += 0.1
-        
-        # Blood pressure risk
-        if bp_systolic > 160 or bp_diastolic > 100:
-            risk_score += 0.25
-        elif bp_systolic > 140 or bp_diastolic > 90:
-            risk_score += 0.15
-        
-        # Heart rate risk
-        if heart_rate > 100 or heart_rate < 60:
-            risk_score += 0.1
-        
-        # BMI risk
-        if bmi > 30:
-            risk_score += 0.15
-        elif bmi < 18.5:
-            risk_score += 0.1
-        
-        risk_score = min(risk_score, 1.0)
-        
-        row = {
-            'age': age,
-            'pregnancy': pregnancy,
-            'glucose': glucose,
-            'blood_pressure_systolic': bp_systolic,
-            'blood_pressure_diastolic': bp_diastolic,
-            'heart_rate': heart_rate,
-            'weight': weight,
-            'height': height,
-            'bmi': round(bmi, 2),
-            'risk_score': round(risk_score, 2),
-        }
-        data.append(row)
-    
-    df = pd.DataFrame(data)
-    return df
-
-def generate_appointment_dataset(n_samples=2000):
-    data = []
-    start_date = datetime(2023, 1, 1)
-    
-    for i in range(n_samples):
-        patient_id = f'PAT-{i+1:06d}'
-        appointment_date = start_date + timedelta(days=random.randint(0, 365))
-        distance = round(random.uniform(0.5, 50), 2)
-        weather = random.choice(['sunny', 'rainy', 'cloudy'])
-        
-        # Calculate previous no-shows (simulate history)
-        previous_no_shows = random.randint(0, 5)
-        sms_sent = random.choice([0, 1])
-        
-        # Calculate probability of showing up
-        show_prob = 0.8
-        
-        if distance > 30:
-            show_prob -= 0.2
-        elif distance > 15:
-            show_prob -= 0.1
-        
-        if weather == 'rainy':
-            show_prob -= 0.15
-        
-        if previous_no_shows > 2:
-            show_prob -= 0.2
-        elif previous_no_shows > 0:
-            show_prob -= 0.1
-        
-        if sms_sent:
-            show_prob += 0.15
-        
-        show_prob = max(0.1, min(0.95, show_prob))
-        did_come = 1 if random.random() < show_prob else 0
-        
-        row = {
-            'patient_id': patient_id,
-            'appointment_date': appointment_date.strftime('%Y-%m-%d'),
-            'distance_from_hospital': distance,
-            'weather_condition': weather,
-            'previous_no_shows': previous_no_shows,
-            'sms_sent': sms_sent,
-            'did_come': did_come,
-        }
-        data.append(row)
-    
-    df = pd.DataFrame(data)
-    return df
+SYMPTOMS = ['fever', 'headache', 'fatigue', 'cough', 'vomiting', 'diarrhea', 'joint_pain', 'rash']
+DISEASES = list(disease_patterns)
+REGIONS = list(regions_woredas)
+WOREDAS = [woreda for region in REGIONS for woreda in regions_woredas[region]]
+TEST_RESULTS = ['negative', 'positive']
+GENDERS = ['M', 'F']
+WEATHER = ['sunny', 'rainy', 'cloudy']
+APPOINTMENT_START = np.datetime64('2023-01-01')
+
+
+def _pattern_table(key):
+    """(low, high) arrays of an inclusive range, one entry per disease"""
+    ranges = np.array([disease_patterns[disease][key] for disease in DISEASES])
+    return ranges[:, 0], ranges[:, 1]
+
+
+def disease_columns(n, rng):
+    """Disease dataset columns; text columns are category codes"""
+    disease = rng.integers(0, len(DISEASES), size=n)
+
+    def draw(key):
+        low, high = _pattern_table(key)
+        return rng.integers(low[disease], high[disease], endpoint=True)
+
+    symptom_probability = np.array([
+        [disease_patterns[name]['symptoms'].get(symptom, 0.1) for symptom in SYMPTOMS]
+        for name in DISEASES
+    ])
+    symptoms = (rng.random((n, len(SYMPTOMS))) < symptom_probability[disease]).astype(np.int8)
+
+    # Every region has the same number of woredas
+    woredas_per_region = len(WOREDAS) // len(REGIONS)
+    region = rng.integers(0, len(REGIONS), size=n)
+    woreda = region * woredas_per_region + rng.integers(0, woredas_per_region, size=n)
+
+    malaria_test = np.array([
+        TEST_RESULTS.index(disease_patterns[name]['malaria_test']) for name in DISEASES
+    ])[disease]
+
+    columns = {
+        'age': draw('age_range'),
+        'gender': rng.integers(0, len(GENDERS), size=n),
+        'region': region,
+        'woreda': woreda,
+    }
+    columns.update({symptom: symptoms[:, i] for i, symptom in enumerate(SYMPTOMS)})
+    columns.update({
+        'malaria_test': malaria_test,
+        'rdt_result': malaria_test,
+        'blood_pressure_systolic': draw('bp_systolic'),
+        'blood_pressure_diastolic': draw('bp_diastolic'),
+        'glucose_level': draw('glucose'),
+        'diagnosis': disease,
+    })
+    return columns
+
+
+def risk_columns(n, rng):
+    age = rng.integers(18, 80, size=n, endpoint=True)
+    pregnancy = ((rng.random(n) < 0.15) & (age < 45)).astype(np.int8)
+    glucose = rng.integers(70, 250, size=n, endpoint=True)
+    bp_systolic = rng.integers(90, 190, size=n, endpoint=True)
+    bp_diastolic = rng.integers(60, 120, size=n, endpoint=True)
+    heart_rate = rng.integers(55, 120, size=n, endpoint=True)
+    weight = rng.integers(45, 120, size=n, endpoint=True)
+    height = rng.integers(150, 190, size=n, endpoint=True)
+    bmi = weight / ((height / 100) ** 2)
+
+    # Risk rules, added in the same order as the original row-by-row version
+    risk_score = np.zeros(n)
+    risk_score += np.select([age > 60, age > 45], [0.2, 0.1], 0.0)
+    risk_score += np.where(pregnancy == 1, 0.15, 0.0)
+    risk_score += np.where((pregnancy == 1) & (age > 35), 0.1, 0.0)
+    risk_score += np.select([glucose > 180, glucose > 140, glucose < 70], [0.25, 0.15, 0.1], 0.0)
+    risk_score += np.select(
+        [(bp_systolic > 160) | (bp_diastolic > 100), (bp_systolic > 140) | (bp_diastolic > 90)],
+        [0.25, 0.15], 0.0,
+    )
+    risk_score += np.where((heart_rate > 100) | (heart_rate < 60), 0.1, 0.0)
+    risk_score += np.select([bmi > 30, bmi < 18.5], [0.15, 0.1], 0.0)
+    risk_score = np.minimum(risk_score, 1.0)
+
+    return {
+        'age': age,
+        'pregnancy': pregnancy,
+        'glucose': glucose,
+        'blood_pressure_systolic': bp_systolic,
+        'blood_pressure_diastolic': bp_diastolic,
+        'heart_rate': heart_rate,
+        'weight': weight,
+        'height': height,
+        'bmi': np.round(bmi, 2),
+        'risk_score': np.round(risk_score, 2),
+    }
+
+
+def patient_ids(numbers):
+    """PAT-000001 style ids (bytes) for an ascending array of patient numbers"""
+    numbers = np.asarray(numbers, dtype=np.int64)
+    width = max(6, len(str(numbers[-1]))) if len(numbers) else 6
+    ids = np.zeros((len(numbers), 4 + width), dtype=np.uint8)
+    ids[:, :4] = np.frombuffer(b'PAT-', dtype=np.uint8)
+    # Numbers are zero-padded to six digits and grow beyond that, like str.zfill
+    for digits in range(6, width + 1):
+        start, end = np.searchsorted(numbers, [10 ** (digits - 1) if digits > 6 else 0, 10 ** digits])
+        powers = 10 ** np.arange(digits - 1, -1, -1, dtype=np.int64)
+        ids[start:end, 4:4 + digits] = numbers[start:end, None] // powers % 10 + ord('0')
+    return ids.view(f'S{4 + width}').reshape(-1)
+
+
+def appointment_columns(n, rng, offset=0):
+    """Appointment dataset columns; patient ids continue from `offset`"""
+    patient_number = np.arange(offset + 1, offset + n + 1)
+    appointment_date = APPOINTMENT_START + rng.integers(0, 365, size=n, endpoint=True).astype('timedelta64[D]')
+    distance = np.round(rng.uniform(0.5, 50, size=n), 2)
+    weather = rng.integers(0, len(WEATHER), size=n)
+    previous_no_shows = rng.integers(0, 5, size=n, endpoint=True)
+    sms_sent = rng.integers(0, 2, size=n)
+
+    show_prob = np.full(n, 0.8)
+    show_prob -= np.select([distance > 30, distance > 15], [0.2, 0.1], 0.0)
+    show_prob -= np.where(weather == WEATHER.index('rainy'), 0.15, 0.0)
+    show_prob -= np.select([previous_no_shows > 2, previous_no_shows > 0], [0.2, 0.1], 0.0)
+    show_prob += np.where(sms_sent == 1, 0.15, 0.0)
+    show_prob = np.clip(show_prob, 0.1, 0.95)
+    did_come = (rng.random(n) < show_prob).astype(np.int8)
+
+    return {
+        'patient_id': patient_ids(patient_number),
+        'appointment_date': appointment_date,
+        'distance_from_hospital': distance,
+        'weather_condition': weather,
+        'previous_no_shows': previous_no_shows,
+        'sms_sent': sms_sent,
+        'did_come': did_come,
+    }
+
+
+# name -> (column generator, schema, default file name)
+DATASETS = {
+    'disease': (disease_columns, [
+        Column('age', np.int16),
+        Column('gender', CATEGORY, GENDERS),
+        Column('region', CATEGORY, REGIONS),
+        Column('woreda', CATEGORY, WOREDAS),
+        *[Column(symptom, np.int8) for symptom in SYMPTOMS],
+        Column('malaria_test', CATEGORY, TEST_RESULTS),
+        Column('rdt_result', CATEGORY, TEST_RESULTS),
+        Column('blood_pressure_systolic', np.int16),
+        Column('blood_pressure_diastolic', np.int16),
+        Column('glucose_level', np.int16),
+        Column('diagnosis', CATEGORY, DISEASES),
+    ], 'disease_dataset'),
+    'risk': (risk_columns, [
+        Column('age', np.int16),
+        Column('pregnancy', np.int8),
+        Column('glucose', np.int16),
+        Column('blood_pressure_systolic', np.int16),
+        Column('blood_pressure_diastolic', np.int16),
+        Column('heart_rate', np.int16),
+        Column('weight', np.int16),
+        Column('height', np.int16),
+        Column('bmi', np.float64),
+        Column('risk_score', np.float64),
+    ], 'risk_dataset'),
+    'appointments': (appointment_columns, [
+        Column('patient_id', 'S10'),  # widened for more than 999999 rows
+        Column('appointment_date', 'datetime64[D]'),
+        Column('distance_from_hospital', np.float64),
+        Column('weather_condition', CATEGORY, WEATHER),
+        Column('previous_no_shows', np.int8),
+        Column('sms_sent', np.int8),
+        Column('did_come', np.int8),
+    ], 'appointments_dataset'),
+}
+
+
+def generate_chunks(name, n_rows, chunk_size=DEFAULT_CHUNK_SIZE, seed=SEED):
+    """Yield dicts of column arrays (category columns as codes) of up to chunk_size rows"""
+    generate = DATASETS[name][0]
+    n_chunks = -(-n_rows // chunk_size) if n_rows else 0
+    for index, child in enumerate(np.random.SeedSequence(seed).spawn(n_chunks)):
+        offset = index * chunk_size
+        size = min(chunk_size, n_rows - offset)
+        rng = np.random.default_rng(child)
+        if name == 'appointments':
+            yield generate(size, rng, offset=offset)
+        else:
+            yield generate(size, rng)
+
+
+def decode(name, columns):
+    """DataFrame with category codes replaced by their text values"""
+    schema = DATASETS[name][1]
+    frame = {}
+    for column in schema:
+        values = columns[column.name]
+        if column.is_category:
+            values = np.asarray(column.categories, dtype=object)[values]
+        elif values.dtype.kind == 'S':
+            values = values.astype(str)
+        elif values.dtype.kind == 'M':
+            values = np.datetime_as_string(values, unit='D')
+        frame[column.name] = values
+    return pd.DataFrame(frame)
+
+
+def write_csv(name, path, n_rows, chunk_size=DEFAULT_CHUNK_SIZE, seed=SEED):
+    with open(path, 'w', newline='') as f:
+        for index, columns in enumerate(generate_chunks(name, n_rows, chunk_size, seed)):
+            decode(name, columns).to_csv(f, header=index == 0, index=False)
+
+
+def write_columnar(name, path, n_rows, chunk_size=DEFAULT_CHUNK_SIZE, seed=SEED):
+    schema = [Column(column.name, column.dtype, column.categories) for column in DATASETS[name][1]]
+    if name == 'appointments':
+        schema[0].dtype = f'S{4 + max(6, len(str(n_rows)))}'
+    metadata = {'generator': 'datasets/generate_datasets.py', 'dataset': name, 'seed': seed, 'chunk_size': chunk_size}
+    with ColumnarWriter(path, n_rows, schema, metadata) as writer:
+        for columns in generate_chunks(name, n_rows, chunk_size, seed):
+            writer.append(columns)
+
+
+def generate_disease_dataset(n_samples=DEFAULT_ROWS, seed=SEED):
+    return decode('disease', next(generate_chunks('disease', n_samples, max(n_samples, 1), seed)))
+
+
+def generate_risk_dataset(n_samples=DEFAULT_ROWS, seed=SEED):
+    return decode('risk', next(generate_chunks('risk', n_samples, max(n_samples, 1), seed)))
+
+
+def generate_appointment_dataset(n_samples=DEFAULT_ROWS, seed=SEED):
+    return decode('appointments', next(generate_chunks('appointments', n_samples, max(n_samples, 1), seed)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the synthetic ML training datasets')
+    parser.add_argument('datasets', nargs='*', default=list(DATASETS),
+                        help='Datasets to generate: disease, risk, appointments (default: all)')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS,
+                        help=f'Rows per dataset (default: {DEFAULT_ROWS})')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'Rows generated at a time (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--seed', type=int, default=SEED,
+                        help=f'Random seed (default: {SEED})')
+    parser.add_argument('--format', choices=['csv', 'columnar'], default='csv',
+                        help='csv files, or columnar directories of .npy files (default: csv)')
+    parser.add_argument('--output-dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='Directory to write to (default: this directory)')
+    args = parser.parse_args(argv)
+
+    for name in args.datasets:
+        if name not in DATASETS:
+            parser.error(f'unknown dataset: {name}')
+        base_name = DATASETS[name][2]
+        started = time.perf_counter()
+        if args.format == 'csv':
+            path = os.path.join(args.output_dir, f'{base_name}.csv')
+            write_csv(name, path, args.rows, args.chunk_size, args.seed)
+        else:
+            path = os.path.join(args.output_dir, base_name)
+            write_columnar(name, path, args.rows, args.chunk_size, args.seed)
+        print(f'{name}: {args.rows} rows -> {path} ({time.perf_counter() - started:.1f}s)')
+
 
 if __name__ == '__main__':
-    import os
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    print("Generating disease prediction dataset...")
-    disease_df = generate_disease_dataset(2000)
-    disease_df.to_csv(os.path.join(script_dir, 'disease_dataset.csv'), index=False)
-    print(f"Disease dataset created: {len(disease_df)} rows")
-    print(disease_df['diagnosis'].value_counts())
-    
-    print("\nGenerating risk scoring dataset...")
-    risk_df = generate_risk_dataset(2000)
-    risk_df.to_csv(os.path.join(script_dir, 'risk_dataset.csv'), index=False)
-    print(f"Risk dataset created: {len(risk_df)} rows")
-    print(f"High risk patients (>0.7): {len(risk_df[risk_df['risk_score'] > 0.7])}")
-    
-    print("\nGenerating appointment no-show dataset...")
-    appointment_df = generate_appointment_dataset(2000)
-    appointment_df.to_csv(os.path.join(script_dir, 'appointments_dataset.csv'), index=False)
-    print(f"Appointment dataset created: {len(appointment_df)} rows")
-    print(f"No-show rate: {(1 - appointment_df['did_come'].mean()) * 100:.1f}%")
-    
-    print("\nAll datasets generated successfully!")
+    main()
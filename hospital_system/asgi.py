@@ -0,0 +1,12 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_system.settings')
+application = get_asgi_application()
+
+from django.conf import settings
+
+if settings.ML_PRELOAD_MODELS:
+    # With `gunicorn --preload` this runs once in the master, before fork
+    from ml_models.predict import warm_up
+    warm_up()
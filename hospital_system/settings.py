@@ -33,6 +33,7 @@ INSTALLED_APPS = [
     'laboratory',
     'pharmacy',
     'billing',
+    'rollups',
 ]
 
 MIDDLEWARE = [
@@ -66,6 +67,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'hospital_system.wsgi.application'
+ASGI_APPLICATION = 'hospital_system.asgi.application'
 
 DATABASES = {
     'default': dj_database_url.config(
@@ -133,6 +135,58 @@ CSRF_TRUSTED_ORIGINS = [
 # ML Models Configuration
 ML_MODELS_PATH = BASE_DIR / 'ml_models' / 'trained_models'
 DATASETS_PATH = BASE_DIR / 'datasets'
+# Seconds between checks for updated model files (hot reload)
+ML_MODEL_RELOAD_INTERVAL = config('ML_MODEL_RELOAD_INTERVAL', default=5.0, cast=float)
+# Serve this model version instead of the one named in ML_MODELS_PATH/CURRENT
+ML_MODEL_VERSION = config('ML_MODEL_VERSION', default='')
+# Preprocessed training matrices, keyed by dataset checksum (train_models)
+ML_FEATURE_CACHE_PATH = BASE_DIR / 'ml_models' / 'feature_cache'
+# Serve the no-show model updated from real appointment outcomes by the
+# learn_noshow_outcomes worker, once it has written a checkpoint
+ML_ONLINE_LEARNING = config('ML_ONLINE_LEARNING', default=False, cast=bool)
+# Serve compiled forests (memory-mapped *.forest/ directories) instead of pickles when present
+ML_USE_COMPILED_MODELS = config('ML_USE_COMPILED_MODELS', default=True, cast=bool)
+# Prefer the compact forests written by compact_models over the full compiled ones
+ML_USE_COMPACT_MODELS = config('ML_USE_COMPACT_MODELS', default=True, cast=bool)
+# Load all models when the WSGI application starts (see Procfile --preload)
+ML_PRELOAD_MODELS = config('ML_PRELOAD_MODELS', default=True, cast=bool)
+# Largest number of records accepted by the batch prediction endpoints
+ML_BATCH_MAX_ROWS = config('ML_BATCH_MAX_ROWS', default=5000, cast=int)
+# Largest batch for which feature contributions (explain=true) are computed
+ML_EXPLAIN_MAX_ROWS = config('ML_EXPLAIN_MAX_ROWS', default=500, cast=int)
+# In-process prediction cache (entries, seconds); size 0 disables it
+ML_PREDICTION_CACHE_SIZE = config('ML_PREDICTION_CACHE_SIZE', default=10000, cast=int)
+ML_PREDICTION_CACHE_TTL = config('ML_PREDICTION_CACHE_TTL', default=300.0, cast=float)
+# Micro-batching of concurrent single-row predictions. Worth enabling with
+# threaded (gthread) workers.
+ML_MICRO_BATCHING = config('ML_MICRO_BATCHING', default=False, cast=bool)
+ML_MICRO_BATCH_WAIT_MS = config('ML_MICRO_BATCH_WAIT_MS', default=3.0, cast=float)
+ML_MICRO_BATCH_MAX_ROWS = config('ML_MICRO_BATCH_MAX_ROWS', default=64, cast=int)
+# Drift monitoring: workers count prediction inputs into the training
+# reference bins and write their counts here every flush interval (seconds)
+ML_DRIFT_MONITORING = config('ML_DRIFT_MONITORING', default=True, cast=bool)
+ML_DRIFT_PATH = config('ML_DRIFT_PATH', default=str(BASE_DIR / 'ml_models' / 'drift'))
+ML_DRIFT_FLUSH_INTERVAL = config('ML_DRIFT_FLUSH_INTERVAL', default=30.0, cast=float)
+# drift_report deletes worker files not updated for this long (exited workers)
+ML_DRIFT_RETENTION_HOURS = config('ML_DRIFT_RETENTION_HOURS', default=168.0, cast=float)
+# Shadow evaluation: score sampled predictions with this model version too,
+# on background threads, and report how often it agrees (empty disables it)
+ML_SHADOW_VERSION = config('ML_SHADOW_VERSION', default='')
+ML_SHADOW_SAMPLE_RATE = config('ML_SHADOW_SAMPLE_RATE', default=1.0, cast=float)
+ML_SHADOW_QUEUE_SIZE = config('ML_SHADOW_QUEUE_SIZE', default=1000, cast=int)
+ML_SHADOW_THREADS = config('ML_SHADOW_THREADS', default=1, cast=int)
+ML_SHADOW_MAX_ROWS = config('ML_SHADOW_MAX_ROWS', default=100, cast=int)
+ML_SHADOW_FLUSH_INTERVAL = config('ML_SHADOW_FLUSH_INTERVAL', default=60.0, cast=float)
+ML_SHADOW_LOG_PATH = config('ML_SHADOW_LOG_PATH', default=str(BASE_DIR / 'ml_models' / 'shadow.jsonl'))
+
+# Live dashboard (server-sent events, served by the ASGI process): seconds
+# between change-feed polls, between keepalives, and before a client reconnects
+DASHBOARD_EVENTS_INTERVAL = config('DASHBOARD_EVENTS_INTERVAL', default=2.0, cast=float)
+DASHBOARD_EVENTS_HEARTBEAT = config('DASHBOARD_EVENTS_HEARTBEAT', default=15.0, cast=float)
+DASHBOARD_EVENTS_MAX_SECONDS = config('DASHBOARD_EVENTS_MAX_SECONDS', default=300.0, cast=float)
+
+# Length of an appointment slot in doctors' schedules (appointments.availability)
+APPOINTMENT_SLOT_MINUTES = config('APPOINTMENT_SLOT_MINUTES', default=30, cast=int)
 
 # Celery Configuration
 CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
@@ -0,0 +1,185 @@
+"""
+Micro-batching of concurrent single-row predictions
+
+When several requests need a prediction at the same moment, scoring each row
+with its own predict_proba call wastes most of the time on per-call overhead.
+A MicroBatcher collects rows that arrive within a short window (or until a
+row limit is reached), scores them with one call on a background thread and
+hands every caller its own result. Sync callers block on a
+concurrent.futures.Future; async callers can await the same future wrapped
+for asyncio (MicroBatcher.submit_async).
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+
+
+class _Request:
+    __slots__ = ('row', 'future', 'enqueued')
+
+    def __init__(self, row):
+        self.row = row
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    Collects rows into batches for a vectorized scoring function.
+
+    Args:
+        score: callable taking a 2-D float64 matrix and returning one result
+            per row (any sequence indexable by row position)
+        max_batch: maximum rows per batch
+        max_wait: seconds the first row of a batch waits for company
+        name: label used in stats
+    """
+
+    def __init__(self, score, max_batch=64, max_wait=0.003, name=''):
+        self.score = score
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+        self.max_batch_seen = 0
+        self._recent_sizes = deque(maxlen=1000)
+        self._recent_waits = deque(maxlen=1000)
+
+    def submit(self, row):
+        """Queue a feature row; returns a Future resolving to its result"""
+        self._ensure_worker()
+        request = _Request(row)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, row):
+        """Score one row, blocking until its batch has been processed"""
+        return self.submit(row).result()
+
+    async def submit_async(self, row):
+        """Score one row from async code without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(row))
+
+    def _ensure_worker(self):
+        # Started lazily so that the thread is created after gunicorn forks
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f'micro-batcher-{self.name}', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = first.enqueued + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._execute(batch)
+
+    def _execute(self, batch):
+        started = time.monotonic()
+        try:
+            matrix = np.array([request.row for request in batch], dtype=np.float64)
+            results = self.score(matrix)
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for index, request in enumerate(batch):
+            # Every caller must be answered, even if one result cannot be read
+            try:
+                request.future.set_result(results[index])
+            except Exception as e:
+                request.future.set_exception(e)
+
+        with self._stats_lock:
+            self.batches += 1
+            self.rows += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self._recent_sizes.append(len(batch))
+            self._recent_waits.extend(started - request.enqueued for request in batch)
+
+    def stats(self):
+        with self._stats_lock:
+            sizes = np.array(self._recent_sizes, dtype=np.float64)
+            waits = np.array(self._recent_waits, dtype=np.float64) * 1000
+            return {
+                'batches': self.batches,
+                'rows': self.rows,
+                'errors': self.errors,
+                'queued': self._queue.qsize(),
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000,
+                'largest_batch': self.max_batch_seen,
+                'mean_batch_size': round(float(sizes.mean()), 2) if len(sizes) else 0.0,
+                'queue_wait_ms': {
+                    'mean': round(float(waits.mean()), 3) if len(waits) else 0.0,
+                    'p50': round(float(np.percentile(waits, 50)), 3) if len(waits) else 0.0,
+                    'p95': round(float(np.percentile(waits, 95)), 3) if len(waits) else 0.0,
+                },
+            }
+
+
+# (model registry, name) -> MicroBatcher
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(name, score, model_registry):
+    """
+    Process-wide MicroBatcher for `name` on one model registry, configured
+    from settings. The batcher keeps the `score` of its first caller, so
+    predictors on another registry (a shadow candidate, tests) get their
+    own batcher instead of being scored with the wrong models.
+    """
+    key = (model_registry, name)
+    batcher = _batchers.get(key)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(key)
+            if batcher is None:
+                batcher = MicroBatcher(
+                    score,
+                    max_batch=getattr(settings, 'ML_MICRO_BATCH_MAX_ROWS', 64),
+                    max_wait=getattr(settings, 'ML_MICRO_BATCH_WAIT_MS', 3.0) / 1000,
+                    name=name,
+                )
+                _batchers[key] = batcher
+    return batcher
+
+
+def batcher_stats():
+    """Stats of the batchers of the serving registry, by name"""
+    from .registry import registry
+
+    return {
+        name: batcher.stats()
+        for (model_registry, name), batcher in list(_batchers.items())
+        if model_registry is registry
+    }
@@ -0,0 +1,326 @@
+"""
+Inference benchmarks for the ML predictors
+
+Measures, for DiseasePrediction, RiskScoring and NoShowPrediction:
+
+- single-call latency of predict / calculate_risk / predict_noshow
+- batch latency and rows/sec of the vectorized paths for several batch sizes
+- cold (first load + first prediction) versus warm latency
+- load time, resident memory and on-disk size of every model file
+- the closed-form no-show scorer: equality with sklearn and its speedup
+
+Inputs are synthetic records drawn from a seeded generator in the same ranges
+as the training data, so two runs with the same seed score the same rows.
+The prediction cache is bypassed while benchmarking so that every call hits
+the model, and the synthetic inputs are kept out of drift monitoring and
+shadow evaluation. Results are plain dicts that serialize to JSON; compare() diffs
+two result files to spot regressions between commits.
+"""
+
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .cache import prediction_cache
+from .forest import MANIFEST
+from .features import SYMPTOMS, noshow_matrix_from_records, risk_matrix_from_records
+from .predict import DiseasePrediction, LinearScorer, NoShowPrediction, RiskScoring, unobserved
+from .registry import load_artifact, measure_load, registry
+
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+WEATHER = ['sunny', 'rainy', 'cloudy']
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        'n': int(len(ms)),
+        'mean': round(float(ms.mean()), 4),
+        'p50': round(float(np.percentile(ms, 50)), 4),
+        'p95': round(float(np.percentile(ms, 95)), 4),
+        'p99': round(float(np.percentile(ms, 99)), 4),
+        'max': round(float(ms.max()), 4),
+    }
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def disease_records(n, rng):
+    symptoms = rng.integers(0, 2, size=(n, len(SYMPTOMS)))
+    return [
+        dict(
+            zip(SYMPTOMS, map(int, symptoms[i])),
+            age=int(rng.integers(1, 90)),
+            gender='M' if rng.random() < 0.5 else 'F',
+            blood_pressure_systolic=int(rng.integers(90, 180)),
+            blood_pressure_diastolic=int(rng.integers(60, 110)),
+            glucose_level=float(rng.uniform(70, 250)),
+        )
+        for i in range(n)
+    ]
+
+
+def risk_records(n, rng):
+    return [
+        {
+            'age': int(rng.integers(1, 90)),
+            'pregnancy': int(rng.random() < 0.1),
+            'glucose': float(rng.uniform(70, 250)),
+            'blood_pressure_systolic': int(rng.integers(90, 180)),
+            'blood_pressure_diastolic': int(rng.integers(60, 110)),
+            'heart_rate': int(rng.integers(55, 120)),
+            'weight': float(rng.uniform(40, 110)),
+            'bmi': float(rng.uniform(16, 38)),
+        }
+        for _ in range(n)
+    ]
+
+
+def noshow_records(n, rng):
+    return [
+        {
+            'distance_from_hospital': float(rng.uniform(0.5, 50)),
+            'weather_condition': WEATHER[int(rng.integers(0, len(WEATHER)))],
+            'previous_no_shows': int(rng.integers(0, 5)),
+            'sms_sent': int(rng.random() < 0.7),
+        }
+        for _ in range(n)
+    ]
+
+
+def predictors():
+    """
+    Benchmark targets: name -> (single-call fn, batch fn over records,
+    record generator, model files used)
+    """
+    disease, risk, noshow = DiseasePrediction(), RiskScoring(), NoShowPrediction()
+    return {
+        'disease': (
+            disease.predict,
+            disease.predict_batch,
+            disease_records,
+            [disease.model_file],
+        ),
+        'risk': (
+            risk.calculate_risk,
+            lambda records: risk.score_matrix(risk_matrix_from_records(records)),
+            risk_records,
+            [risk.model_file, risk.scaler_file],
+        ),
+        'noshow': (
+            noshow.predict_noshow,
+            lambda records: noshow.noshow_probabilities(noshow_matrix_from_records(records)),
+            noshow_records,
+            [noshow.model_file],
+        ),
+    }
+
+
+def path_size(path):
+    """Bytes on disk of a model file, or of a compiled model's directory"""
+    if os.path.basename(path) == MANIFEST:
+        directory = os.path.dirname(path)
+        return sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+    return os.path.getsize(path)
+
+
+def bench_models(model_files, repeat=3):
+    """Load time and memory of each model file, loaded `repeat` times from disk"""
+    results = {}
+    for model_file in model_files:
+        path = registry.path_for(model_file)
+        seconds, memory = [], []
+        for _ in range(repeat):
+            obj, elapsed, added = measure_load(load_artifact, path)
+            seconds.append(elapsed)
+            memory.append(added)
+            del obj
+        results[model_file] = {
+            'path': str(path),
+            'compiled': os.path.basename(path) == MANIFEST,
+            'disk_bytes': path_size(path),
+            'load_ms': percentiles(seconds),
+            # The first load is the honest number; later loads may reuse freed memory
+            'memory_bytes': memory[0],
+        }
+    return results
+
+
+def bench_predictor(single, batch, make_records, model_files,
+                    batch_sizes=DEFAULT_BATCH_SIZES, single_calls=1000,
+                    batch_repeat=20, seed=0):
+    rng = np.random.default_rng(seed)
+    result = {'model_files': list(model_files)}
+
+    # Cold: drop the loaded models so the first call pays for loading them
+    records = make_records(single_calls, rng)
+    registry.clear()
+    result['cold_first_call_ms'] = round(timed(single, records[0]) * 1000, 4)
+    result['warm_first_call_ms'] = round(timed(single, records[0]) * 1000, 4)
+
+    result['single'] = percentiles([timed(single, record) for record in records])
+    result['single']['rows_per_sec'] = round(1000 / result['single']['mean'], 1)
+
+    result['batch'] = {}
+    for size in batch_sizes:
+        records = make_records(size, rng)
+        batch(records)  # warm-up at this size
+        # Fewer repeats for the large sizes, but always enough for p99 to mean something
+        repeat = max(5, min(batch_repeat, (100000 // size)))
+        samples = [timed(batch, records) for _ in range(repeat)]
+        summary = percentiles(samples)
+        summary['rows_per_sec'] = round(size / np.median(samples), 1)
+        result['batch'][str(size)] = summary
+    return result
+
+
+def bench_linear_scorer(rows=100000, single_calls=1000, seed=0):
+    """
+    Closed-form no-show scorer against sklearn's predict_proba.
+
+    Checks that both give identical probabilities on `rows` synthetic
+    appointments, then times single-row and full-batch scoring with each.
+    """
+    rng = np.random.default_rng(seed)
+    predictor = NoShowPrediction()
+    model = predictor.model
+    if not hasattr(model, 'coef_'):
+        return {'skipped': f'{type(model).__name__} is not a linear model'}
+    scorer = LinearScorer.from_model(model)
+
+    matrix = noshow_matrix_from_records(noshow_records(rows, rng))
+    reference = model.predict_proba(matrix)
+    fast = scorer.predict_proba(matrix)
+    result = {
+        'rows_checked': rows,
+        'identical': bool(np.array_equal(reference, fast)),
+        'max_abs_diff': float(np.abs(reference - fast).max()),
+    }
+
+    singles = matrix[:single_calls, np.newaxis, :]
+    for label, fn in [('sklearn', model.predict_proba), ('closed_form', scorer.predict_proba)]:
+        result[label] = {
+            'single': percentiles([timed(fn, row) for row in singles]),
+            'batch': percentiles([timed(fn, matrix) for _ in range(10)]),
+        }
+        result[label]['batch']['rows_per_sec'] = round(rows / (result[label]['batch']['p50'] / 1000), 1)
+    result['single_speedup'] = round(result['sklearn']['single']['p50'] / result['closed_form']['single']['p50'], 1)
+    result['batch_speedup'] = round(result['sklearn']['batch']['p50'] / result['closed_form']['batch']['p50'], 1)
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    try:
+        import sklearn
+        sklearn_version = sklearn.__version__
+    except ImportError:
+        sklearn_version = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn_version,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'compiled_models': getattr(settings, 'ML_USE_COMPILED_MODELS', True),
+        'micro_batching': getattr(settings, 'ML_MICRO_BATCHING', False),
+    }
+
+
+def run(names=None, batch_sizes=DEFAULT_BATCH_SIZES, single_calls=1000,
+        batch_repeat=20, load_repeat=3, seed=0, log=None):
+    """
+    Run the benchmark suite and return the results as a dict.
+
+    Args:
+        names: predictors to benchmark (default: all of them)
+        batch_sizes: batch sizes for the vectorized paths
+        single_calls: number of single-row calls timed per predictor
+        batch_repeat: timed repetitions per batch size (capped for large sizes)
+        load_repeat: times each model file is loaded to time it
+        seed: seed for the synthetic inputs
+        log: optional callable receiving progress messages
+    """
+    log = log or (lambda message: None)
+    targets = predictors()
+    names = names or list(targets)
+
+    results = {'environment': environment(), 'predictors': {}}
+
+    # Every call must reach the model, so switch the prediction cache off
+    saved_maxsize = prediction_cache._maxsize
+    prediction_cache._maxsize = 0
+    prediction_cache.invalidate()
+    try:
+        model_files = []
+        for name in names:
+            model_files.extend(f for f in targets[name][3] if f not in model_files)
+        log('Loading models...')
+        results['models'] = bench_models(model_files, repeat=load_repeat)
+
+        with unobserved():
+            for name in names:
+                log(f'Benchmarking {name}...')
+                results['predictors'][name] = bench_predictor(
+                    *targets[name],
+                    batch_sizes=batch_sizes, single_calls=single_calls,
+                    batch_repeat=batch_repeat, seed=seed,
+                )
+            if 'noshow' in names:
+                log('Checking the closed-form no-show scorer...')
+                results['noshow_linear_scorer'] = bench_linear_scorer(single_calls=single_calls, seed=seed)
+    finally:
+        prediction_cache._maxsize = saved_maxsize
+    return results
+
+
+def compare(baseline, current):
+    """
+    Relative change of the headline numbers between two result dicts.
+
+    Returns a list of (metric, baseline, current, ratio) tuples, where ratio
+    is current / baseline (above 1 means slower for latencies and faster
+    for rows_per_sec).
+    """
+    rows = []
+
+    def add(metric, old, new):
+        if old and new is not None:
+            rows.append((metric, old, new, round(new / old, 3)))
+
+    for name, result in current.get('predictors', {}).items():
+        old = baseline.get('predictors', {}).get(name)
+        if not old:
+            continue
+        for key in ('p50', 'p95', 'p99'):
+            add(f'{name}.single.{key}_ms', old['single'][key], result['single'][key])
+        for size, summary in result['batch'].items():
+            previous = old['batch'].get(size)
+            if previous:
+                add(f'{name}.batch[{size}].p95_ms', previous['p95'], summary['p95'])
+                add(f'{name}.batch[{size}].rows_per_sec', previous['rows_per_sec'], summary['rows_per_sec'])
+        add(f'{name}.cold_first_call_ms', old['cold_first_call_ms'], result['cold_first_call_ms'])
+    for model_file, result in current.get('models', {}).items():
+        old = baseline.get('models', {}).get(model_file)
+        if old:
+            add(f'{model_file}.load_p50_ms', old['load_ms']['p50'], result['load_ms']['p50'])
+            add(f'{model_file}.memory_bytes', old['memory_bytes'], result['memory_bytes'])
+    return rows
@@ -0,0 +1,124 @@
+"""
+In-process memoization of ML predictions
+
+Predictions are keyed on the model file, the model version reported by the
+registry and a hash of the canonical feature vector, so a reloaded model can
+never serve results computed by its predecessor. Entries are evicted in LRU
+order once the cache is full and expire after a fixed time-to-live.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .registry import registry
+
+
+def feature_key(row):
+    """Stable hash of a feature vector, independent of int/float input types"""
+    vector = np.asarray(row, dtype=np.float64) + 0.0  # folds -0.0 into 0.0
+    return hashlib.blake2b(vector.tobytes(), digest_size=16).hexdigest()
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with TTL expiry for prediction results.
+
+    Args:
+        maxsize: maximum number of entries (defaults to
+            settings.ML_PREDICTION_CACHE_SIZE); 0 disables caching
+        ttl: seconds an entry stays valid (defaults to
+            settings.ML_PREDICTION_CACHE_TTL)
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is not None:
+            return self._maxsize
+        return getattr(settings, 'ML_PREDICTION_CACHE_SIZE', 10000)
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'ML_PREDICTION_CACHE_TTL', 300.0)
+
+    def make_key(self, model_names, version, row):
+        """Key for a feature row scored by the given model file(s) at `version`"""
+        return (tuple(model_names), version, feature_key(row))
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        maxsize = self.maxsize
+        if maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, model_name=None):
+        """Drop every entry, or only the entries computed by one model file"""
+        with self._lock:
+            if model_name is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [key for key in self._entries if model_name in key[0]]
+                for key in stale:
+                    del self._entries[key]
+                removed = len(stale)
+            self.invalidations += removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+prediction_cache = PredictionCache()
+registry.add_listener(lambda name, artifact: prediction_cache.invalidate(name))
@@ -0,0 +1,367 @@
+"""
+Columnar dataset format
+
+A dataset is a directory with one .npy file per column and a schema.json
+manifest listing the columns in order with their dtypes. Text columns with
+few distinct values (gender, region, diagnosis, ...) are stored as integer
+codes, and their categories are listed in the manifest. Columns can be
+appended chunk by chunk, so datasets far larger than memory can be written,
+and each column can be memory-mapped on its own later.
+
+    dataset = open_dataset('datasets/disease_dataset')
+    dataset['age'].mean()               # maps age.npy only
+    dataset.decoded('diagnosis')        # category codes -> text
+
+convert_csv() turns an existing CSV into this format.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+SCHEMA_FILE = 'schema.json'
+FORMAT = 'columnar-npy'
+FORMAT_VERSION = 1
+
+CATEGORY = 'category'
+MAX_CATEGORIES = np.iinfo(np.int16).max
+# Text columns with more distinct values than this are stored as plain text
+CONVERT_MAX_CATEGORIES = 1000
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Column:
+    """
+    Schema entry for one column.
+
+    Args:
+        name: column name
+        dtype: numpy dtype, or 'category' for dictionary-encoded text
+        categories: known category values (category columns only); values
+            not listed are added in order of first appearance
+    """
+
+    def __init__(self, name, dtype, categories=None):
+        self.name = name
+        self.dtype = dtype
+        self.categories = list(categories) if categories is not None else []
+
+    @property
+    def is_category(self):
+        return self.dtype == CATEGORY
+
+    @property
+    def storage_dtype(self):
+        return np.dtype(np.int16) if self.is_category else np.dtype(self.dtype)
+
+    def encode(self, values):
+        """
+        Category codes for an array of values, extending the categories as
+        needed. Integer arrays are taken to be codes already.
+        """
+        values = np.asarray(values)
+        if values.dtype.kind in 'iu':
+            if len(values) and (values.min() < 0 or values.max() >= len(self.categories)):
+                raise ValueError(f'Codes for column {self.name} are out of range')
+            return values.astype(np.int16)
+        uniques, inverse = np.unique(values, return_inverse=True)
+        index = {value: code for code, value in enumerate(self.categories)}
+        lookup = np.empty(len(uniques), dtype=np.int16)
+        for position, value in enumerate(uniques.tolist()):
+            if value not in index:
+                if len(self.categories) >= MAX_CATEGORIES:
+                    raise ValueError(f'Column {self.name} has more than {MAX_CATEGORIES} distinct values')
+                index[value] = len(self.categories)
+                self.categories.append(value)
+            lookup[position] = index[value]
+        return lookup[inverse.reshape(-1)]
+
+    def as_dict(self, sha256=None):
+        entry = {
+            'name': self.name,
+            'dtype': CATEGORY if self.is_category else self.storage_dtype.str,
+            'file': f'{self.name}.npy',
+            'sha256': sha256,
+        }
+        if self.is_category:
+            entry['codes_dtype'] = self.storage_dtype.str
+            entry['categories'] = self.categories
+        return entry
+
+
+class ColumnarWriter:
+    """
+    Writes a dataset of a known number of rows, one chunk at a time.
+
+    Every column file is created at its final size and filled as chunks
+    arrive, so memory use is bounded by the chunk size. Files are written
+    to a temporary directory that replaces `path` on close(), so readers
+    never see a half-written dataset.
+
+    Args:
+        path: dataset directory to create
+        n_rows: total number of rows that will be appended
+        columns: list of Column
+        metadata: optional dict stored in the manifest (seed, source, ...)
+    """
+
+    def __init__(self, path, n_rows, columns, metadata=None):
+        self.path = str(path)
+        self.n_rows = int(n_rows)
+        self.columns = columns
+        self.metadata = metadata or {}
+        self.rows_written = 0
+        self.manifest = None
+        self._staging = f'{self.path}.tmp{os.getpid()}'
+        shutil.rmtree(self._staging, ignore_errors=True)
+        os.makedirs(self._staging)
+        self._arrays = {
+            column.name: np.lib.format.open_memmap(
+                os.path.join(self._staging, f'{column.name}.npy'),
+                mode='w+', dtype=column.storage_dtype, shape=(self.n_rows,),
+            )
+            for column in columns
+        }
+
+    def append(self, chunk):
+        """Append a chunk: dict (or DataFrame) of equally long columns"""
+        lengths = {len(chunk[column.name]) for column in self.columns}
+        if len(lengths) != 1:
+            raise ValueError('All columns of a chunk must have the same length')
+        size = lengths.pop()
+        start, end = self.rows_written, self.rows_written + size
+        if end > self.n_rows:
+            raise ValueError(f'Dataset was declared with {self.n_rows} rows')
+        for column in self.columns:
+            values = np.asarray(chunk[column.name])
+            self._arrays[column.name][start:end] = column.encode(values) if column.is_category else values
+        self.rows_written = end
+
+    def close(self):
+        if self.rows_written != self.n_rows:
+            self.abort()
+            raise ValueError(f'Wrote {self.rows_written} of {self.n_rows} declared rows')
+        for array in self._arrays.values():
+            array.flush()
+        self._arrays = {}
+        manifest = {
+            'format': FORMAT,
+            'version': FORMAT_VERSION,
+            'rows': self.n_rows,
+            'columns': [
+                column.as_dict(file_sha256(os.path.join(self._staging, f'{column.name}.npy')))
+                for column in self.columns
+            ],
+            'metadata': self.metadata,
+        }
+        with open(os.path.join(self._staging, SCHEMA_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.rename(self._staging, self.path)
+        self.manifest = manifest
+        return manifest
+
+    def abort(self):
+        self._arrays = {}
+        shutil.rmtree(self._staging, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def is_columnar(path):
+    return os.path.isfile(os.path.join(path, SCHEMA_FILE))
+
+
+class ColumnarDataset:
+    """
+    Read-only view of a columnar dataset.
+
+    Opening one only reads schema.json; each column file is memory-mapped
+    the first time it is used, so only the pages of the columns actually
+    read are ever loaded.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(os.path.join(self.path, SCHEMA_FILE)) as f:
+            self.schema = json.load(f)
+        if self.schema.get('format') != FORMAT or self.schema.get('version') != FORMAT_VERSION:
+            raise ValueError(f'{self.path} is not a {FORMAT} v{FORMAT_VERSION} dataset')
+        self.rows = self.schema['rows']
+        self.metadata = self.schema.get('metadata', {})
+        self._columns = {entry['name']: entry for entry in self.schema['columns']}
+        self._arrays = {}
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        """Memory-mapped column; category columns give their codes"""
+        if name not in self._columns:
+            raise KeyError(f'{self.path} has no column {name!r}')
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, self._columns[name]['file']), mmap_mode='r')
+        return self._arrays[name]
+
+    def is_category(self, name):
+        return self._columns[name]['dtype'] == CATEGORY
+
+    def categories(self, name):
+        return self._columns[name].get('categories', [])
+
+    def decoded(self, name):
+        """Column values with category codes and bytes turned back into text"""
+        values = self[name]
+        if self.is_category(name):
+            return np.asarray(self.categories(name), dtype=object)[values]
+        if values.dtype.kind == 'S':
+            return np.char.decode(values, 'utf-8').astype(object)
+        return values
+
+    def mapped(self, name, mapping, dtype=np.float64):
+        """
+        Category column translated through `mapping` (category -> value)
+        with a single lookup per row
+        """
+        categories = self.categories(name)
+        unknown = set(categories) - set(mapping)
+        if unknown:
+            # Only an error if the unknown categories actually occur
+            counts = np.bincount(self[name], minlength=len(categories))
+            present = {category for category, count in zip(categories, counts) if count}
+            unknown &= present
+            if unknown:
+                raise ValueError(f'Unexpected {name} values in dataset: {sorted(unknown)}')
+        lookup = np.array([mapping.get(category, 0) for category in categories], dtype=dtype)
+        return lookup[self[name]]
+
+    def matrix(self, names, dtype=np.float64):
+        """2-D array of numeric columns, in the given order"""
+        X = np.empty((self.rows, len(names)), dtype=dtype)
+        for i, name in enumerate(names):
+            X[:, i] = self[name]
+        return X
+
+    def to_pandas(self, columns=None):
+        """DataFrame of the given columns (all by default); categories become pandas Categoricals"""
+        import pandas as pd
+
+        frame = {}
+        for name in columns or self.columns:
+            if self.is_category(name):
+                frame[name] = pd.Categorical.from_codes(self[name], categories=self.categories(name))
+            else:
+                frame[name] = self.decoded(name)
+        return pd.DataFrame(frame)
+
+
+def open_dataset(path):
+    return ColumnarDataset(path)
+
+
+def _csv_schema(csv_path, chunk_size, max_categories):
+    """Row count and Column list inferred by reading the CSV once"""
+    import pandas as pd
+
+    rows = 0
+    kinds = {}
+    bounds = {}
+    text = {}
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        rows += len(chunk)
+        for name, series in chunk.items():
+            kind = series.dtype.kind
+            if kind == 'b':
+                kind = 'i'
+            if kind not in 'if':
+                kind = 'O'
+            previous = kinds.setdefault(name, kind)
+            if previous != kind:
+                kinds[name] = 'O' if 'O' in (previous, kind) else 'f'
+            if kind == 'i':
+                low, high = bounds.get(name, (0, 0))
+                bounds[name] = (min(low, int(series.min())), max(high, int(series.max())))
+            elif kind == 'O':
+                stats = text.setdefault(name, {'values': set(), 'width': 1})
+                values = series.fillna('').astype(str)
+                if stats['values'] is not None:
+                    stats['values'].update(values.unique().tolist())
+                    if len(stats['values']) > max_categories:
+                        stats['values'] = None
+                stats['width'] = max(stats['width'], int(values.str.encode('utf-8').str.len().max() or 1))
+
+    columns = []
+    for name, kind in kinds.items():
+        if kind == 'i':
+            low, high = bounds[name]
+            dtype = next(
+                t for t in (np.int8, np.int16, np.int32, np.int64)
+                if np.iinfo(t).min <= low and high <= np.iinfo(t).max
+            )
+            columns.append(Column(name, dtype))
+        elif kind == 'f':
+            columns.append(Column(name, np.float64))
+        elif text[name]['values'] is not None:
+            columns.append(Column(name, CATEGORY, sorted(text[name]['values'])))
+        else:
+            columns.append(Column(name, f"S{text[name]['width']}"))
+    return rows, columns
+
+
+def convert_csv(csv_path, path, chunk_size=500000, max_categories=CONVERT_MAX_CATEGORIES):
+    """
+    Convert a CSV file into a columnar dataset directory.
+
+    The CSV is read twice, chunk by chunk: once to infer the schema
+    (smallest integer type that fits, categories for text with at most
+    `max_categories` distinct values, UTF-8 text otherwise) and once to
+    write the columns, so memory use stays bounded by the chunk size.
+
+    Returns:
+        the dataset manifest
+    """
+    import pandas as pd
+
+    rows, columns = _csv_schema(csv_path, chunk_size, max_categories)
+    metadata = {
+        'source': os.path.basename(str(csv_path)),
+        'source_sha256': file_sha256(csv_path),
+    }
+    with ColumnarWriter(path, rows, columns, metadata) as writer:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+            values = {}
+            for column in columns:
+                series = chunk[column.name]
+                if column.is_category:
+                    values[column.name] = series.fillna('').astype(str).to_numpy(dtype=object)
+                elif column.storage_dtype.kind == 'S':
+                    values[column.name] = series.fillna('').astype(str).str.encode('utf-8').to_numpy()
+                else:
+                    values[column.name] = series.to_numpy()
+            writer.append(values)
+    return writer.manifest
@@ -0,0 +1,132 @@
+"""
+Compaction of the compiled random forests
+
+A compact forest is derived from a compiled one in three steps:
+
+1. subtrees whose leaves all predict (almost) the same as the subtree root
+   are collapsed into a leaf (`prune_tolerance`, in probability or
+   risk-score units)
+2. thresholds and node values are stored as float32; thresholds are rounded
+   so that every split still sends every input the same way
+3. only the first k trees are kept, k being the smallest number whose
+   validation score is within `max_drop` of the full forest's
+
+Random forest trees are independent draws, so keeping a prefix of them is
+an unbiased subsample. The validation rows are the ones train_models holds
+out, rebuilt from the same dataset, split and seed.
+"""
+
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .training import RANDOM_STATE, dataset_path, load_features
+
+# Model file -> training dataset name, and the score kept within max_drop
+FORESTS = {
+    'disease_prediction_model.pkl': 'disease',
+    'risk_scoring_model.pkl': 'risk',
+}
+SCORE_METRIC = {
+    'disease': 'accuracy',
+    'risk': 'r2',
+}
+
+
+def validation_set(name, datasets_path, models_path, cache_dir=None):
+    """Held-out rows of train_models' split, transformed as the model sees them"""
+    import joblib
+    from sklearn.model_selection import train_test_split
+
+    X, y, _, _ = load_features(name, dataset_path(datasets_path, name), cache_dir)
+    _, X_val, _, y_val = train_test_split(
+        X, y, test_size=0.2, random_state=RANDOM_STATE, stratify=y if name == 'disease' else None
+    )
+    if name == 'risk':
+        X_val = joblib.load(os.path.join(models_path, 'risk_scaler.pkl')).transform(X_val)
+    return X_val, y_val
+
+
+def prefix_scores(forest, X, y):
+    """Score of the forest made of the first k trees, for every k"""
+    outputs = forest.tree_outputs(X).astype(np.float64)
+    means = np.cumsum(outputs, axis=0) / np.arange(1, forest.n_estimators + 1)[:, np.newaxis, np.newaxis]
+    if forest.kind == 'classifier':
+        predictions = np.asarray(forest.classes_)[means.argmax(axis=2)]
+        return (predictions == y).mean(axis=1)
+    residual = ((means[:, :, 0] - y) ** 2).sum(axis=1)
+    return 1.0 - residual / ((y - y.mean()) ** 2).sum()
+
+
+def score(forest, X, y):
+    return float(prefix_scores(forest, X, y)[-1])
+
+
+def array_bytes(forest):
+    return int(sum(np.asarray(array).nbytes for array in forest.arrays().values()))
+
+
+def compact(forest, X_val, y_val, max_drop=0.005, prune_tolerance=0.01, quantize=True):
+    """
+    Compact forest whose validation score is at most `max_drop` below the
+    full forest's; the report is attached as its `compaction` attribute
+    """
+    full_score = score(forest, X_val, y_val)
+    candidate = forest.pruned(prune_tolerance) if prune_tolerance > 0 else forest
+    if quantize:
+        candidate = candidate.quantized()
+
+    scores = prefix_scores(candidate, X_val, y_val)
+    good_enough = np.flatnonzero(scores >= full_score - max_drop)
+    if len(good_enough):
+        n_trees = int(good_enough[0]) + 1
+    else:
+        # Pruning or float32 alone cost more than max_drop: keep every tree
+        n_trees = candidate.n_estimators
+    result = candidate.first_trees(n_trees)
+
+    result.compaction = {
+        'metric': SCORE_METRIC['disease' if forest.kind == 'classifier' else 'risk'],
+        'validation_rows': int(len(y_val)),
+        'score_before': round(full_score, 6),
+        'score_after': round(float(scores[n_trees - 1]), 6),
+        'score_delta': round(float(scores[n_trees - 1]) - full_score, 6),
+        'max_drop': max_drop,
+        'prune_tolerance': prune_tolerance,
+        'float32': quantize,
+        'trees_before': forest.n_estimators,
+        'trees_after': result.n_estimators,
+        'nodes_before': forest.n_nodes,
+        'nodes_after': result.n_nodes,
+        'bytes_before': array_bytes(forest),
+        'bytes_after': array_bytes(result),
+    }
+    return result
+
+
+def _resident_cost(path):
+    import joblib
+
+    from .forest import CompiledForest
+    from .registry import measure_load
+
+    if os.path.isdir(path):
+        loader = lambda directory: CompiledForest.load(directory, mmap_mode=None)
+    else:
+        # Count the model, not the import of the library it is made of
+        importlib.import_module('sklearn.ensemble')
+        loader = joblib.load
+    return measure_load(loader, path)[2]
+
+
+def resident_cost(path):
+    """
+    Resident memory a process adds by loading a pickle or a compiled forest
+    directory fully into memory (not memory-mapped), measured in a fresh
+    interpreter so that memory freed earlier in this one does not hide it
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(_resident_cost, str(path)).result()
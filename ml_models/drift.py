@@ -0,0 +1,364 @@
+"""
+Feature drift monitoring of prediction inputs
+
+Training writes, next to each model, a reference histogram of every input
+feature over its training matrix (`<model>_drift_reference.json`). Each
+feature has fixed bins: one per value for small integer features (symptom
+flags, encodings, counts), otherwise equal-width bins over the central
+99.8% of the training values, plus an underflow and an overflow bin.
+Because the bins are equal-width, the bin of a value is one subtraction, one
+division and a clip, so every prediction adds O(features) work and one
+bincount per feature matrix.
+
+Serving workers count the inputs of every prediction into per-thread
+arrays (no locks on the request path) and, every ML_DRIFT_FLUSH_INTERVAL
+seconds, write their totals to ML_DRIFT_PATH/<host>-<pid>.json. The
+drift_report command merges the files of every worker and compares the
+merged histograms with the reference using the population stability index
+(PSI) and the Kolmogorov-Smirnov distance of the binned distributions.
+"""
+
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+
+REFERENCE_SUFFIX = '_drift_reference.json'
+DEFAULT_BINS = 20
+# Share of training values left out of the equal-width range on each side
+TAIL = 0.001
+# PSI smoothing for bins that are empty on one side
+EPSILON = 1e-4
+# Usual PSI reading: below 0.1 stable, up to 0.25 moderate, above significant
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+MODELS = ['disease', 'risk', 'noshow']
+
+
+def reference_name(name):
+    return f'{name}{REFERENCE_SUFFIX}'
+
+
+def feature_bins(values, bins=DEFAULT_BINS):
+    """(low edge, bin width, number of bins) for one training column"""
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return 0.0, 1.0, 1
+    low, high = float(values.min()), float(values.max())
+    if np.all(values == np.round(values)) and high - low < bins:
+        # One bin per integer value
+        return low - 0.5, 1.0, int(high - low) + 1
+    low, high = (float(value) for value in np.quantile(values, [TAIL, 1 - TAIL]))
+    if high <= low:
+        high = low + 1.0
+    return low, (high - low) / bins, bins
+
+
+def bin_indices(matrix, lows, widths, n_bins):
+    """
+    Bin of every value of a feature matrix; 0 is the underflow bin and
+    n_bins + 1 the overflow bin of each column
+    """
+    scaled = np.floor((np.asarray(matrix, dtype=np.float64) - lows) / widths) + 1
+    scaled = np.nan_to_num(scaled, nan=0.0, posinf=0.0, neginf=0.0)
+    return np.clip(scaled, 0, n_bins + 1).astype(np.int64)
+
+
+class Reference:
+    """Bins and training counts of one model's features"""
+
+    def __init__(self, data, checksum=''):
+        self.model = data['model']
+        self.checksum = checksum
+        self.features = [feature['name'] for feature in data['features']]
+        self.lows = np.array([feature['low'] for feature in data['features']], dtype=np.float64)
+        self.widths = np.array([feature['width'] for feature in data['features']], dtype=np.float64)
+        self.n_bins = np.array([feature['bins'] for feature in data['features']], dtype=np.int64)
+        self.counts = [np.array(feature['counts'], dtype=np.int64) for feature in data['features']]
+        # Position of each feature's first bin in the flat count vector
+        self.offsets = np.concatenate([[0], np.cumsum(self.n_bins + 2)[:-1]])
+        self.size = int((self.n_bins + 2).sum())
+
+    @classmethod
+    def load(cls, path):
+        from .registry import file_checksum
+
+        with open(path) as f:
+            return cls(json.load(f), file_checksum(path))
+
+    def flat_counts(self, matrix):
+        """Counts of a feature matrix, as one vector of every feature's bins"""
+        flat = bin_indices(matrix, self.lows, self.widths, self.n_bins) + self.offsets
+        return np.bincount(flat.ravel(), minlength=self.size)
+
+    def split(self, flat):
+        """Per-feature counts from a flat count vector"""
+        return np.split(np.asarray(flat, dtype=np.int64), self.offsets[1:])
+
+
+def build_reference(name, X, features, bins=DEFAULT_BINS):
+    """Reference histogram data (JSON-serializable) for a training matrix"""
+    columns = []
+    for j, feature in enumerate(features):
+        low, width, n_bins = feature_bins(X[:, j], bins)
+        indices = bin_indices(X[:, j], low, width, n_bins)
+        columns.append({
+            'name': feature,
+            'low': low,
+            'width': width,
+            'bins': n_bins,
+            'counts': np.bincount(indices, minlength=n_bins + 2).tolist(),
+        })
+    return {'model': name, 'rows': int(len(X)), 'features': columns}
+
+
+def write_reference(path, data):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def psi(expected, actual):
+    """Population stability index of two histograms over the same bins"""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    p = np.maximum(expected / max(expected.sum(), 1), EPSILON)
+    q = np.maximum(actual / max(actual.sum(), 1), EPSILON)
+    return float(((q - p) * np.log(q / p)).sum())
+
+
+def ks(expected, actual):
+    """Largest gap between the cumulative distributions of two histograms"""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    p = np.cumsum(expected) / max(expected.sum(), 1)
+    q = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.abs(p - q).max())
+
+
+def compare(reference, flat):
+    """Per-feature PSI and KS of live counts against the reference"""
+    features = []
+    for feature, expected, actual in zip(reference.features, reference.counts, reference.split(flat)):
+        features.append({
+            'feature': feature,
+            'rows': int(actual.sum()),
+            'psi': round(psi(expected, actual), 6),
+            'ks': round(ks(expected, actual), 6),
+            'out_of_range': round(float(actual[[0, -1]].sum() / max(actual.sum(), 1)), 6),
+        })
+    return features
+
+
+def psi_status(value):
+    if value >= PSI_SIGNIFICANT:
+        return 'significant'
+    if value >= PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+class DriftMonitor:
+    """
+    Counts prediction inputs into the reference bins of their model.
+
+    Each thread counts into its own arrays, keyed by model and reference
+    checksum, so that concurrent requests never contend and a new reference
+    (another model version) starts new counts.
+    """
+
+    def __init__(self, model_registry=None, path=None, flush_interval=None):
+        from .registry import registry
+
+        self.registry = model_registry or registry
+        self._path = path
+        self._flush_interval = flush_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # (model, reference checksum) -> [reference, [per-thread count arrays]]
+        self._counts = {}
+        # model -> monotonic time its reference was found missing
+        self._missing = {}
+        self.started = time.time()
+        self._last_flush = time.monotonic()
+
+    @property
+    def path(self):
+        from django.conf import settings
+
+        return str(self._path or settings.ML_DRIFT_PATH)
+
+    @property
+    def flush_interval(self):
+        from django.conf import settings
+
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'ML_DRIFT_FLUSH_INTERVAL', 30.0)
+
+    def reference(self, name):
+        """Reference of a model's active version, or None when it has none"""
+        missing_since = self._missing.get(name)
+        if missing_since is not None and time.monotonic() - missing_since < self.registry.check_interval:
+            return None
+        try:
+            artifact = self.registry.artifact(reference_name(name))
+        except OSError:
+            # Models trained before drift references existed; look again later
+            self._missing[name] = time.monotonic()
+            return None
+        return artifact.obj
+
+    def observe(self, name, matrix):
+        reference = self.reference(name)
+        if reference is None:
+            return
+        key = (name, reference.checksum)
+        local = getattr(self._local, 'counts', None)
+        if local is None:
+            local = self._local.counts = {}
+        counts = local.get(key)
+        if counts is None:
+            counts = local[key] = np.zeros(reference.size, dtype=np.int64)
+            with self._lock:
+                self._counts.setdefault(key, [reference, []])[1].append(counts)
+        counts += reference.flat_counts(matrix)
+
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def totals(self):
+        """
+        [(model, reference, summed counts)] for every reference this worker
+        counted against. Counts are keyed by the reference's checksum, so a
+        reload of the same file (registry.clear(), a hot reload) keeps
+        adding to them and the counts of a replaced model version are still
+        flushed.
+        """
+        with self._lock:
+            entries = [(name, reference, list(arrays)) for (name, _), (reference, arrays) in self._counts.items()]
+        return [(name, reference, np.sum(arrays, axis=0)) for name, reference, arrays in entries]
+
+    def flush(self):
+        """Write this worker's counts to ML_DRIFT_PATH; skipped if another thread is at it"""
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            models = {}
+            for name, reference, counts in self.totals():
+                models.setdefault(name, []).append(
+                    {'reference_sha256': reference.checksum, 'counts': counts.tolist()}
+                )
+            if not models:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            worker_file = os.path.join(self.path, f'{socket.gethostname()}-{os.getpid()}.json')
+            write_reference(worker_file, {
+                'pid': os.getpid(),
+                'started': self.started,
+                'updated': time.time(),
+                'models': models,
+            })
+        except OSError as e:
+            print(f"ML Drift Error: {e}")
+        finally:
+            self._flush_lock.release()
+
+
+def merged_counts(path, references, max_age=None):
+    """
+    Sum the worker files in `path` whose counts were taken against the given
+    references ({model: Reference}).
+
+    Args:
+        max_age: ignore files not updated for this many seconds
+
+    Returns:
+        ({model: flat counts}, number of worker files merged)
+    """
+    merged = {}
+    workers = 0
+    if not os.path.isdir(path):
+        return merged, workers
+    now = time.time()
+    for file_name in sorted(os.listdir(path)):
+        if not file_name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(path, file_name)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if max_age is not None and now - data.get('updated', 0) > max_age:
+            continue
+        used = False
+        for name, entries in data.get('models', {}).items():
+            reference = references.get(name)
+            if reference is None:
+                continue
+            # One entry per reference the worker counted against
+            for entry in entries if isinstance(entries, list) else [entries]:
+                if entry['reference_sha256'] != reference.checksum:
+                    continue
+                counts = np.asarray(entry['counts'], dtype=np.int64)
+                merged[name] = merged[name] + counts if name in merged else counts
+                used = True
+        workers += used
+    return merged, workers
+
+
+def prune_worker_files(path, max_age):
+    """
+    Delete the worker files in `path` not updated for `max_age` seconds
+    (workers that exited or were replaced); returns the names deleted
+    """
+    if not os.path.isdir(path):
+        return []
+    now = time.time()
+    pruned = []
+    for file_name in sorted(os.listdir(path)):
+        if not file_name.endswith('.json'):
+            continue
+        file_path = os.path.join(path, file_name)
+        try:
+            if now - os.path.getmtime(file_path) > max_age:
+                os.remove(file_path)
+                pruned.append(file_name)
+        except OSError:
+            continue
+    return pruned
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_monitor():
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                _monitor = DriftMonitor()
+                # Keep the counts taken since the last flush when the worker exits
+                atexit.register(_monitor.flush)
+    return _monitor
+
+
+def observe(name, matrix):
+    """Count a prediction's feature rows, when drift monitoring is on"""
+    from django.conf import settings
+
+    if not getattr(settings, 'ML_DRIFT_MONITORING', True):
+        return
+    try:
+        get_monitor().observe(name, matrix)
+    except Exception as e:
+        print(f"ML Drift Error: {e}")
@@ -0,0 +1,227 @@
+"""
+Feature extraction for the ML models
+
+Turns ORM querysets (or plain input dicts) into float64 NumPy matrices whose
+columns are exactly the ones train_models.py fits on. Querysets are read with
+values_list, pulling only the columns a model needs, and derived features
+(age, gender flag, blood pressure, weather code, symptom flags) are computed
+a column at a time. Every predictor, view and bulk job builds its inputs
+here, so the column order is defined in one place.
+"""
+
+from datetime import date
+
+import numpy as np
+
+SYMPTOMS = ['fever', 'headache', 'fatigue', 'cough', 'vomiting', 'diarrhea', 'joint_pain', 'rash']
+
+# Column order of each training matrix in train_models.py
+DISEASE_FEATURES = ['age'] + SYMPTOMS + [
+    'blood_pressure_systolic', 'blood_pressure_diastolic', 'glucose_level', 'gender_encoded',
+]
+RISK_FEATURES = [
+    'age', 'pregnancy', 'glucose', 'blood_pressure_systolic',
+    'blood_pressure_diastolic', 'heart_rate', 'weight', 'bmi',
+]
+NOSHOW_FEATURES = ['distance_from_hospital', 'previous_no_shows', 'sms_sent', 'weather_encoded']
+
+# train_models.py encodes these with LabelEncoder, i.e. in sorted order
+GENDER_ENCODING = {'F': 0, 'M': 1}
+WEATHER_ENCODING = {'cloudy': 0, 'rainy': 1, 'sunny': 2}
+
+DEFAULT_BLOOD_PRESSURE = (120, 80)
+DEFAULT_GLUCOSE = 100.0
+DEFAULT_HEART_RATE = 75.0
+DEFAULT_WEIGHT = 70.0
+DEFAULT_BMI = 25.0
+DEFAULT_DISTANCE = 5.0
+DEFAULT_WEATHER = 'sunny'
+
+# Fields read from the database for each model
+DISEASE_COLUMNS = ['id', 'patient__date_of_birth', 'patient__gender', 'symptoms', 'blood_pressure', 'glucose_level']
+RISK_COLUMNS = ['id', 'patient__date_of_birth', 'glucose_level', 'blood_pressure', 'heart_rate', 'weight', 'height']
+NOSHOW_COLUMNS = ['id', 'patient_id', 'distance_from_hospital', 'weather_condition', 'sms_sent']
+
+
+def parse_blood_pressure(value, default=DEFAULT_BLOOD_PRESSURE):
+    """Parse '120/80' (or a bare systolic number) into (systolic, diastolic)"""
+    if value in (None, ''):
+        return default
+    parts = str(value).split('/')
+    try:
+        systolic = float(parts[0])
+        diastolic = float(parts[1]) if len(parts) > 1 else default[1]
+    except ValueError:
+        return default
+    return systolic, diastolic
+
+
+def numeric_column(values, default):
+    """float64 column from Decimals/ints/None, with None replaced by default"""
+    return np.array([default if value is None else float(value) for value in values], dtype=np.float64)
+
+
+def age_column(dates_of_birth, today=None):
+    """Age in whole years on `today`, as Patient.age computes it"""
+    today = today or date.today()
+    born = np.array(dates_of_birth, dtype='datetime64[D]')
+    years = born.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = born.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    days = (born - born.astype('datetime64[M]')).astype(np.int64) + 1
+    birthday_ahead = (months > today.month) | ((months == today.month) & (days > today.day))
+    return (today.year - years - birthday_ahead).astype(np.float64)
+
+
+def gender_column(genders):
+    return (np.array(genders, dtype=object) == 'M').astype(np.float64)
+
+
+def blood_pressure_columns(values):
+    """(systolic, diastolic) columns from '120/80' strings"""
+    pairs = np.array([parse_blood_pressure(value) for value in values], dtype=np.float64)
+    return pairs.reshape(-1, 2)[:, 0], pairs.reshape(-1, 2)[:, 1]
+
+
+def weather_column(conditions):
+    default = WEATHER_ENCODING[DEFAULT_WEATHER]
+    return np.array(
+        [WEATHER_ENCODING.get((condition or '').strip().lower(), default) for condition in conditions],
+        dtype=np.float64,
+    )
+
+
+def symptom_columns(texts):
+    """0/1 matrix with one column per SYMPTOMS entry mentioned in free text"""
+    texts = [(text or '').lower() for text in texts]
+    return np.array(
+        [[symptom.replace('_', ' ') in text for symptom in SYMPTOMS] for text in texts],
+        dtype=np.float64,
+    ).reshape(len(texts), len(SYMPTOMS))
+
+
+def bmi_column(weights, heights):
+    """BMI from weight in kg and height in cm, DEFAULT_BMI where either is missing"""
+    weight = numeric_column(weights, np.nan)
+    height = numeric_column(heights, np.nan) / 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bmi = weight / (height * height)
+    return np.where(np.isfinite(bmi) & (bmi > 0), bmi, DEFAULT_BMI)
+
+
+def record_matrix(records, columns, defaults=None):
+    """Matrix from input dicts that already hold one value per feature column"""
+    defaults = defaults or {}
+    matrix = np.empty((len(records), len(columns)), dtype=np.float64)
+    for j, column in enumerate(columns):
+        if column in defaults:
+            matrix[:, j] = [record.get(column, defaults[column]) for record in records]
+        else:
+            matrix[:, j] = [record[column] for record in records]
+    return matrix
+
+
+# Disease prediction
+
+def disease_matrix_from_records(records):
+    """
+    Disease features from dicts with age, gender, the SYMPTOMS flags,
+    blood_pressure_systolic, blood_pressure_diastolic and glucose_level
+    """
+    records = [dict(record, gender_encoded=GENDER_ENCODING.get(record['gender'], 0)) for record in records]
+    return record_matrix(records, DISEASE_FEATURES)
+
+
+def disease_matrix_from_values(rows, today=None):
+    """Disease features from (date_of_birth, gender, symptoms, blood_pressure, glucose_level) tuples"""
+    if not rows:
+        return np.empty((0, len(DISEASE_FEATURES)), dtype=np.float64)
+    born, gender, symptoms, blood_pressure, glucose = zip(*rows)
+    systolic, diastolic = blood_pressure_columns(blood_pressure)
+    return np.column_stack([
+        age_column(born, today),
+        symptom_columns(symptoms),
+        systolic,
+        diastolic,
+        numeric_column(glucose, DEFAULT_GLUCOSE),
+        gender_column(gender),
+    ])
+
+
+def disease_matrix(histories, today=None):
+    """(ids, features) for a MedicalHistory queryset, symptoms matched in the free text"""
+    rows = list(histories.values_list(*DISEASE_COLUMNS))
+    ids = [row[0] for row in rows]
+    return ids, disease_matrix_from_values([row[1:] for row in rows], today)
+
+
+# Risk scoring
+
+def risk_matrix_from_records(records):
+    """Risk features from dicts keyed like RISK_FEATURES (pregnancy and bmi optional)"""
+    return record_matrix(records, RISK_FEATURES, defaults={'pregnancy': 0, 'bmi': DEFAULT_BMI})
+
+
+def risk_matrix_from_values(rows, today=None):
+    """Risk features from (date_of_birth, glucose, blood_pressure, heart_rate, weight, height) tuples"""
+    if not rows:
+        return np.empty((0, len(RISK_FEATURES)), dtype=np.float64)
+    born, glucose, blood_pressure, heart_rate, weight, height = zip(*rows)
+    systolic, diastolic = blood_pressure_columns(blood_pressure)
+    return np.column_stack([
+        age_column(born, today),
+        np.zeros(len(rows)),  # pregnancy is not recorded in MedicalHistory
+        numeric_column(glucose, DEFAULT_GLUCOSE),
+        systolic,
+        diastolic,
+        numeric_column(heart_rate, DEFAULT_HEART_RATE),
+        numeric_column(weight, DEFAULT_WEIGHT),
+        bmi_column(weight, height),
+    ])
+
+
+def risk_matrix(histories, today=None):
+    """(ids, features) for a MedicalHistory queryset"""
+    rows = list(histories.values_list(*RISK_COLUMNS))
+    ids = [row[0] for row in rows]
+    return ids, risk_matrix_from_values([row[1:] for row in rows], today)
+
+
+# No-show prediction
+
+def previous_no_show_counts(appointment_model, patient_ids):
+    """
+    Map patient id -> number of no-show appointments, read from the
+    per-patient stats rows (one row per patient, no history scan)
+    """
+    stats_model = appointment_model._meta.apps.get_model('appointments', 'PatientAppointmentStats')
+    return stats_model.no_show_counts(patient_ids)
+
+
+def noshow_matrix_from_records(records):
+    """No-show features from dicts with distance_from_hospital, previous_no_shows, sms_sent and weather_condition"""
+    matrix = record_matrix(
+        records, NOSHOW_FEATURES[:3], defaults={'distance_from_hospital': DEFAULT_DISTANCE},
+    )
+    weather = weather_column([record.get('weather_condition') for record in records])
+    return np.column_stack([matrix, weather])
+
+
+def noshow_matrix_from_values(rows, no_show_counts):
+    """No-show features from (patient_id, distance, weather_condition, sms_sent) tuples"""
+    if not rows:
+        return np.empty((0, len(NOSHOW_FEATURES)), dtype=np.float64)
+    patient_ids, distance, weather, sms_sent = zip(*rows)
+    return np.column_stack([
+        numeric_column(distance, DEFAULT_DISTANCE),
+        np.array([no_show_counts.get(pid, 0) for pid in patient_ids], dtype=np.float64),
+        np.array(sms_sent, dtype=np.float64),
+        weather_column(weather),
+    ])
+
+
+def noshow_matrix(appointments):
+    """(ids, features) for an Appointment queryset; no-show history is counted per patient"""
+    rows = list(appointments.values_list(*NOSHOW_COLUMNS))
+    ids = [row[0] for row in rows]
+    no_shows = previous_no_show_counts(appointments.model, {row[1] for row in rows})
+    return ids, noshow_matrix_from_values([row[1:] for row in rows], no_shows)
@@ -0,0 +1,375 @@
+"""
+Compiled runtime for tree-ensemble models
+
+A trained RandomForestClassifier or RandomForestRegressor is flattened into
+a handful of contiguous NumPy arrays (split feature, threshold, children and
+node values for every node of every tree). CompiledForest evaluates all trees
+at once over those arrays and reproduces sklearn's predict/predict_proba
+exactly, without importing sklearn. Only numpy is needed at serving time.
+
+On disk a compiled forest is a directory holding one .npy file per array and
+a meta.json manifest. Loading memory-maps the arrays read-only, so every
+gunicorn worker on a host shares a single page-cache copy of the model.
+
+A compact forest (see ml_models.compaction) is the same format with fewer
+trees, pruned subtrees and float32 thresholds and values.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+LEAF = -1
+
+ARRAY_FIELDS = ['feature', 'threshold', 'children', 'value', 'roots', 'classes']
+
+MANIFEST = 'meta.json'
+
+
+class CompiledForest:
+    """
+    Tree ensemble stored as flat node arrays.
+
+    Node i of the ensemble splits on feature[i] at threshold[i] and continues
+    to children[i, 0] (x <= threshold) or children[i, 1]. Leaves point to
+    themselves, so a fixed number of steps reaches the leaf from any root.
+    value[i] holds the class fractions (classifier) or the prediction
+    (regressor) of node i. Tree t starts at node roots[t].
+    """
+
+    def __init__(self, kind, feature, threshold, children, value, roots,
+                 classes=None, n_features=None, max_depth=None, compaction=None):
+        if kind not in ('classifier', 'regressor'):
+            raise ValueError(f'Unknown forest kind: {kind}')
+        self.kind = kind
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes if classes is not None else np.array([])
+        self.n_features_in_ = int(n_features)
+        self.max_depth = int(max_depth)
+        # Report of how a compact forest was derived (None for a full one)
+        self.compaction = compaction
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def is_leaf(self):
+        return self.children[:, 0] == np.arange(self.n_nodes)
+
+    @property
+    def left(self):
+        """Left children with leaves marked as -1, as in sklearn's tree_"""
+        return np.where(self.is_leaf, LEAF, self.children[:, 0])
+
+    @property
+    def right(self):
+        return np.where(self.is_leaf, LEAF, self.children[:, 1])
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Flatten a fitted sklearn RandomForestClassifier/Regressor"""
+        is_classifier = hasattr(forest, 'classes_')
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError('Only single-output forests can be compiled')
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == LEAF
+            node_ids = np.arange(tree.node_count) + offset
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            children.append(np.stack([
+                np.where(is_leaf, node_ids, tree.children_left + offset),
+                np.where(is_leaf, node_ids, tree.children_right + offset),
+            ], axis=1))
+            value = tree.value[:, 0, :].astype(np.float64)
+            if is_classifier and not np.allclose(value.sum(axis=1), 1.0):
+                # scikit-learn < 1.4 stores weighted class counts and
+                # normalises them in DecisionTreeClassifier.predict_proba
+                normalizer = value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+            values.append(value)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += tree.node_count
+
+        return cls(
+            kind='classifier' if is_classifier else 'regressor',
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.concatenate(children).astype(np.int32),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.int32),
+            classes=_plain_array(forest.classes_) if is_classifier else None,
+            n_features=forest.n_features_in_,
+            max_depth=max_depth,
+        )
+
+    def _input(self, X):
+        # sklearn evaluates splits on float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f'X has {X.shape[-1]} features, but the model expects {self.n_features_in_}'
+            )
+        return X
+
+    def apply(self, X):
+        """Leaf index reached by every row in every tree, shape (n_trees, n_rows)"""
+        X = self._input(X)
+        n_rows = X.shape[0]
+        flat_X = X.ravel()
+        row_offsets = np.arange(n_rows, dtype=np.intp) * X.shape[1]
+        nodes = np.repeat(self.roots[:, np.newaxis], n_rows, axis=1).astype(np.intp)
+        for _ in range(self.max_depth):
+            values = flat_X[row_offsets + self.feature[nodes]]
+            go_right = values > self.threshold[nodes]
+            nodes = self.children[nodes, go_right.view(np.int8)]
+        return nodes
+
+    def contributions(self, X):
+        """
+        Per-feature contributions to every prediction, following each row's
+        decision path (Saabas): each split adds the change in node value it
+        causes to the feature it splits on, averaged over the trees.
+
+        All rows and trees are walked together, one tree level per step.
+
+        Returns:
+            (bias, contributions): bias has shape (n_outputs,) and is the
+            forest's mean root value; contributions has shape
+            (n_rows, n_features, n_outputs). For every row, bias plus the
+            sum over features equals predict_proba (classifier) or predict
+            (regressor).
+        """
+        X = self._input(X)
+        n_rows, n_features = X.shape
+        n_outputs = self.value.shape[1]
+        flat_X = X.ravel()
+        row_offsets = np.arange(n_rows, dtype=np.intp) * n_features
+        nodes = np.repeat(self.roots[:, np.newaxis], n_rows, axis=1).astype(np.intp)
+        totals = np.zeros((n_rows * n_features, n_outputs), dtype=np.float64)
+        for _ in range(self.max_depth):
+            split_feature = self.feature[nodes]
+            go_right = flat_X[row_offsets + split_feature] > self.threshold[nodes]
+            next_nodes = self.children[nodes, go_right.view(np.int8)]
+            # Zero at leaves, which point to themselves
+            delta = np.asarray(self.value[next_nodes], dtype=np.float64) - self.value[nodes]
+            slots = (row_offsets + split_feature).ravel()
+            for output in range(n_outputs):
+                totals[:, output] += np.bincount(
+                    slots, weights=delta[..., output].ravel(), minlength=totals.shape[0]
+                )
+            nodes = next_nodes
+        totals /= self.n_estimators
+        bias = np.asarray(self.value[self.roots], dtype=np.float64).mean(axis=0)
+        return bias, totals.reshape(n_rows, n_features, n_outputs)
+
+    def tree_outputs(self, X):
+        """value of the leaf reached in every tree, shape (n_trees, n_rows, n_outputs)"""
+        return self.value[self.apply(X)]
+
+    def first_trees(self, n_trees):
+        """Forest made of the first n_trees trees (their nodes are a prefix of the arrays)"""
+        if not 0 < n_trees <= self.n_estimators:
+            raise ValueError(f'n_trees must be between 1 and {self.n_estimators}')
+        end = self.roots[n_trees] if n_trees < self.n_estimators else self.n_nodes
+        return self._with_nodes(np.arange(end), self.roots[:n_trees])
+
+    def pruned(self, tolerance):
+        """
+        Forest in which every subtree whose leaves all lie within `tolerance`
+        of the subtree root's own value (class fractions, or the regression
+        value) is replaced by a leaf holding that value
+        """
+        value = np.asarray(self.value, dtype=np.float64)
+        is_leaf = self.is_leaf
+        children = np.asarray(self.children)
+        low, high = value.copy(), value.copy()
+        # Children always come after their parent, so walking backwards
+        # visits every subtree before its root
+        for node in np.flatnonzero(~is_leaf)[::-1]:
+            left, right = children[node]
+            low[node] = np.minimum(low[left], low[right])
+            high[node] = np.maximum(high[left], high[right])
+        spread = np.maximum(high - value, value - low).max(axis=1)
+        collapse = ~is_leaf & (spread <= tolerance)
+
+        keep = np.zeros(self.n_nodes, dtype=bool)
+        keep[self.roots] = True
+        for node in range(self.n_nodes):
+            if keep[node] and not is_leaf[node] and not collapse[node]:
+                keep[children[node]] = True
+        new_children = children.copy()
+        new_children[collapse] = np.flatnonzero(collapse)[:, np.newaxis]
+        return self._with_nodes(np.flatnonzero(keep), self.roots, children=new_children)
+
+    def quantized(self):
+        """
+        Forest with float32 thresholds and values and int16 split features.
+
+        Thresholds are rounded down to the nearest float32. Inputs are
+        compared as float32, so `x > threshold` gives the same result as
+        before for every input; only the leaf values lose precision.
+        """
+        threshold32 = np.asarray(self.threshold).astype(np.float32)
+        rounded_up = threshold32.astype(np.float64) > self.threshold
+        threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+        feature_dtype = np.int16 if self.n_features_in_ <= np.iinfo(np.int16).max else np.int32
+        return CompiledForest(
+            kind=self.kind,
+            feature=np.asarray(self.feature).astype(feature_dtype),
+            threshold=threshold32,
+            children=np.array(self.children),
+            value=np.asarray(self.value).astype(np.float32),
+            roots=np.array(self.roots),
+            classes=np.array(self.classes_) if self.kind == 'classifier' else None,
+            n_features=self.n_features_in_,
+            max_depth=self.max_depth,
+        )
+
+    def _with_nodes(self, nodes, roots, children=None):
+        """Forest restricted to `nodes` (ascending, closed under reachability), renumbered"""
+        children = np.asarray(self.children if children is None else children)
+        new_id = np.full(self.n_nodes, -1, dtype=np.int64)
+        new_id[nodes] = np.arange(len(nodes))
+        new_children = new_id[children[nodes]].astype(np.int32)
+        is_leaf = new_children[:, 0] == np.arange(len(nodes))
+        depth = np.zeros(len(nodes), dtype=np.int64)
+        for node in np.flatnonzero(~is_leaf):
+            depth[new_children[node]] = depth[node] + 1
+        return CompiledForest(
+            kind=self.kind,
+            feature=np.array(self.feature[nodes]),
+            threshold=np.array(self.threshold[nodes]),
+            children=new_children,
+            value=np.array(self.value[nodes]),
+            roots=new_id[roots].astype(np.int32),
+            classes=np.array(self.classes_) if self.kind == 'classifier' else None,
+            n_features=self.n_features_in_,
+            max_depth=int(depth.max()) if len(depth) else 0,
+        )
+
+    def _accumulate(self, X):
+        leaves = self.apply(X)
+        total = np.zeros((leaves.shape[1], self.value.shape[1]), dtype=np.float64)
+        # Sum tree by tree, in order, so rounding matches sklearn bit for bit
+        for tree_leaves in leaves:
+            total += self.value[tree_leaves]
+        total /= self.n_estimators
+        return total
+
+    def predict_proba(self, X):
+        if self.kind != 'classifier':
+            raise AttributeError('predict_proba is only available for classifiers')
+        return self._accumulate(X)
+
+    def predict(self, X):
+        if self.kind == 'classifier':
+            return self.classes_[self.predict_proba(X).argmax(axis=1)]
+        return self._accumulate(X)[:, 0]
+
+    def arrays(self):
+        return {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'children': self.children,
+            'value': self.value,
+            'roots': self.roots,
+            'classes': np.asarray(self.classes_),
+        }
+
+    def meta(self):
+        return {
+            'kind': self.kind,
+            'n_features': self.n_features_in_,
+            'max_depth': self.max_depth,
+            'n_estimators': self.n_estimators,
+            'n_nodes': self.n_nodes,
+            'compaction': self.compaction,
+        }
+
+    def save(self, path):
+        """
+        Write the forest as a directory of .npy files plus meta.json.
+
+        Every file is written under a temporary name and renamed into place,
+        so workers that still map the previous version keep a consistent
+        view of it. The manifest is replaced last and is the file the model
+        registry watches for changes.
+        """
+        os.makedirs(path, exist_ok=True)
+        meta = self.meta()
+        meta['arrays'] = {}
+        for name, array in self.arrays().items():
+            array = np.ascontiguousarray(array)
+            _atomic_write(os.path.join(path, f'{name}.npy'), lambda f: np.save(f, array))
+            meta['arrays'][name] = {
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                # Makes the manifest change whenever any array changes
+                'sha256': hashlib.sha256(array.tobytes()).hexdigest(),
+            }
+        payload = json.dumps(meta, indent=2).encode()
+        _atomic_write(os.path.join(path, MANIFEST), lambda f: f.write(payload))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Open a compiled forest, memory-mapping its arrays by default"""
+        if os.path.basename(path) == MANIFEST:
+            path = os.path.dirname(path)
+        with open(os.path.join(path, MANIFEST)) as f:
+            meta = json.load(f)
+        arrays = {}
+        for name in ARRAY_FIELDS:
+            array = np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+            expected = meta['arrays'][name]
+            if list(array.shape) != expected['shape'] or array.dtype.str != expected['dtype']:
+                raise ValueError(f'{path}: {name}.npy does not match {MANIFEST}')
+            arrays[name] = array
+        if meta['kind'] != 'classifier':
+            arrays['classes'] = None
+        return cls(
+            kind=meta['kind'], n_features=meta['n_features'], max_depth=meta['max_depth'],
+            compaction=meta.get('compaction'), **arrays
+        )
+
+
+def _atomic_write(path, write):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _plain_array(values):
+    """Object arrays (e.g. string labels) cannot be stored without pickle"""
+    values = np.asarray(values)
+    return values.astype(str) if values.dtype == object else values
+
+
+def compiled_name(model_file):
+    """Manifest path, relative to the models directory, of a compiled pickle"""
+    base = model_file[:-4] if model_file.endswith('.pkl') else model_file
+    return os.path.join(base + '.forest', MANIFEST)
+
+
+def compact_name(model_file):
+    """Manifest path, relative to the models directory, of a compacted pickle"""
+    base = model_file[:-4] if model_file.endswith('.pkl') else model_file
+    return os.path.join(base + '.compact.forest', MANIFEST)
@@ -0,0 +1,120 @@
+"""
+Online learning for the no-show model
+
+The offline no-show model is a logistic regression trained on the synthetic
+appointments dataset. OnlineNoShowModel continues training it from real
+appointment outcomes: it starts from the coefficients of the model version
+being served, converted to a log-loss SGDClassifier, and is updated with
+partial_fit as outcomes arrive, so no retrain over the whole appointment
+table is ever needed.
+
+Checkpoints are written atomically to ML_MODELS_PATH/online/<version>/
+under the served model's file name. With settings.ML_ONLINE_LEARNING on,
+the model registry prefers that file and hot-reloads it like any other
+model file. Activating another version starts a new online model from
+that version's coefficients; the checkpoints of the old one are kept, so
+a rollback returns to them.
+"""
+
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+
+from . import versions
+
+MODEL_FILE = 'noshow_prediction_model.pkl'
+STATE_FILE = 'noshow_prediction_model.json'
+CLASSES = np.array([0, 1])
+
+# Small constant steps: each outcome nudges the model, and the unscaled
+# distance feature (up to ~50 km) does not make single updates overshoot
+DEFAULT_LEARNING_RATE = 0.001
+DEFAULT_ALPHA = 0.0001
+
+
+def sgd_from_logistic(model, learning_rate=DEFAULT_LEARNING_RATE, alpha=DEFAULT_ALPHA):
+    """SGDClassifier (log loss) with the coefficients of a fitted binary LogisticRegression"""
+    from sklearn.linear_model import SGDClassifier
+
+    if len(model.classes_) != 2:
+        raise ValueError('Online learning needs a binary no-show model')
+    online = SGDClassifier(
+        loss='log_loss', learning_rate='constant', eta0=learning_rate, alpha=alpha,
+    )
+    online.coef_ = np.array(model.coef_, dtype=np.float64)
+    online.intercept_ = np.array(model.intercept_, dtype=np.float64)
+    online.classes_ = np.array(model.classes_)
+    online.n_features_in_ = model.coef_.shape[1]
+    online.t_ = 1.0
+    return online
+
+
+class OnlineNoShowModel:
+    """
+    The online no-show model of one model version.
+
+    Args:
+        base_path: ML_MODELS_PATH (defaults to the setting)
+        version: model version to learn on top of (default: the current one)
+        learning_rate: constant SGD step size, used when starting a new model
+    """
+
+    def __init__(self, base_path=None, version=None, learning_rate=DEFAULT_LEARNING_RATE):
+        self.base_path = base_path
+        self.version = version or versions.current_version(base_path)
+        self.learning_rate = learning_rate
+        self.path = versions.online_models_path(base_path, self.version)
+        self.model, self.state = self._load()
+        self.unsaved = 0
+        # What was learned since the last checkpoint, as recorded by the
+        # caller, so that it is only marked as learned once it is on disk
+        self.pending = []
+
+    @property
+    def model_path(self):
+        return os.path.join(self.path, MODEL_FILE)
+
+    def _load(self):
+        if os.path.exists(self.model_path):
+            with open(os.path.join(self.path, STATE_FILE)) as f:
+                return joblib.load(self.model_path), json.load(f)
+        if self.version:
+            offline_path = os.path.join(versions.version_path(self.version, self.base_path), MODEL_FILE)
+        else:
+            offline_path = os.path.join(versions.models_root(self.base_path), MODEL_FILE)
+        state = {
+            'base_version': self.version,
+            'samples': 0,
+            'checkpoints': 0,
+            'learning_rate': self.learning_rate,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'checkpointed_at': None,
+        }
+        return sgd_from_logistic(joblib.load(offline_path), self.learning_rate), state
+
+    def learn(self, X, y):
+        """Update the model with feature rows X and their did_come labels y"""
+        if len(y) == 0:
+            return
+        self.model.partial_fit(np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.int64), classes=CLASSES)
+        self.state['samples'] += len(y)
+        self.unsaved += len(y)
+
+    def checkpoint(self):
+        """Write the model and its state atomically; the registry picks the file up"""
+        os.makedirs(self.path, exist_ok=True)
+        self.state['checkpoints'] += 1
+        self.state['checkpointed_at'] = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        tmp_model = f'{self.model_path}.tmp{os.getpid()}'
+        joblib.dump(self.model, tmp_model)
+        state_path = os.path.join(self.path, STATE_FILE)
+        tmp_state = f'{state_path}.tmp{os.getpid()}'
+        with open(tmp_state, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_state, state_path)
+        os.replace(tmp_model, self.model_path)
+        self.unsaved = 0
+        return self.model_path
@@ -2,20 +2,154 @@
 ML Prediction utilities for Ethiopian Hospital System
 """
 
-import joblib
-import os
+import weakref
+from contextlib import contextmanager
+
 import numpy as np
 from django.conf import settings
+from scipy.special import expit
+
+from . import features as feature_pipeline
+from .batching import get_batcher
+from .cache import prediction_cache
+from .forest import CompiledForest
+from . import drift, shadow
+from .registry import registry
+
+
+# Depth of nested unobserved() blocks in this process
+_unobserved = 0
+
+
+@contextmanager
+def unobserved():
+    """
+    Keep predictions made inside the block (benchmarks, synthetic inputs)
+    out of drift monitoring and shadow evaluation
+    """
+    global _unobserved
+    _unobserved += 1
+    try:
+        yield
+    finally:
+        _unobserved -= 1
+
+
+def observe_prediction(predictor, name, matrix, results):
+    """
+    Count a serving prediction's inputs for drift monitoring and hand it to
+    the shadow evaluator (see ml_models.drift and ml_models.shadow)
+    """
+    if predictor.registry is registry and not _unobserved:
+        drift.observe(name, matrix)
+        shadow.observe(name, matrix, results)
+
+
+def score_row(name, score_matrix, row):
+    """
+    Score one feature row, through the micro-batcher when it is enabled.
+    `score_matrix` is a predictor's bound method; rows are batched with the
+    other rows scored on the same registry.
+    """
+    if getattr(settings, 'ML_MICRO_BATCHING', False):
+        return get_batcher(name, score_matrix, score_matrix.__self__.registry).predict(row)
+    return score_matrix(np.array([row], dtype=np.float64))[0]
+
+
+def cached_scores(name, model_files, version, matrix, score_matrix, convert):
+    """
+    Score every row of a feature matrix, answering repeated rows from the cache.
+
+    Rows missing from the cache are scored together in one score_matrix call
+    (a single missing row goes through score_row, so concurrent requests can
+    share a micro-batch). `convert` turns one row of model output into the
+    value that is cached and returned.
+    """
+    keys = [prediction_cache.make_key(model_files, version, row) for row in matrix]
+    values = [prediction_cache.get(key) for key in keys]
+    missing = [index for index, value in enumerate(values) if value is None]
+    if len(missing) == 1:
+        scores = [score_row(name, score_matrix, matrix[missing[0]])]
+    elif missing:
+        scores = score_matrix(matrix[missing])
+    for index, score in zip(missing, scores if missing else []):
+        values[index] = convert(score)
+        prediction_cache.set(keys[index], values[index])
+    return values
+
+
+def _probabilities(row):
+    return tuple(row.tolist())
+
+
+_compiled_forests = weakref.WeakKeyDictionary()
+
+
+def compiled_forest(model):
+    """CompiledForest for a served forest, compiling a sklearn forest once per model object"""
+    if isinstance(model, CompiledForest):
+        return model
+    forest = _compiled_forests.get(model)
+    if forest is None:
+        forest = _compiled_forests[model] = CompiledForest.from_sklearn(model)
+    return forest
+
+
+def contribution_matrix(forest, matrix):
+    """
+    Contributions of every feature row, shape (n_rows, n_features + 1, n_outputs);
+    the last entry along the feature axis is the bias, so that each row can
+    be cached on its own
+    """
+    bias, contributions = forest.contributions(matrix)
+    bias = np.broadcast_to(bias, (len(matrix), 1, len(bias)))
+    return np.concatenate([contributions, bias], axis=1)
+
+
+def _contributions(row):
+    return tuple(tuple(values) for values in row.tolist())
+
+
+def explanation(feature_names, contributions, output=0):
+    """
+    Explanation of one prediction: the base value (the forest's average
+    output) and each feature's contribution, largest effect first
+    """
+    values = [row[output] for row in contributions]
+    ranked = sorted(zip(feature_names, values[:-1]), key=lambda item: abs(item[1]), reverse=True)
+    return {
+        'base_value': float(values[-1]),
+        'contributions': {name: float(value) for name, value in ranked},
+    }
+
 
 class DiseasePrediction:
     """Disease prediction using trained ML model"""
     
-    def __init__(self):
-        model_path = os.path.join(settings.ML_MODELS_PATH, 'disease_prediction_model.pkl')
-        self.model = joblib.load(model_path)
+    model_file = 'disease_prediction_model.pkl'
+    
+    def __init__(self, model_registry=None):
+        self.registry = model_registry or registry
         self.diseases = ['Malaria', 'Typhoid', 'TB', 'Pneumonia', 'Diabetes', 'Hypertension']
     
-    def predict(self, patient_data):
+    @property
+    def model(self):
+        return self.registry.get(self.model_file)
+    
+    @staticmethod
+    def features(patient_data):
+        """Feature row in the column order used by train_models.py"""
+        return feature_pipeline.disease_matrix_from_records([patient_data])[0]
+    
+    def score_matrix(self, matrix):
+        """Class probabilities for a feature matrix, straight from the model"""
+        return self.model.predict_proba(matrix)
+    
+    def explain_matrix(self, matrix):
+        """Per-feature contributions to every class probability (see contribution_matrix)"""
+        return contribution_matrix(compiled_forest(self.model), matrix)
+    
+    def predict(self, patient_data, explain=False):
         """
         Predict disease based on patient symptoms and vitals
         
@@ -35,49 +169,101 @@ class DiseasePrediction:
                 - blood_pressure_diastolic: int
                 - glucose_level: float
         
+            explain: also return the contribution of each feature to the
+                predicted disease's probability
+        
         Returns:
             dict with prediction and confidence
         """
-        features = [[
-            patient_data['age'],
-            patient_data['fever'],
-            patient_data['headache'],
-            patient_data['fatigue'],
-            patient_data['cough'],
-            patient_data['vomiting'],
-            patient_data['diarrhea'],
-            patient_data['joint_pain'],
-            patient_data['rash'],
-            patient_data['blood_pressure_systolic'],
-            patient_data['blood_pressure_diastolic'],
-            patient_data['glucose_level'],
-            1 if patient_data['gender'] == 'M' else 0,
-        ]]
+        return self.predict_batch([patient_data], explain=explain)[0]
+    
+    def predict_batch(self, records, explain=False):
+        """
+        Predict diseases for many patients with a single pass over the forest
         
-        prediction = self.model.predict(features)[0]
-        probabilities = self.model.predict_proba(features)[0]
-        confidence = max(probabilities)
+        Rows already in the prediction cache are answered from it; the rest
+        are scored together in one predict_proba call.
+        
+        Args:
+            records: list of dicts with the same keys as predict()
         
+        Returns:
+            list of dicts with prediction and confidence, in input order
+        """
+        if not records:
+            return []
+        return self.predict_matrix(feature_pipeline.disease_matrix_from_records(records), explain=explain)
+    
+    def predict_matrix(self, matrix, explain=False):
+        """Predict diseases for a feature matrix from ml_models.features"""
+        artifact = self.registry.artifact(self.model_file)
+        rows = cached_scores(
+            'disease', [self.model_file], artifact.version, matrix,
+            self.score_matrix, _probabilities,
+        )
+        results = [self._result(artifact.obj.classes_, row) for row in rows]
+        observe_prediction(self, 'disease', matrix, results)
+        if explain:
+            explanations = cached_scores(
+                'disease_explain', [self.model_file, 'explain'], artifact.version, matrix,
+                self.explain_matrix, _contributions,
+            )
+            classes = [str(label) for label in artifact.obj.classes_]
+            for result, contributions in zip(results, explanations):
+                result['explanation'] = explanation(
+                    feature_pipeline.DISEASE_FEATURES, contributions, classes.index(result['disease'])
+                )
+        return results
+    
+    @staticmethod
+    def _result(classes, probabilities):
+        classes = [str(label) for label in classes]
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
         return {
-            'disease': prediction,
-            'confidence': float(confidence),
-            'all_probabilities': {
-                disease: float(prob) 
-                for disease, prob in zip(self.diseases, probabilities)
-            }
+            'disease': classes[best],
+            'confidence': float(probabilities[best]),
+            'all_probabilities': dict(zip(classes, probabilities)),
         }
 
 
 class RiskScoring:
     """Patient risk scoring using trained ML model"""
     
-    def __init__(self):
-        model_path = os.path.join(settings.ML_MODELS_PATH, 'risk_scoring_model.pkl')
-        scaler_path = os.path.join(settings.ML_MODELS_PATH, 'risk_scaler.pkl')
-        self.model = joblib.load(model_path)
-        self.scaler = joblib.load(scaler_path)
+    model_file = 'risk_scoring_model.pkl'
+    scaler_file = 'risk_scaler.pkl'
+    
+    def __init__(self, model_registry=None):
+        self.registry = model_registry or registry
     
-    def calculate_risk(self, patient_data):
+    @property
+    def model(self):
+        return self.registry.get(self.model_file)
+    
+    @property
+    def scaler(self):
+        return self.registry.get(self.scaler_file)
+    
+    @staticmethod
+    def features(patient_data):
+        """Feature row in the column order used by train_models.py"""
+        return feature_pipeline.risk_matrix_from_records([patient_data])[0]
+    
+    def score_matrix(self, matrix):
+        """Risk scores for an unscaled feature matrix, straight from the model"""
+        return self.model.predict(self.scaler.transform(matrix))
+    
+    def explain_matrix(self, matrix):
+        """
+        Per-feature contributions to the risk score for an unscaled feature
+        matrix (see contribution_matrix); scaling is per feature, so each
+        contribution belongs to the unscaled feature too
+        """
+        return contribution_matrix(compiled_forest(self.model), self.scaler.transform(matrix))
+    
+    def _version(self):
+        return (self.registry.artifact(self.model_file).version, self.registry.artifact(self.scaler_file).version)
+    
+    def calculate_risk(self, patient_data, explain=False):
         """
         Calculate patient risk score
         
@@ -91,24 +277,35 @@ class RiskScoring:
                 - heart_rate: int
                 - weight: float
                 - bmi: float
+            explain: also return the contribution of each feature to the score
         
         Returns:
             dict with risk score and level
         """
-        features = [[
-            patient_data['age'],
-            patient_data.get('pregnancy', 0),
-            patient_data['glucose'],
-            patient_data['blood_pressure_systolic'],
-            patient_data['blood_pressure_diastolic'],
-            patient_data['heart_rate'],
-            patient_data['weight'],
-            patient_data.get('bmi', 25),
-        ]]
-        
-        features_scaled = self.scaler.transform(features)
-        risk_score = self.model.predict(features_scaled)[0]
-        
+        return self.calculate_risk_matrix(
+            feature_pipeline.risk_matrix_from_records([patient_data]), explain=explain
+        )[0]
+    
+    def calculate_risk_matrix(self, matrix, explain=False):
+        """Risk results for a feature matrix from ml_models.features, in row order"""
+        version = self._version()
+        scores = cached_scores(
+            'risk', [self.model_file, self.scaler_file], version, matrix,
+            self.score_matrix, float,
+        )
+        results = [self._result(score) for score in scores]
+        observe_prediction(self, 'risk', matrix, results)
+        if explain:
+            explanations = cached_scores(
+                'risk_explain', [self.model_file, self.scaler_file, 'explain'], version, matrix,
+                self.explain_matrix, _contributions,
+            )
+            for result, contributions in zip(results, explanations):
+                result['explanation'] = explanation(feature_pipeline.RISK_FEATURES, contributions)
+        return results
+    
+    @staticmethod
+    def _result(risk_score):
         if risk_score > 0.7:
             risk_level = 'High'
             recommendation = 'Immediate medical attention required'
@@ -126,12 +323,95 @@ class RiskScoring:
         }
 
 
+class LinearScorer:
+    """
+    Closed-form scorer for a fitted binary logistic model.
+    
+    coef_ and intercept_ are read once from a LogisticRegression (or an
+    SGDClassifier with log loss); predict_proba is then a dot product and the
+    logistic sigmoid, computed exactly as scikit-learn does but without its
+    per-call input validation.
+    """
+    
+    def __init__(self, coef, intercept, classes):
+        self.coef_ = np.asarray(coef, dtype=np.float64)
+        self.intercept_ = np.asarray(intercept, dtype=np.float64)
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = self.coef_.shape[1]
+    
+    @classmethod
+    def from_model(cls, model):
+        return cls(model.coef_, model.intercept_, model.classes_)
+    
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f'X has {X.shape[-1]} features, but the model expects {self.n_features_in_}'
+            )
+        return (X @ self.coef_.T + self.intercept_).reshape(-1)
+    
+    def predict_proba(self, X):
+        positive = expit(self.decision_function(X))
+        return np.stack([1 - positive, positive], axis=1)
+    
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(np.intp)]
+
+
+_linear_scorers = weakref.WeakKeyDictionary()
+
+
+def linear_scorer(model):
+    """
+    LinearScorer for a binary logistic model, built once per model object.
+    
+    Returns None for any other kind of model, which callers then use as is.
+    """
+    scorer = _linear_scorers.get(model)
+    if scorer is None:
+        try:
+            from sklearn.linear_model import LogisticRegression, SGDClassifier
+        except ImportError:
+            return None
+        is_logistic = isinstance(model, LogisticRegression) or (
+            isinstance(model, SGDClassifier) and model.loss == 'log_loss'
+        )
+        if not is_logistic or len(model.classes_) != 2:
+            return None
+        scorer = _linear_scorers[model] = LinearScorer.from_model(model)
+    return scorer
+
+
 class NoShowPrediction:
     """Appointment no-show prediction using trained ML model"""
     
-    def __init__(self):
-        model_path = os.path.join(settings.ML_MODELS_PATH, 'noshow_prediction_model.pkl')
-        self.model = joblib.load(model_path)
+    model_file = 'noshow_prediction_model.pkl'
+    
+    WEATHER_ENCODING = feature_pipeline.WEATHER_ENCODING
+    
+    def __init__(self, model_registry=None):
+        self.registry = model_registry or registry
+    
+    @property
+    def model(self):
+        return self.registry.get(self.model_file)
+    
+    @classmethod
+    def features(cls, appointment_data):
+        """Feature row in the column order used by train_models.py"""
+        return feature_pipeline.noshow_matrix_from_records([appointment_data])[0]
+    
+    def noshow_probabilities(self, matrix, model=None):
+        """Vector of no-show probabilities for a feature matrix from ml_models.features"""
+        model = model if model is not None else self.model
+        probabilities = (linear_scorer(model) or model).predict_proba(matrix)
+        # The model is trained on `did_come`, so class 0 is the no-show
+        return probabilities[:, list(model.classes_).index(0)]
+    
+    def noshow_probability(self, features):
+        """No-show probability for a single feature row, memoized per model version"""
+        return self.predict_noshow_matrix(np.array([features], dtype=np.float64))[0]['noshow_probability']
     
     def predict_noshow(self, appointment_data):
         """
@@ -147,34 +427,59 @@ class NoShowPrediction:
         Returns:
             dict with prediction and probability
         """
-        weather_encoding = {
-            'sunny': 0,
-            'rainy': 1,
-            'cloudy': 2,
-        }
-        
-        features = [[
-            appointment_data['distance_from_hospital'],
-            appointment_data['previous_no_shows'],
-            appointment_data['sms_sent'],
-            weather_encoding.get(appointment_data['weather_condition'], 0),
-        ]]
-        
-        prediction = self.model.predict(features)[0]
-        probability = self.model.predict_proba(features)[0]
-        
-        noshow_prob = probability[0]
-        show_prob = probability[1]
-        
+        return self.predict_noshow_matrix(feature_pipeline.noshow_matrix_from_records([appointment_data]))[0]
+    
+    def predict_noshow_matrix(self, matrix):
+        """No-show results for a feature matrix from ml_models.features, in row order"""
+        artifact = self.registry.artifact(self.model_file)
+        probabilities = cached_scores(
+            'noshow', [self.model_file], artifact.version, matrix,
+            self.noshow_probabilities, float,
+        )
+        results = [self._result(probability) for probability in probabilities]
+        observe_prediction(self, 'noshow', matrix, results)
+        return results
+    
+    @staticmethod
+    def _result(noshow_prob):
+        show_prob = 1.0 - noshow_prob
         return {
-            'will_show_up': bool(prediction),
-            'show_probability': float(show_prob),
-            'noshow_probability': float(noshow_prob),
+            'will_show_up': show_prob > 0.5,
+            'show_probability': show_prob,
+            'noshow_probability': noshow_prob,
             'risk_level': 'High' if noshow_prob > 0.7 else 'Medium' if noshow_prob > 0.4 else 'Low',
             'recommendation': 'Send reminder SMS' if noshow_prob > 0.5 else 'No action needed',
         }
 
 
+def warm_up():
+    """
+    Load every model used by the predictors into the registry.
+
+    Called from wsgi.py and asgi.py so that, with `gunicorn --preload`,
+    models are opened once in the master process before workers fork.
+    Models that cannot be loaded are skipped; they will raise on first use
+    as before.
+    
+    Returns:
+        list of model files that were loaded
+    """
+    loaded = []
+    for model_file in [
+        DiseasePrediction.model_file,
+        RiskScoring.model_file,
+        RiskScoring.scaler_file,
+        NoShowPrediction.model_file,
+    ]:
+        try:
+            registry.get(model_file)
+        except Exception as e:
+            print(f"ML warm-up skipped {model_file}: {e}")
+            continue
+        loaded.append(model_file)
+    return loaded
+
+
 # Example usage
 if __name__ == '__main__':
     # Disease prediction example
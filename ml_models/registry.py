@@ -0,0 +1,234 @@
+"""
+Process-wide registry for trained ML model artifacts
+
+Each gunicorn worker loads a model file once, on first use, and keeps it in
+memory. The registry periodically stats the file on disk and, when its mtime
+changes and the content hash differs, loads the new version and swaps it in
+atomically so that running requests keep using the object they started with.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+import joblib
+from django.conf import settings
+
+from .drift import REFERENCE_SUFFIX, Reference
+from .forest import MANIFEST, CompiledForest, compact_name, compiled_name
+from .versions import active_models_path, online_models_path, version_path
+
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_artifact(path):
+    """Load a compiled forest (by its meta.json) memory-mapped, a drift reference, or any joblib pickle"""
+    if os.path.basename(path) == MANIFEST:
+        return CompiledForest.load(path, mmap_mode='r')
+    if path.endswith(REFERENCE_SUFFIX):
+        return Reference.load(path)
+    return joblib.load(path)
+
+
+def resident_memory():
+    """Return the resident set size of this process in bytes, or 0 if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def measure_load(loader, path):
+    """
+    Run loader(path) and return (object, seconds, bytes of memory added).
+
+    Memory is the growth of the process resident set size across the load,
+    so it is an approximation, and 0 on platforms without /proc.
+    """
+    rss_before = resident_memory()
+    started = time.perf_counter()
+    obj = loader(path)
+    elapsed = time.perf_counter() - started
+    return obj, elapsed, max(resident_memory() - rss_before, 0)
+
+
+class ModelArtifact:
+    """A loaded model together with the file metadata it was loaded from"""
+
+    def __init__(self, name, path, obj, mtime, checksum, load_seconds, memory_bytes, version):
+        self.name = name
+        self.path = path
+        self.obj = obj
+        self.mtime = mtime
+        self.checksum = checksum
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.version = version
+        self.loaded_at = time.time()
+        self.last_checked = time.monotonic()
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'path': str(self.path),
+            'version': self.version,
+            'checksum': self.checksum,
+            'mtime': self.mtime,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 6),
+            'memory_bytes': self.memory_bytes,
+        }
+
+
+class ModelRegistry:
+    """
+    Lazily loads model files and hot-reloads them when they change on disk.
+
+    Args:
+        base_path: directory holding the model files (defaults to
+            settings.ML_MODELS_PATH); when it contains versioned
+            artifacts, files are read from the active version
+        check_interval: minimum number of seconds between two stat() calls
+            on the same file (defaults to settings.ML_MODEL_RELOAD_INTERVAL)
+        loader: callable used to load a file (defaults to load_artifact)
+        version: serve this model version instead of the active one (used
+            to load a shadow candidate next to the primary models)
+
+    When settings.ML_USE_COMPILED_MODELS is on and a pickled model has a
+    compiled counterpart (see ml_models.forest.compiled_name), the compiled
+    file is served under the pickle's name, and its compact form (see
+    ml_models.compaction) ahead of it unless settings.ML_USE_COMPACT_MODELS
+    is off. When settings.ML_ONLINE_LEARNING
+    is on, an online-learning checkpoint of a file (see ml_models.online)
+    takes precedence over the file in the version directory.
+    """
+
+    def __init__(self, base_path=None, check_interval=None, loader=None, version=None):
+        self._base_path = base_path
+        self._version = version
+        self._check_interval = check_interval
+        self.loader = loader or load_artifact
+        self._artifacts = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    @property
+    def base_path(self):
+        """Directory of the model version being served (see ml_models.versions)"""
+        if self._version:
+            return version_path(self._version, self._base_path)
+        return active_models_path(self._base_path)
+
+    @property
+    def check_interval(self):
+        if self._check_interval is not None:
+            return self._check_interval
+        return getattr(settings, 'ML_MODEL_RELOAD_INTERVAL', 5.0)
+
+    def path_for(self, name):
+        if getattr(settings, 'ML_ONLINE_LEARNING', False):
+            online = os.path.join(online_models_path(self._base_path, self._version), name)
+            if os.path.exists(online):
+                return online
+        base_path = self.base_path
+        path = os.path.join(base_path, name)
+        if getattr(settings, 'ML_USE_COMPILED_MODELS', True):
+            candidates = [compiled_name(name)]
+            if getattr(settings, 'ML_USE_COMPACT_MODELS', True):
+                candidates.insert(0, compact_name(name))
+            for candidate in candidates:
+                compiled = os.path.join(base_path, candidate)
+                if compiled != path and os.path.exists(compiled):
+                    return compiled
+        return path
+
+    def get(self, name):
+        """Return the model object stored in file `name`, loading it if needed"""
+        return self.artifact(name).obj
+
+    def artifact(self, name):
+        """Return the ModelArtifact for `name`, reloading it if the file changed"""
+        artifact = self._artifacts.get(name)
+        if artifact is None:
+            return self._load(name)
+        if time.monotonic() - artifact.last_checked >= self.check_interval:
+            artifact = self._refresh(artifact)
+        return artifact
+
+    def version(self, name):
+        """Return a value that changes every time `name` is (re)loaded"""
+        artifact = self.artifact(name)
+        return f'{artifact.version}:{artifact.checksum[:12]}'
+
+    def reload(self, name=None):
+        """Force a reload of one model, or of every model already loaded"""
+        names = [name] if name else list(self._artifacts)
+        for model_name in names:
+            self._load(model_name, force=True)
+
+    def clear(self):
+        with self._lock:
+            self._artifacts = {}
+
+    def add_listener(self, callback):
+        """Register callback(name, artifact) to be called after each (re)load"""
+        self._listeners.append(callback)
+
+    def stats(self):
+        return {name: artifact.as_dict() for name, artifact in self._artifacts.items()}
+
+    def _refresh(self, artifact):
+        artifact.last_checked = time.monotonic()
+        try:
+            if self.path_for(artifact.name) != artifact.path:
+                # Another model version was activated or pinned
+                return self._load(artifact.name, force=True)
+            mtime = os.stat(artifact.path).st_mtime
+        except OSError:
+            # Keep serving the model we have if the file is briefly missing
+            # while a new version is being copied into place.
+            return artifact
+        if mtime == artifact.mtime:
+            return artifact
+        if file_checksum(artifact.path) == artifact.checksum:
+            artifact.mtime = mtime
+            return artifact
+        return self._load(artifact.name, force=True)
+
+    def _load(self, name, force=False):
+        with self._lock:
+            current = self._artifacts.get(name)
+            if current is not None and not force:
+                return current
+
+            path = self.path_for(name)
+            mtime = os.stat(path).st_mtime
+            checksum = file_checksum(path)
+            if current is not None and current.checksum == checksum:
+                current.path = path
+                current.mtime = mtime
+                current.last_checked = time.monotonic()
+                return current
+
+            obj, seconds, memory = measure_load(self.loader, path)
+            version = current.version + 1 if current is not None else 1
+            artifact = ModelArtifact(name, path, obj, mtime, checksum, seconds, memory, version)
+            # Rebinding a dict entry is atomic; callers holding the previous
+            # artifact keep using it until they ask the registry again.
+            self._artifacts[name] = artifact
+
+        for callback in self._listeners:
+            callback(name, artifact)
+        return artifact
+
+
+registry = ModelRegistry()
@@ -0,0 +1,277 @@
+"""
+Shadow evaluation of a candidate model version on live traffic
+
+With settings.ML_SHADOW_VERSION naming a trained model version, every
+prediction answered by the serving models is also handed, with its feature
+rows, to a bounded queue. Background threads score the same rows with the
+candidate version and compare: whether both give the same label (disease,
+risk level, no-show risk level), the score difference for the primary
+model's label and the candidate's latency.
+
+The request never waits for the candidate. When the queue is full the
+sample is dropped and counted, so shadowing adds at most a queue insert to
+a request. Aggregates are kept in memory per predictor, reported by the ML
+status endpoint and appended, once per ML_SHADOW_FLUSH_INTERVAL, as one
+JSON line per predictor to ML_SHADOW_LOG_PATH.
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+
+
+class _Window:
+    """Aggregates of one predictor since the last flush"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.samples = 0
+        self.rows = 0
+        self.agreements = 0
+        self.delta_sum = 0.0
+        self.abs_delta_sum = 0.0
+        self.max_abs_delta = 0.0
+        self.latencies = deque(maxlen=1000)
+
+    def add(self, agreements, deltas, seconds):
+        self.samples += 1
+        self.rows += len(deltas)
+        self.agreements += agreements
+        self.delta_sum += float(deltas.sum())
+        self.abs_delta_sum += float(np.abs(deltas).sum())
+        self.max_abs_delta = max(self.max_abs_delta, float(np.abs(deltas).max()))
+        self.latencies.append(seconds)
+
+    def as_dict(self):
+        latencies = np.array(self.latencies, dtype=np.float64) * 1000
+        rows = self.rows or 1
+        return {
+            'since': self.started,
+            'samples': self.samples,
+            'rows': self.rows,
+            'agreement_rate': round(self.agreements / rows, 6) if self.rows else None,
+            'mean_delta': round(self.delta_sum / rows, 6) if self.rows else None,
+            'mean_abs_delta': round(self.abs_delta_sum / rows, 6) if self.rows else None,
+            'max_abs_delta': round(self.max_abs_delta, 6),
+            'candidate_latency_ms': {
+                'mean': round(float(latencies.mean()), 3) if len(latencies) else 0.0,
+                'p50': round(float(np.percentile(latencies, 50)), 3) if len(latencies) else 0.0,
+                'p95': round(float(np.percentile(latencies, 95)), 3) if len(latencies) else 0.0,
+            },
+        }
+
+
+def _label_and_score(name, result, label=None):
+    """(label, score) of a predictor result; `label` picks the class whose probability is the score"""
+    if name == 'disease':
+        label = label if label is not None else result['disease']
+        return result['disease'], result['all_probabilities'].get(label, 0.0)
+    if name == 'risk':
+        return result['risk_level'], result['risk_score']
+    return result['risk_level'], result['noshow_probability']
+
+
+class ShadowEvaluator:
+    """
+    Scores sampled predictions with a candidate model version off the request path.
+
+    Args:
+        version: candidate model version (see ml_models.versions)
+        queue_size: samples waiting at most; further samples are dropped
+        threads: background threads scoring samples
+        sample_rate: fraction of predictions sampled
+        max_rows: rows of a batch prediction kept per sample
+        flush_interval: seconds between two flushes of the aggregates
+        log_path: JSON-lines file the aggregates are appended to, or None
+    """
+
+    def __init__(self, version, queue_size=1000, threads=1, sample_rate=1.0, max_rows=100,
+                 flush_interval=60.0, log_path=None):
+        from .predict import DiseasePrediction, NoShowPrediction, RiskScoring
+        from .registry import ModelRegistry
+
+        self.version = version
+        self.sample_rate = sample_rate
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.log_path = str(log_path) if log_path else None
+        self.registry = ModelRegistry(version=version)
+        self.candidates = {
+            'disease': DiseasePrediction(self.registry),
+            'risk': RiskScoring(self.registry),
+            'noshow': NoShowPrediction(self.registry),
+        }
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._n_threads = threads
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._flushed = {}
+        self._totals = {}
+        self._last_flush = time.monotonic()
+
+    def observe(self, name, matrix, results):
+        """Queue a predictor's feature rows and results for comparison; never blocks"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self._ensure_workers()
+        totals = self._total(name)
+        try:
+            self._queue.put_nowait((name, matrix[:self.max_rows], results[:self.max_rows]))
+        except queue.Full:
+            with self._lock:
+                totals['dropped'] += 1
+            return
+        with self._lock:
+            totals['queued'] += 1
+
+    def _total(self, name):
+        totals = self._totals.get(name)
+        if totals is None:
+            with self._lock:
+                totals = self._totals.setdefault(name, {'queued': 0, 'dropped': 0, 'errors': 0, 'rows': 0})
+        return totals
+
+    def _ensure_workers(self):
+        # Started lazily so that the threads are created after gunicorn forks
+        if len(self._threads) == self._n_threads and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._start_lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self._n_threads:
+                thread = threading.Thread(
+                    target=self._run, name=f'shadow-{self.version}-{len(self._threads)}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            try:
+                sample = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                sample = None
+            if sample is not None:
+                self._evaluate(*sample)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def _candidate_results(self, name, matrix):
+        candidate = self.candidates[name]
+        if name == 'disease':
+            classes = candidate.model.classes_
+            return [candidate._result(classes, row.tolist()) for row in candidate.score_matrix(matrix)]
+        if name == 'risk':
+            return [candidate._result(score) for score in candidate.score_matrix(matrix).tolist()]
+        return [candidate._result(probability) for probability in candidate.noshow_probabilities(matrix).tolist()]
+
+    def _evaluate(self, name, matrix, results):
+        # Looked up before taking the lock, which _total() may need
+        totals = self._total(name)
+        started = time.perf_counter()
+        try:
+            candidate_results = self._candidate_results(name, np.asarray(matrix, dtype=np.float64))
+        except Exception as e:
+            print(f"ML Shadow Error: {e}")
+            with self._lock:
+                totals['errors'] += 1
+            return
+        seconds = time.perf_counter() - started
+
+        agreements = 0
+        deltas = np.empty(len(results), dtype=np.float64)
+        for index, (primary, candidate) in enumerate(zip(results, candidate_results)):
+            label, score = _label_and_score(name, primary)
+            candidate_label, _ = _label_and_score(name, candidate)
+            _, candidate_score = _label_and_score(name, candidate, label)
+            agreements += candidate_label == label
+            deltas[index] = candidate_score - score
+        with self._lock:
+            window = self._windows.get(name)
+            if window is None:
+                window = self._windows[name] = _Window()
+            window.add(agreements, deltas, seconds)
+            totals['rows'] += len(results)
+
+    def flush(self):
+        """Append the current windows to the log and start new ones"""
+        with self._lock:
+            windows, self._windows = self._windows, {}
+            self._flushed.update(windows)
+            self._last_flush = time.monotonic()
+            totals = {name: dict(values) for name, values in self._totals.items()}
+        if not windows or not self.log_path:
+            return
+        lines = [
+            json.dumps(dict(
+                window.as_dict(), predictor=name, candidate=self.version, pid=os.getpid(),
+                flushed_at=time.time(), totals=totals.get(name, {}),
+            ))
+            for name, window in windows.items()
+        ]
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            print(f"ML Shadow Error: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'candidate': self.version,
+                'queued_now': self._queue.qsize(),
+                'queue_size': self._queue.maxsize,
+                'sample_rate': self.sample_rate,
+                'predictors': {
+                    name: {
+                        'totals': dict(totals),
+                        'window': self._windows[name].as_dict() if name in self._windows else None,
+                        'last_flushed_window': self._flushed[name].as_dict() if name in self._flushed else None,
+                    }
+                    for name, totals in self._totals.items()
+                },
+            }
+
+
+_evaluator = None
+_evaluator_lock = threading.Lock()
+
+
+def get_evaluator():
+    """Process-wide ShadowEvaluator for settings.ML_SHADOW_VERSION, or None when shadowing is off"""
+    global _evaluator
+    version = getattr(settings, 'ML_SHADOW_VERSION', '')
+    if not version:
+        return None
+    if _evaluator is None or _evaluator.version != version:
+        with _evaluator_lock:
+            if _evaluator is None or _evaluator.version != version:
+                _evaluator = ShadowEvaluator(
+                    version,
+                    queue_size=getattr(settings, 'ML_SHADOW_QUEUE_SIZE', 1000),
+                    threads=getattr(settings, 'ML_SHADOW_THREADS', 1),
+                    sample_rate=getattr(settings, 'ML_SHADOW_SAMPLE_RATE', 1.0),
+                    max_rows=getattr(settings, 'ML_SHADOW_MAX_ROWS', 100),
+                    flush_interval=getattr(settings, 'ML_SHADOW_FLUSH_INTERVAL', 60.0),
+                    log_path=getattr(settings, 'ML_SHADOW_LOG_PATH', None),
+                )
+    return _evaluator
+
+
+def observe(name, matrix, results):
+    """Hand a prediction to the shadow evaluator, if one is configured"""
+    evaluator = get_evaluator()
+    if evaluator is not None:
+        evaluator.observe(name, matrix, results)
+
+
+def shadow_stats():
+    return _evaluator.stats() if _evaluator is not None else None
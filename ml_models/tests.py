@@ -0,0 +1,539 @@
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from . import batching, benchmark, drift, features, predict, shadow, training, tuning, versions
+from .cache import PredictionCache
+from .columnar import convert_csv, open_dataset
+from .forest import CompiledForest
+from .registry import ModelRegistry, file_checksum
+
+
+class TempModelsMixin:
+    def setUp(self):
+        super().setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+
+
+class DriftMonitorTest(TempModelsMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.X = np.column_stack([rng.normal(10, 2, 500), rng.integers(0, 3, 500)])
+        drift.write_reference(
+            os.path.join(self.path, drift.reference_name('noshow')),
+            drift.build_reference('noshow', self.X, ['distance', 'weather']),
+        )
+        self.registry = ModelRegistry(base_path=self.path, check_interval=0)
+        self.monitor = drift.DriftMonitor(
+            self.registry, path=os.path.join(self.path, 'drift'), flush_interval=3600,
+        )
+
+    def rows(self):
+        [(_, _, counts)] = self.monitor.totals()
+        return int(counts.sum()) // self.X.shape[1]
+
+    def test_counts_survive_a_reload(self):
+        self.monitor.observe('noshow', self.X[:10])
+        self.registry.clear()
+        self.monitor.observe('noshow', self.X[10:30])
+        self.assertEqual(self.rows(), 30)
+
+    def test_flush_and_merge(self):
+        self.monitor.observe('noshow', self.X)
+        self.monitor.flush()
+        reference = drift.Reference.load(os.path.join(self.path, drift.reference_name('noshow')))
+        counts, workers = drift.merged_counts(self.monitor.path, {'noshow': reference})
+        self.assertEqual(workers, 1)
+        # The training rows themselves do not drift
+        self.assertEqual(drift.psi_status(max(f['psi'] for f in drift.compare(reference, counts['noshow']))), 'stable')
+
+    def test_prune_worker_files(self):
+        self.monitor.observe('noshow', self.X)
+        self.monitor.flush()
+        [file_name] = os.listdir(self.monitor.path)
+        self.assertEqual(drift.prune_worker_files(self.monitor.path, 3600), [])
+        os.utime(os.path.join(self.monitor.path, file_name), (0, 0))
+        self.assertEqual(drift.prune_worker_files(self.monitor.path, 3600), [file_name])
+
+
+class UnobservedTest(SimpleTestCase):
+    def test_benchmark_predictions_are_not_observed(self):
+        predictor = mock.Mock(registry=predict.registry)
+        with mock.patch.object(drift, 'observe') as observe:
+            with predict.unobserved():
+                predict.observe_prediction(predictor, 'noshow', np.zeros((1, 4)), [{}])
+            observe.assert_not_called()
+            predict.observe_prediction(predictor, 'noshow', np.zeros((1, 4)), [{}])
+            observe.assert_called_once()
+
+
+class LinearScorerTest(SimpleTestCase):
+    def setUp(self):
+        from sklearn.linear_model import LogisticRegression
+
+        rng = np.random.default_rng(0)
+        # No-show shaped rows: distance, previous no-shows, sms sent, weather code
+        self.X = np.column_stack([
+            rng.uniform(0.5, 50, 2000), rng.integers(0, 5, 2000),
+            rng.integers(0, 2, 2000), rng.integers(0, 3, 2000),
+        ]).astype(np.float64)
+        y = (self.X[:, 0] / 50 + self.X[:, 1] / 5 + rng.normal(0, 0.3, 2000) > 0.8).astype(int)
+        self.model = LogisticRegression(max_iter=1000).fit(self.X, y)
+        self.scorer = predict.linear_scorer(self.model)
+
+    def test_batch_matches_sklearn(self):
+        np.testing.assert_allclose(
+            self.scorer.predict_proba(self.X), self.model.predict_proba(self.X), rtol=0, atol=1e-12,
+        )
+        np.testing.assert_array_equal(self.scorer.predict(self.X), self.model.predict(self.X))
+
+    def test_single_rows_match_sklearn(self):
+        for row in self.X[:50]:
+            np.testing.assert_allclose(
+                self.scorer.predict_proba(row[np.newaxis]), self.model.predict_proba(row[np.newaxis]),
+                rtol=0, atol=1e-12,
+            )
+
+    def test_other_models_are_not_converted(self):
+        from sklearn.ensemble import RandomForestClassifier
+
+        forest = RandomForestClassifier(n_estimators=2, random_state=0).fit(self.X, self.X[:, 2])
+        self.assertIsNone(predict.linear_scorer(forest))
+
+
+class MicroBatcherTest(SimpleTestCase):
+    def test_batchers_are_per_registry(self):
+        first, second = ModelRegistry(), ModelRegistry()
+        self.assertIs(batching.get_batcher('noshow', len, first), batching.get_batcher('noshow', max, first))
+        self.assertIsNot(batching.get_batcher('noshow', len, first), batching.get_batcher('noshow', len, second))
+
+    def test_unreadable_result_fails_its_caller(self):
+        class Results:
+            def __getitem__(self, index):
+                if index == 1:
+                    raise IndexError(index)
+                return index * 10
+
+        batcher = batching.MicroBatcher(lambda matrix: Results(), max_wait=0.05)
+        futures = [batcher.submit([float(i)]) for i in range(3)]
+        self.assertEqual(futures[0].result(timeout=5), 0)
+        with self.assertRaises(IndexError):
+            futures[1].result(timeout=5)
+        self.assertEqual(futures[2].result(timeout=5), 20)
+
+
+class ModelRegistryTest(TempModelsMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file = os.path.join(self.path, 'model.pkl')
+        self.write({'coef': 1})
+        self.registry = ModelRegistry(base_path=self.path, check_interval=0)
+
+    def write(self, obj, mtime=None):
+        joblib.dump(obj, self.file)
+        if mtime is not None:
+            os.utime(self.file, (mtime, mtime))
+
+    def test_reload_on_checksum_change(self):
+        first = self.registry.get('model.pkl')
+        self.assertEqual(first, {'coef': 1})
+        self.assertIs(self.registry.get('model.pkl'), first)
+
+        # Touched but unchanged: the loaded object is kept
+        self.write({'coef': 1}, mtime=1)
+        self.assertIs(self.registry.get('model.pkl'), first)
+        self.assertEqual(self.registry.artifact('model.pkl').version, 1)
+
+        self.write({'coef': 2}, mtime=2)
+        self.assertEqual(self.registry.get('model.pkl'), {'coef': 2})
+        self.assertEqual(self.registry.artifact('model.pkl').version, 2)
+
+    def test_check_interval(self):
+        registry = ModelRegistry(base_path=self.path, check_interval=3600)
+        registry.get('model.pkl')
+        self.write({'coef': 2}, mtime=2)
+        self.assertEqual(registry.get('model.pkl'), {'coef': 1})
+        registry.reload('model.pkl')
+        self.assertEqual(registry.get('model.pkl'), {'coef': 2})
+
+
+class PredictionCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = PredictionCache(maxsize=2, ttl=60)
+
+    def key(self, row, names=('model.pkl',)):
+        return self.cache.make_key(names, 'v1', row)
+
+    def test_feature_key_ignores_input_types(self):
+        self.assertEqual(self.key([1, 0, -0.0]), self.key(np.array([1.0, 0.0, 0.0])))
+        self.assertNotEqual(self.key([1, 0]), self.key([0, 1]))
+
+    def test_ttl_expiry(self):
+        with mock.patch('time.monotonic', return_value=1000.0):
+            self.cache.set(self.key([1]), 'result')
+            self.assertEqual(self.cache.get(self.key([1])), 'result')
+        with mock.patch('time.monotonic', return_value=1060.0):
+            self.assertIsNone(self.cache.get(self.key([1])))
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_lru_eviction(self):
+        for row in [[1], [2]]:
+            self.cache.set(self.key(row), row)
+        # [1] becomes the most recently used, so [2] is evicted
+        self.cache.get(self.key([1]))
+        self.cache.set(self.key([3]), [3])
+        self.assertIsNone(self.cache.get(self.key([2])))
+        self.assertEqual(self.cache.get(self.key([1])), [1])
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_invalidate_one_model(self):
+        self.cache.set(self.key([1]), 'a')
+        self.cache.set(self.key([1], names=('other.pkl',)), 'b')
+        self.cache.invalidate('model.pkl')
+        self.assertIsNone(self.cache.get(self.key([1])))
+        self.assertEqual(self.cache.get(self.key([1], names=('other.pkl',))), 'b')
+
+
+class CompiledForestTest(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(500, 6))
+        self.y = (self.X[:, 0] + self.X[:, 1] * self.X[:, 2] > 0).astype(int) + (self.X[:, 3] > 1)
+
+    def test_classifier_matches_sklearn(self):
+        from sklearn.ensemble import RandomForestClassifier
+
+        forest = RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0).fit(self.X, self.y)
+        compiled = CompiledForest.from_sklearn(forest)
+
+        np.testing.assert_array_equal(compiled.predict_proba(self.X), forest.predict_proba(self.X))
+        np.testing.assert_array_equal(compiled.predict(self.X), forest.predict(self.X))
+        np.testing.assert_array_equal(compiled.classes_, forest.classes_)
+
+    def test_regressor_matches_sklearn(self):
+        from sklearn.ensemble import RandomForestRegressor
+
+        target = self.X[:, 0] * 2 + self.X[:, 4]
+        forest = RandomForestRegressor(n_estimators=10, random_state=0).fit(self.X, target)
+        compiled = CompiledForest.from_sklearn(forest)
+
+        np.testing.assert_array_equal(compiled.predict(self.X), forest.predict(self.X))
+        with self.assertRaises(AttributeError):
+            compiled.predict_proba(self.X)
+
+
+class BenchmarkTest(SimpleTestCase):
+    def test_percentiles(self):
+        summary = benchmark.percentiles([0.001] * 99 + [0.1])
+        self.assertEqual((summary['n'], summary['p50'], summary['max']), (100, 1.0, 100.0))
+
+    def test_records_are_seeded(self):
+        first = benchmark.noshow_records(5, np.random.default_rng(3))
+        self.assertEqual(first, benchmark.noshow_records(5, np.random.default_rng(3)))
+        self.assertNotEqual(first, benchmark.noshow_records(5, np.random.default_rng(4)))
+
+    def test_compare(self):
+        def result(p50, rows_per_sec):
+            latency = {'p50': p50, 'p95': p50, 'p99': p50}
+            return {'predictors': {'noshow': {
+                'single': latency,
+                'batch': {'100': dict(latency, rows_per_sec=rows_per_sec)},
+                'cold_first_call_ms': 10,
+            }}}
+
+        rows = {metric: ratio for metric, _, _, ratio in benchmark.compare(result(2, 1000), result(1, 4000))}
+        self.assertEqual(rows['noshow.single.p50_ms'], 0.5)
+        self.assertEqual(rows['noshow.batch[100].rows_per_sec'], 4.0)
+        self.assertEqual(rows['noshow.cold_first_call_ms'], 1.0)
+
+
+class FeatureMatrixTest(SimpleTestCase):
+    def test_age_matches_patient_age(self):
+        today = date(2024, 3, 1)
+        born = [date(2000, 3, 1), date(2000, 3, 2), date(2000, 2, 29), date(1999, 12, 31)]
+        self.assertEqual(features.age_column(born, today).tolist(), [24, 23, 24, 24])
+
+    def test_blood_pressure(self):
+        self.assertEqual(features.parse_blood_pressure('130/85'), (130, 85))
+        self.assertEqual(features.parse_blood_pressure('140'), (140, 80))
+        self.assertEqual(features.parse_blood_pressure('high'), (120, 80))
+        self.assertEqual(features.parse_blood_pressure(''), (120, 80))
+
+    def test_disease_values_match_records(self):
+        today = date(2024, 3, 1)
+        matrix = features.disease_matrix_from_values(
+            [(date(1980, 1, 1), 'F', 'Fever and JOINT PAIN', '130/85', None)], today,
+        )
+        record = dict.fromkeys(features.SYMPTOMS, 0)
+        record.update(
+            fever=1, joint_pain=1, age=44, gender='F',
+            blood_pressure_systolic=130, blood_pressure_diastolic=85, glucose_level=100,
+        )
+        np.testing.assert_array_equal(matrix, features.disease_matrix_from_records([record]))
+
+    def test_risk_values_match_records(self):
+        matrix = features.risk_matrix_from_values(
+            [(date(1980, 1, 1), Decimal('140.5'), '120/80', 72, Decimal('80'), Decimal('200'))], date(2024, 3, 1),
+        )
+        expected = features.risk_matrix_from_records([{
+            'age': 44, 'glucose': 140.5, 'blood_pressure_systolic': 120, 'blood_pressure_diastolic': 80,
+            'heart_rate': 72, 'weight': 80, 'bmi': 20,
+        }])
+        np.testing.assert_array_equal(matrix, expected)
+        # A missing height falls back to the default BMI
+        [row] = features.risk_matrix_from_values([(date(1980, 1, 1), None, '', None, None, None)])
+        self.assertEqual(row[-1], features.DEFAULT_BMI)
+
+    def test_noshow_values_match_records(self):
+        matrix = features.noshow_matrix_from_values(
+            [(7, Decimal('12.5'), 'Rainy ', True), (8, None, '', False)], {7: 2},
+        )
+        expected = features.noshow_matrix_from_records([
+            {'distance_from_hospital': 12.5, 'previous_no_shows': 2, 'sms_sent': 1, 'weather_condition': 'rainy'},
+            {'previous_no_shows': 0, 'sms_sent': 0},
+        ])
+        np.testing.assert_array_equal(matrix, expected)
+        self.assertEqual(features.noshow_matrix_from_values([], {}).shape, (0, len(features.NOSHOW_FEATURES)))
+
+
+class VersionedTrainingTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.path = tempfile.mkdtemp()
+        cls.manifest = training.train_all(cls.path, settings.DATASETS_PATH, n_jobs=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_manifest(self):
+        version = self.manifest['version']
+        self.assertEqual(versions.read_manifest(version, self.path), self.manifest)
+        for file_name, entry in self.manifest['models'].items():
+            path = os.path.join(versions.version_path(version, self.path), file_name)
+            self.assertEqual(entry['sha256'], file_checksum(path))
+        model = self.manifest['models']['noshow_prediction_model.pkl']
+        self.assertEqual(model['features'], features.NOSHOW_FEATURES)
+        self.assertIn('roc_auc', model['metrics'])
+        self.assertIn('compiled', self.manifest['models']['disease_prediction_model.pkl'])
+
+    def test_partial_training_and_activation(self):
+        first = self.manifest['version']
+        registry = ModelRegistry(base_path=self.path, check_interval=0)
+        self.assertEqual(versions.current_version(self.path), first)
+        self.assertEqual(registry.artifact('weather_encoder.pkl').path, os.path.join(
+            versions.version_path(first, self.path), 'weather_encoder.pkl',
+        ))
+
+        second = training.train_all(self.path, settings.DATASETS_PATH, names=['noshow'], n_jobs=1)
+        self.assertEqual(versions.current_version(self.path), second['version'])
+        self.assertEqual(versions.previous_version(self.path), first)
+        carried = second['models']['risk_scoring_model.pkl']
+        self.assertEqual(carried['carried_over_from'], first)
+        self.assertEqual(carried['sha256'], self.manifest['models']['risk_scoring_model.pkl']['sha256'])
+        self.assertNotIn('carried_over_from', second['models']['noshow_prediction_model.pkl'])
+        # The registry follows the activated version
+        self.assertIn(second['version'], registry.artifact('weather_encoder.pkl').path)
+
+        self.assertEqual(versions.activate(first, self.path), second['version'])
+        self.assertIn(first, registry.artifact('weather_encoder.pkl').path)
+        with self.assertRaises(ValueError):
+            versions.activate('unknown', self.path)
+
+
+def dataset_generator():
+    """datasets/generate_datasets.py, which is a script rather than a package module"""
+    spec = importlib.util.spec_from_file_location(
+        'generate_datasets', os.path.join(settings.DATASETS_PATH, 'generate_datasets.py'),
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class DatasetGeneratorTest(TempModelsMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.generator = dataset_generator()
+
+    def test_chunks_are_reproducible(self):
+        chunks = list(self.generator.generate_chunks('risk', 2500, chunk_size=1000, seed=7))
+        self.assertEqual([len(chunk['age']) for chunk in chunks], [1000, 1000, 500])
+        again = list(self.generator.generate_chunks('risk', 2500, chunk_size=1000, seed=7))
+        for chunk, repeated in zip(chunks, again):
+            for name, values in chunk.items():
+                np.testing.assert_array_equal(values, repeated[name])
+
+    def test_csv_and_columnar_hold_the_same_rows(self):
+        csv_path = os.path.join(self.path, 'appointments_dataset.csv')
+        columnar_path = os.path.join(self.path, 'appointments_dataset')
+        self.generator.write_csv('appointments', csv_path, 1500, chunk_size=400)
+        self.generator.write_columnar('appointments', columnar_path, 1500, chunk_size=400)
+
+        frame = pd.read_csv(csv_path)
+        dataset = open_dataset(columnar_path)
+        self.assertEqual(len(frame), len(dataset))
+        self.assertEqual(frame['patient_id'].tolist(), dataset.decoded('patient_id').tolist())
+        self.assertEqual(frame['weather_condition'].tolist(), dataset.decoded('weather_condition').tolist())
+        np.testing.assert_array_equal(frame['distance_from_hospital'], dataset['distance_from_hospital'])
+        # Patient ids keep counting across chunks
+        self.assertEqual(frame['patient_id'].nunique(), 1500)
+
+
+class ColumnarDatasetTest(TempModelsMixin, SimpleTestCase):
+    def test_converted_csv_trains_on_the_same_features(self):
+        for name in ['disease', 'risk', 'noshow']:
+            csv_path = training.dataset_path(settings.DATASETS_PATH, name)
+            columnar_path = os.path.join(self.path, training.DATASETS[name])
+            convert_csv(csv_path, columnar_path, chunk_size=700)
+
+            X, y = training.preprocess(name, csv_path)
+            columnar_X, columnar_y = training.preprocess(name, columnar_path)
+            np.testing.assert_array_equal(X, columnar_X)
+            np.testing.assert_array_equal(y, columnar_y)
+
+    def test_schema(self):
+        csv_path = os.path.join(self.path, 'visits.csv')
+        pd.DataFrame({
+            'count': [1, 300, -2], 'score': [0.5, 1.5, 2.0], 'city': ['Adama', 'Gondar', 'Adama'],
+        }).to_csv(csv_path, index=False)
+        convert_csv(csv_path, os.path.join(self.path, 'visits'), max_categories=1)
+
+        dataset = open_dataset(os.path.join(self.path, 'visits'))
+        self.assertEqual(dataset['count'].dtype, np.int16)
+        self.assertFalse(dataset.is_category('city'))
+        self.assertEqual(dataset.decoded('city').tolist(), ['Adama', 'Gondar', 'Adama'])
+        self.assertEqual(dataset.to_pandas()['score'].tolist(), [0.5, 1.5, 2.0])
+        with self.assertRaises(KeyError):
+            dataset['missing']
+
+
+class HyperparameterSearchTest(TempModelsMixin, SimpleTestCase):
+    def candidate(self, score, p50, size):
+        return {'score': score, 'latency': {'single_ms': {'p50': p50}}, 'compiled_bytes': size}
+
+    def test_pareto_front_and_recommendation(self):
+        results = [
+            self.candidate(0.90, 1.0, 100),
+            self.candidate(0.95, 2.0, 200),
+            # Worse than the first on every axis
+            self.candidate(0.85, 1.5, 150),
+            self.candidate(0.95, 2.0, 300),
+        ]
+        self.assertEqual(tuning.pareto_front(results), [0, 1])
+        for index, result in enumerate(results):
+            result['pareto'] = index in (0, 1)
+        self.assertIs(tuning.recommend(results), results[0])
+        self.assertIs(tuning.recommend(results, min_score=0.93), results[1])
+        self.assertIsNone(tuning.recommend(results, min_score=0.99))
+
+    def test_grid(self):
+        candidates = tuning.grid({'n_estimators': [5], 'max_depth': [3, None]})
+        self.assertEqual(len(candidates), 2 * len(tuning.DEFAULT_GRID['min_samples_leaf']))
+        self.assertEqual(candidates[0], {'n_estimators': 5, 'max_depth': 3, 'min_samples_leaf': 1})
+
+    def test_tune(self):
+        space = {'n_estimators': [5, 10], 'max_depth': [4], 'min_samples_leaf': [5]}
+        report = tuning.tune(
+            settings.DATASETS_PATH, names=['risk'], space=space, folds=2, processes=1,
+            cache_dir=self.path, latency_calls=5,
+        )['risk']
+        self.assertEqual(report['metric'], 'r2')
+        self.assertEqual([result['params']['n_estimators'] for result in report['candidates']], [5, 10])
+        self.assertIn(report['recommended'], report['candidates'])
+        # The folds are cached for the next search
+        self.assertTrue(tuning.prepare('risk', settings.DATASETS_PATH, self.path, folds=2)[1])
+
+
+class ExplanationTest(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(300, 4))
+
+    def test_contributions_add_up_to_the_prediction(self):
+        from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+        y = (self.X[:, 0] > 0).astype(int) + (self.X[:, 1] > 1)
+        forest = CompiledForest.from_sklearn(RandomForestClassifier(n_estimators=10, random_state=0).fit(self.X, y))
+        bias, contributions = forest.contributions(self.X)
+        np.testing.assert_allclose(bias + contributions.sum(axis=1), forest.predict_proba(self.X), atol=1e-12)
+
+        forest = CompiledForest.from_sklearn(
+            RandomForestRegressor(n_estimators=10, random_state=0).fit(self.X, self.X[:, 2] * 3)
+        )
+        bias, contributions = forest.contributions(self.X)
+        np.testing.assert_allclose(bias[0] + contributions[:, :, 0].sum(axis=1), forest.predict(self.X), atol=1e-12)
+        # Features the target does not depend on contribute little
+        self.assertGreater(np.abs(contributions[:, 2]).mean(), 10 * np.abs(contributions[:, 0]).mean())
+
+    def test_explanation(self):
+        # Two features and the bias, for two outputs
+        contributions = [(0.1, -0.2), (-0.3, 0.4), (0.5, 0.6)]
+        self.assertEqual(predict.explanation(['age', 'bmi'], contributions, output=0), {
+            'base_value': 0.5, 'contributions': {'bmi': -0.3, 'age': 0.1},
+        })
+        ranked = predict.explanation(['age', 'bmi'], contributions, output=1)['contributions']
+        self.assertEqual(list(ranked), ['bmi', 'age'])
+
+
+class ShadowEvaluatorTest(TempModelsMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.log_path = os.path.join(self.path, 'shadow.jsonl')
+        # No worker threads: samples stay queued until evaluated here
+        self.evaluator = shadow.ShadowEvaluator('candidate', queue_size=2, threads=0, log_path=self.log_path)
+
+    def results(self, probabilities):
+        return [predict.NoShowPrediction._result(probability) for probability in probabilities]
+
+    def evaluate_queued(self):
+        """What a worker thread does with the queued samples"""
+        while not self.evaluator._queue.empty():
+            self.evaluator._evaluate(*self.evaluator._queue.get_nowait())
+
+    def test_agreement_and_deltas(self):
+        primary = self.results([0.1, 0.9])
+        candidate = self.results([0.2, 0.1])
+        self.evaluator.observe('noshow', np.zeros((2, 4)), primary)
+        with mock.patch.object(self.evaluator, '_candidate_results', return_value=candidate):
+            self.evaluate_queued()
+
+        window = self.evaluator.stats()['predictors']['noshow']['window']
+        self.assertEqual((window['rows'], window['agreement_rate']), (2, 0.5))
+        self.assertAlmostEqual(window['mean_delta'], -0.35)
+        self.assertAlmostEqual(window['max_abs_delta'], 0.8)
+
+        self.evaluator.flush()
+        with open(self.log_path) as f:
+            [line] = [json.loads(line) for line in f]
+        self.assertEqual((line['predictor'], line['candidate'], line['rows']), ('noshow', 'candidate', 2))
+        self.assertIsNone(self.evaluator.stats()['predictors']['noshow']['window'])
+
+    def test_full_queue_drops_samples(self):
+        for _ in range(3):
+            self.evaluator.observe('noshow', np.zeros((1, 4)), self.results([0.5]))
+        totals = self.evaluator.stats()['predictors']['noshow']['totals']
+        self.assertEqual((totals['queued'], totals['dropped']), (2, 1))
+
+    def test_candidate_errors_are_counted(self):
+        self.evaluator.observe('noshow', np.zeros((1, 4)), self.results([0.5]))
+        with mock.patch.object(self.evaluator, '_candidate_results', side_effect=FileNotFoundError('no model')):
+            with mock.patch('builtins.print'):
+                self.evaluate_queued()
+        self.assertEqual(self.evaluator.stats()['predictors']['noshow']['totals']['errors'], 1)
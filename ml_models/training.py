@@ -0,0 +1,376 @@
+"""
+Training pipeline for the ML models
+
+Trains the disease, risk and no-show models in parallel worker processes and
+publishes the results as a new model version (see ml_models.versions):
+
+- datasets are read from the columnar format (ml_models.columnar) when a
+  converted copy is present, reading only the feature and target columns
+  through memory maps, and from the CSV otherwise
+- each dataset is preprocessed into the serving feature matrix once and the
+  matrix is cached on disk, keyed by the dataset's SHA-256, so unchanged
+  datasets are not parsed again on the next run
+- the random forests train with n_jobs threads inside their worker
+- artifacts are written to a hidden directory that is renamed into
+  versions/<version>/ only when every model and the manifest are complete
+
+Workers receive plain paths and do not need Django to be set up.
+"""
+
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+
+from . import drift
+from .columnar import SCHEMA_FILE, is_columnar, open_dataset
+from .features import DISEASE_FEATURES, GENDER_ENCODING, NOSHOW_FEATURES, RISK_FEATURES, WEATHER_ENCODING
+from .forest import CompiledForest, compiled_name
+from .registry import file_checksum
+from . import versions
+from .versions import MANIFEST_FILE, new_version_id, version_path, versions_path
+
+# Bump when preprocessing changes so that cached feature matrices are rebuilt
+FEATURE_CACHE_VERSION = 1
+
+# Dataset names in DATASETS_PATH: <name>/ in the columnar format or <name>.csv
+DATASETS = {
+    'disease': 'disease_dataset',
+    'risk': 'risk_dataset',
+    'noshow': 'appointments_dataset',
+}
+
+FEATURES = {
+    'disease': DISEASE_FEATURES,
+    'risk': RISK_FEATURES,
+    'noshow': NOSHOW_FEATURES,
+}
+
+RANDOM_STATE = 42
+
+
+def encode(values, encoding, column):
+    unknown = set(values) - set(encoding)
+    if unknown:
+        raise ValueError(f'Unexpected {column} values in dataset: {sorted(unknown)}')
+    return np.array([encoding[value] for value in values], dtype=np.float64)
+
+
+def dataset_path(datasets_path, name):
+    """
+    Columnar directory of a model's dataset, unless the CSV is missing it
+    or is newer than it (edited since it was converted), else the CSV
+    """
+    base = os.path.join(str(datasets_path), DATASETS[name])
+    csv_path = f'{base}.csv'
+    if is_columnar(base) and (
+        not os.path.exists(csv_path)
+        or os.path.getmtime(csv_path) <= os.path.getmtime(os.path.join(base, SCHEMA_FILE))
+    ):
+        return base
+    return csv_path
+
+
+def dataset_checksum(path):
+    """SHA-256 of a CSV, or of a columnar schema (which lists its column checksums)"""
+    if is_columnar(path):
+        return file_checksum(os.path.join(path, SCHEMA_FILE))
+    return file_checksum(path)
+
+
+def preprocess_columnar(name, path):
+    """preprocess() for a columnar dataset; only the columns used are mapped"""
+    dataset = open_dataset(path)
+    if name == 'disease':
+        X = np.column_stack([
+            dataset.matrix(DISEASE_FEATURES[:-1]),
+            dataset.mapped('gender', GENDER_ENCODING),
+        ])
+        y = np.asarray(dataset.categories('diagnosis'), dtype=str)[dataset['diagnosis']]
+    elif name == 'risk':
+        X = dataset.matrix(RISK_FEATURES)
+        y = np.asarray(dataset['risk_score'], dtype=np.float64)
+    elif name == 'noshow':
+        X = np.column_stack([
+            dataset.matrix(NOSHOW_FEATURES[:-1]),
+            dataset.mapped('weather_condition', WEATHER_ENCODING),
+        ])
+        y = np.asarray(dataset['did_come'], dtype=np.int64)
+    else:
+        raise ValueError(f'Unknown model: {name}')
+    return X, y
+
+
+def preprocess(name, path):
+    """Feature matrix and target for one dataset, columns in serving order"""
+    import pandas as pd
+
+    if is_columnar(path):
+        return preprocess_columnar(name, path)
+
+    df = pd.read_csv(path)
+    if name == 'disease':
+        X = np.column_stack([
+            df[DISEASE_FEATURES[:-1]].to_numpy(dtype=np.float64),
+            encode(df['gender'], GENDER_ENCODING, 'gender'),
+        ])
+        y = df['diagnosis'].to_numpy(dtype=str)
+    elif name == 'risk':
+        X = df[RISK_FEATURES].to_numpy(dtype=np.float64)
+        y = df['risk_score'].to_numpy(dtype=np.float64)
+    elif name == 'noshow':
+        X = np.column_stack([
+            df[NOSHOW_FEATURES[:-1]].to_numpy(dtype=np.float64),
+            encode(df['weather_condition'], WEATHER_ENCODING, 'weather_condition'),
+        ])
+        y = df['did_come'].to_numpy(dtype=np.int64)
+    else:
+        raise ValueError(f'Unknown model: {name}')
+    return X, y
+
+
+def load_features(name, path, cache_dir=None):
+    """
+    (X, y, dataset checksum, cache hit) for a dataset, using the on-disk
+    feature cache when `cache_dir` is given
+    """
+    checksum = dataset_checksum(path)
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, f'{name}-v{FEATURE_CACHE_VERSION}-{checksum[:16]}.npz')
+        if os.path.exists(cache_file):
+            with np.load(cache_file, allow_pickle=False) as cached:
+                return cached['X'], cached['y'], checksum, True
+
+    X, y = preprocess(name, path)
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f'{cache_file}.tmp{os.getpid()}.npz'
+        np.savez(tmp_file, X=X, y=y)
+        os.replace(tmp_file, cache_file)
+    return X, y, checksum, False
+
+
+def fit_disease(X, y, n_jobs):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, f1_score
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=RANDOM_STATE, stratify=y
+    )
+    params = {'n_estimators': 100, 'max_depth': 10, 'class_weight': 'balanced', 'random_state': RANDOM_STATE}
+    model = RandomForestClassifier(n_jobs=n_jobs, **params).fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    metrics = {
+        'accuracy': float(accuracy_score(y_test, y_pred)),
+        'f1_macro': float(f1_score(y_test, y_pred, average='macro')),
+    }
+    encoder = LabelEncoder().fit(sorted(GENDER_ENCODING))
+    return {'disease_prediction_model.pkl': model, 'gender_encoder.pkl': encoder}, params, metrics
+
+
+def fit_risk(X, y, n_jobs):
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import mean_squared_error, r2_score
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=RANDOM_STATE
+    )
+    scaler = StandardScaler().fit(X_train)
+    params = {'n_estimators': 100, 'max_depth': 10, 'random_state': RANDOM_STATE}
+    model = RandomForestRegressor(n_jobs=n_jobs, **params).fit(scaler.transform(X_train), y_train)
+    y_pred = model.predict(scaler.transform(X_test))
+    metrics = {
+        'mse': float(mean_squared_error(y_test, y_pred)),
+        'r2': float(r2_score(y_test, y_pred)),
+    }
+    return {'risk_scoring_model.pkl': model, 'risk_scaler.pkl': scaler}, params, metrics
+
+
+def fit_noshow(X, y, n_jobs):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, roc_auc_score
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=RANDOM_STATE, stratify=y
+    )
+    params = {'class_weight': 'balanced', 'max_iter': 1000, 'random_state': RANDOM_STATE}
+    model = LogisticRegression(**params).fit(X_train, y_train)
+    metrics = {
+        'accuracy': float(accuracy_score(y_test, model.predict(X_test))),
+        'roc_auc': float(roc_auc_score(y_test, model.predict_proba(X_test)[:, 1])),
+        'noshow_rate': float(1 - y.mean()),
+    }
+    encoder = LabelEncoder().fit(sorted(WEATHER_ENCODING))
+    return {'noshow_prediction_model.pkl': model, 'weather_encoder.pkl': encoder}, params, metrics
+
+
+FITTERS = {
+    'disease': fit_disease,
+    'risk': fit_risk,
+    'noshow': fit_noshow,
+}
+
+# Models also exported in the compiled, memory-mappable format
+COMPILED = ['disease_prediction_model.pkl', 'risk_scoring_model.pkl']
+
+
+def train_model(name, dataset, output_dir, cache_dir=None, n_jobs=1):
+    """
+    Train one model and write its files to output_dir (runs in a worker).
+
+    Returns:
+        dict of manifest entries keyed by the file names written
+    """
+    started = time.perf_counter()
+    X, y, checksum, cache_hit = load_features(name, dataset, cache_dir)
+    prepared = time.perf_counter()
+    objects, params, metrics = FITTERS[name](X, y, n_jobs)
+    trained = time.perf_counter()
+
+    entries = {}
+    for file_name, obj in objects.items():
+        if hasattr(obj, 'n_jobs'):
+            # Served one request at a time; threads would only add overhead
+            obj.n_jobs = None
+        path = os.path.join(output_dir, file_name)
+        joblib.dump(obj, path)
+        entry = {
+            'model': name,
+            'sha256': file_checksum(path),
+            'bytes': os.path.getsize(path),
+        }
+        if file_name in COMPILED:
+            compiled = compiled_name(file_name)
+            CompiledForest.from_sklearn(obj).save(os.path.dirname(os.path.join(output_dir, compiled)))
+            entry['compiled'] = {'path': compiled, 'sha256': file_checksum(os.path.join(output_dir, compiled))}
+        if not file_name.endswith('_encoder.pkl'):
+            entry['features'] = FEATURES[name]
+        if file_name.endswith('_model.pkl'):
+            entry['params'] = params
+            entry['metrics'] = metrics
+        entries[file_name] = entry
+
+    # Training distribution of the inputs, for drift monitoring (ml_models.drift)
+    reference = drift.reference_name(name)
+    path = os.path.join(output_dir, reference)
+    drift.write_reference(path, dict(drift.build_reference(name, X, FEATURES[name]), dataset_sha256=checksum))
+    entries[reference] = {
+        'model': name,
+        'sha256': file_checksum(path),
+        'bytes': os.path.getsize(path),
+        'features': FEATURES[name],
+    }
+
+    for entry in entries.values():
+        entry['dataset'] = {
+            'file': os.path.basename(dataset),
+            'format': 'columnar' if is_columnar(dataset) else 'csv',
+            'sha256': checksum,
+            'rows': int(len(y)),
+            'feature_cache_hit': cache_hit,
+        }
+        entry['timing'] = {
+            'preprocess_seconds': round(prepared - started, 3),
+            'training_seconds': round(trained - prepared, 3),
+        }
+    return entries
+
+
+def train_all(models_path, datasets_path, cache_dir=None, processes=None, n_jobs=None,
+              names=None, activate=True, log=None):
+    """
+    Train every model in parallel and publish them as a new version.
+
+    Args:
+        models_path: ML_MODELS_PATH; the version goes to models_path/versions/
+        datasets_path: directory holding the training datasets
+        cache_dir: feature-matrix cache directory, or None to disable caching
+        processes: worker processes (default: one per model)
+        n_jobs: threads per random forest (default: CPUs shared between workers)
+        names: models to train (default: all); files of the other models are
+            carried over from the current version
+        activate: make the new version the one being served
+
+    Returns:
+        the manifest of the new version
+    """
+    log = log or (lambda message: None)
+    names = names or list(FITTERS)
+    base = versions.current_version(models_path)
+    if set(names) != set(FITTERS) and not base:
+        raise ValueError('Training a subset of the models needs an active version to carry the others over from')
+    processes = processes or len(names)
+    n_jobs = n_jobs or max(1, (os.cpu_count() or 1) // processes)
+
+    os.makedirs(versions_path(models_path), exist_ok=True)
+    version = new_version_id()
+    suffix = 1
+    while os.path.exists(version_path(version, models_path)):
+        suffix += 1
+        version = f'{new_version_id()}-{suffix}'
+    staging = os.path.join(versions_path(models_path), f'.{version}.tmp')
+    os.makedirs(staging)
+
+    started = time.perf_counter()
+    try:
+        entries = {}
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = {
+                name: pool.submit(
+                    train_model, name, dataset_path(datasets_path, name),
+                    staging, cache_dir, n_jobs,
+                )
+                for name in names
+            }
+            for name, future in futures.items():
+                entries.update(future.result())
+                log(f'Trained {name}')
+
+        if set(names) != set(FITTERS):
+            # Partial run: carry the other models over from the serving version
+            base_manifest = versions.read_manifest(base, models_path)
+            for file_name, entry in base_manifest['models'].items():
+                if entry['model'] not in names:
+                    _copy_artifact(version_path(base, models_path), staging, file_name, entry)
+                    entries[file_name] = dict(entry, carried_over_from=base)
+
+        manifest = {
+            'version': version,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'trained': names,
+            'feature_cache_version': FEATURE_CACHE_VERSION,
+            'processes': processes,
+            'n_jobs': n_jobs,
+            'training_seconds': round(time.perf_counter() - started, 3),
+            'models': entries,
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, version_path(version, models_path))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate:
+        versions.activate(version, models_path)
+        log(f'Activated {version}')
+    return manifest
+
+
+def _copy_artifact(source_dir, target_dir, file_name, entry):
+    shutil.copy2(os.path.join(source_dir, file_name), os.path.join(target_dir, file_name))
+    for form in ['compiled', 'compact']:
+        if form in entry:
+            compiled_dir = os.path.dirname(entry[form]['path'])
+            shutil.copytree(os.path.join(source_dir, compiled_dir), os.path.join(target_dir, compiled_dir))
@@ -0,0 +1,266 @@
+"""
+Hyperparameter search for the random forests
+
+Every combination of forest size, depth and leaf size in a grid is scored
+with k-fold cross-validation in a pool of worker processes. Each candidate
+is then measured for what it costs to serve: single-row and batch latency
+of its compiled form (what the registry serves, see ml_models.forest) and
+its size. Latency is measured in this process one candidate at a time,
+after the search, so workers competing for CPUs do not skew it.
+
+The feature matrix, the target and the fold assignment of every row are
+cached in one .npz file, keyed by the dataset checksum, the number of folds
+and the seed, so repeated searches skip preprocessing and splitting.
+
+The risk model is searched without its StandardScaler: trees split on the
+same orderings either way.
+"""
+
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .forest import CompiledForest
+from .training import FEATURE_CACHE_VERSION, RANDOM_STATE, dataset_path, load_features
+
+MODELS = ['disease', 'risk']
+
+# Metric that candidates are ranked by, per model (higher is better)
+SCORE_METRIC = {
+    'disease': 'accuracy',
+    'risk': 'r2',
+}
+
+DEFAULT_GRID = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [6, 10, 14, None],
+    'min_samples_leaf': [1, 5, 20],
+}
+
+# Per-process data, loaded once by the pool initializer
+_data = {}
+
+
+def fold_cache_path(cache_dir, name, checksum, folds, seed):
+    return os.path.join(
+        cache_dir, f'tune-{name}-v{FEATURE_CACHE_VERSION}-{checksum[:16]}-k{folds}-s{seed}.npz'
+    )
+
+
+def prepare(name, datasets_path, cache_dir, folds=5, seed=RANDOM_STATE):
+    """
+    Path of the .npz holding X, y and the fold of every row, building it
+    unless it is cached already
+
+    Returns:
+        (path, cache hit)
+    """
+    from sklearn.model_selection import KFold, StratifiedKFold
+
+    X, y, checksum, _ = load_features(name, dataset_path(datasets_path, name), cache_dir)
+    path = fold_cache_path(cache_dir, name, checksum, folds, seed)
+    if os.path.exists(path):
+        return path, True
+
+    splitter = StratifiedKFold if name == 'disease' else KFold
+    fold_of = np.empty(len(y), dtype=np.int8)
+    for fold, (_, test) in enumerate(splitter(n_splits=folds, shuffle=True, random_state=seed).split(X, y)):
+        fold_of[test] = fold
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f'{path}.tmp{os.getpid()}.npz'
+    np.savez(tmp_path, X=X, y=y, fold=fold_of)
+    os.replace(tmp_path, path)
+    return path, False
+
+
+def _init_worker(paths):
+    for name, path in paths.items():
+        with np.load(path, allow_pickle=False) as cached:
+            _data[name] = (cached['X'], cached['y'], cached['fold'])
+
+
+def _forest(name, params):
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+    if name == 'disease':
+        return RandomForestClassifier(class_weight='balanced', random_state=RANDOM_STATE, n_jobs=1, **params)
+    return RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=1, **params)
+
+
+def _metrics(name, y_true, y_pred):
+    from sklearn.metrics import accuracy_score, f1_score, mean_squared_error, r2_score
+
+    if name == 'disease':
+        return {
+            'accuracy': accuracy_score(y_true, y_pred),
+            'f1_macro': f1_score(y_true, y_pred, average='macro'),
+        }
+    return {
+        'r2': r2_score(y_true, y_pred),
+        'mse': mean_squared_error(y_true, y_pred),
+    }
+
+
+def evaluate(name, params):
+    """
+    Cross-validate one candidate (runs in a worker).
+
+    Returns:
+        (result dict, compiled forest of the first fold's model)
+    """
+    X, y, fold_of = _data[name]
+    started = time.perf_counter()
+    scores = []
+    compiled = pickle_bytes = None
+    for fold in range(int(fold_of.max()) + 1):
+        train, test = fold_of != fold, fold_of == fold
+        model = _forest(name, params).fit(X[train], y[train])
+        scores.append(_metrics(name, y[test], model.predict(X[test])))
+        if compiled is None:
+            # A fold's model sees the same share of rows as train_models' split
+            compiled = CompiledForest.from_sklearn(model)
+            pickle_bytes = len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+    metrics = {}
+    for metric in scores[0]:
+        values = [score[metric] for score in scores]
+        metrics[metric] = round(float(np.mean(values)), 6)
+        metrics[f'{metric}_std'] = round(float(np.std(values)), 6)
+    result = {
+        'params': params,
+        'metrics': metrics,
+        'score': metrics[SCORE_METRIC[name]],
+        'cv_seconds': round(time.perf_counter() - started, 3),
+        'pickle_bytes': pickle_bytes,
+        'compiled_bytes': int(sum(array.nbytes for array in compiled.arrays().values())),
+        'n_nodes': int(compiled.n_nodes),
+    }
+    return result, compiled
+
+
+def measure_latency(compiled, X, calls=200, batch_size=1000):
+    """Single-row latency percentiles (ms) and batch timing of a compiled forest"""
+    from .benchmark import percentiles, timed
+
+    predict = compiled.predict_proba if compiled.kind == 'classifier' else compiled.predict
+    rows = X[np.arange(calls) % len(X)]
+    predict(rows[:1])
+    single = percentiles([timed(predict, rows[i:i + 1]) for i in range(calls)])
+    batch = X[np.arange(batch_size) % len(X)]
+    batch_seconds = min(timed(predict, batch) for _ in range(3))
+    return {
+        'single_ms': single,
+        'batch_size': batch_size,
+        'batch_ms': round(batch_seconds * 1000, 4),
+        'rows_per_second': round(batch_size / batch_seconds, 1),
+    }
+
+
+def pareto_front(results):
+    """
+    Indexes of the candidates no other candidate beats on score, single-row
+    p50 latency and compiled size at once
+    """
+    points = [
+        (-result['score'], result['latency']['single_ms']['p50'], result['compiled_bytes'])
+        for result in results
+    ]
+    front = []
+    for i, point in enumerate(points):
+        dominated = any(
+            all(a <= b for a, b in zip(other, point)) and other != point
+            for j, other in enumerate(points) if j != i
+        )
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def recommend(results, min_score=None):
+    """Fastest, then smallest, Pareto candidate whose score meets `min_score`"""
+    eligible = [
+        result for result in results
+        if result['pareto'] and (min_score is None or result['score'] >= min_score)
+    ]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda result: (result['latency']['single_ms']['p50'], result['compiled_bytes']))
+
+
+def grid(space=None):
+    space = dict(DEFAULT_GRID, **(space or {}))
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+
+
+def tune(datasets_path, names=None, space=None, folds=5, seed=RANDOM_STATE, processes=None,
+         cache_dir=None, latency_calls=200, min_scores=None, log=None):
+    """
+    Search the grid for each model.
+
+    Args:
+        datasets_path: directory holding the training datasets
+        names: models to tune (default: disease and risk)
+        space: dict overriding DEFAULT_GRID entries
+        folds: cross-validation folds
+        processes: worker processes (default: one per CPU)
+        cache_dir: where matrices and folds are cached; None uses a
+            temporary directory that is removed afterwards
+        latency_calls: single-row predictions timed per candidate
+        min_scores: dict of model name -> floor of its score metric
+            (accuracy for disease, r2 for risk) for the recommendation
+
+    Returns:
+        dict keyed by model name with every candidate, the Pareto front
+        and the recommendation
+    """
+    log = log or (lambda message: None)
+    names = names or MODELS
+    min_scores = min_scores or {}
+    candidates = grid(space)
+    temporary = cache_dir is None
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix='tune-')
+    try:
+        paths = {}
+        for name in names:
+            paths[name], hit = prepare(name, datasets_path, cache_dir, folds, seed)
+            log(f"{name}: {'cached' if hit else 'prepared'} {folds} folds")
+
+        report = {}
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(paths,)) as pool:
+            futures = {
+                name: [pool.submit(evaluate, name, params) for params in candidates]
+                for name in names
+            }
+            for name in names:
+                results = []
+                for future in futures[name]:
+                    results.append(future.result())
+                log(f'{name}: cross-validated {len(results)} candidates')
+
+                with np.load(paths[name], allow_pickle=False) as cached:
+                    X = cached['X']
+                for result, compiled in results:
+                    result['latency'] = measure_latency(compiled, X, calls=latency_calls)
+                results = [result for result, _ in results]
+                front = set(pareto_front(results))
+                for index, result in enumerate(results):
+                    result['pareto'] = index in front
+                report[name] = {
+                    'metric': SCORE_METRIC[name],
+                    'folds': folds,
+                    'rows': int(len(X)),
+                    'candidates': results,
+                    'min_score': min_scores.get(name),
+                    'recommended': recommend(results, min_scores.get(name)),
+                }
+    finally:
+        if temporary:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    return report
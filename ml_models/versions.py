@@ -0,0 +1,109 @@
+"""
+Versioned model artifacts
+
+The training pipeline writes every run to its own directory,
+ML_MODELS_PATH/versions/<version>/, holding the model files and a
+manifest.json with feature order, metrics, training time and checksums.
+A CURRENT file next to the versions names the version being served;
+settings.ML_MODEL_VERSION pins one regardless of CURRENT. Switching
+version is a single atomic file replace, picked up by every worker the
+next time the model registry checks its files.
+
+Without a versions directory, models are served from ML_MODELS_PATH
+itself, as before versioning existed.
+
+Models updated by online learning (ml_models.online) are checkpointed to
+ML_MODELS_PATH/online/<version>/, next to but outside the immutable
+version they started from.
+"""
+
+import json
+import os
+import time
+
+from django.conf import settings
+
+VERSIONS_DIR = 'versions'
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+ONLINE_DIR = 'online'
+UNVERSIONED = '_unversioned'
+
+
+def models_root(base_path=None):
+    return str(base_path if base_path is not None else settings.ML_MODELS_PATH)
+
+
+def versions_path(base_path=None):
+    return os.path.join(models_root(base_path), VERSIONS_DIR)
+
+
+def version_path(version, base_path=None):
+    return os.path.join(versions_path(base_path), version)
+
+
+def new_version_id():
+    return time.strftime('%Y%m%d-%H%M%S')
+
+
+def list_versions(base_path=None):
+    """Names of the complete versions, oldest first"""
+    try:
+        names = os.listdir(versions_path(base_path))
+    except FileNotFoundError:
+        return []
+    return sorted(
+        name for name in names
+        if not name.startswith('.') and os.path.exists(os.path.join(version_path(name, base_path), MANIFEST_FILE))
+    )
+
+
+def read_manifest(version, base_path=None):
+    with open(os.path.join(version_path(version, base_path), MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def current_version(base_path=None):
+    """Version being served: the ML_MODEL_VERSION pin, else CURRENT, else None"""
+    pinned = getattr(settings, 'ML_MODEL_VERSION', '')
+    if pinned:
+        return pinned
+    try:
+        with open(os.path.join(models_root(base_path), CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def active_models_path(base_path=None):
+    """Directory the model registry should load files from"""
+    version = current_version(base_path)
+    if version:
+        return version_path(version, base_path)
+    return models_root(base_path)
+
+
+def online_models_path(base_path=None, version=None):
+    """Directory of the online-learning checkpoints based on `version` (default: current)"""
+    version = version or current_version(base_path) or UNVERSIONED
+    return os.path.join(models_root(base_path), ONLINE_DIR, version)
+
+
+def activate(version, base_path=None):
+    """Serve `version` from now on; returns the version that was current before"""
+    if version not in list_versions(base_path):
+        raise ValueError(f'Unknown model version: {version}')
+    previous = current_version(base_path)
+    path = os.path.join(models_root(base_path), CURRENT_FILE)
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, path)
+    return previous
+
+
+def previous_version(base_path=None):
+    """Newest version older than the current one, or None"""
+    current = current_version(base_path)
+    older = [version for version in list_versions(base_path) if current is None or version < current]
+    return older[-1] if older else None
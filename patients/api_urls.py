@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 from .api_views import PatientViewSet, MedicalHistoryViewSet
 
 router = DefaultRouter()
-router.register(r'', PatientViewSet, basename='patient')
+# Registered first so that 'medical-history/' is not matched as a patient pk
 router.register(r'medical-history', MedicalHistoryViewSet, basename='medical-history')
+router.register(r'', PatientViewSet, basename='patient')
 
 urlpatterns = router.urls
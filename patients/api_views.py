@@ -1,12 +1,43 @@
+import math
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from .models import Patient, MedicalHistory
 from .serializers import PatientSerializer, MedicalHistorySerializer
-import joblib
-import os
+from ml_models.features import SYMPTOMS, parse_blood_pressure
+from ml_models.predict import DiseasePrediction, RiskScoring
 from django.conf import settings
 
+def vital(data, field, default):
+    """A vital sign from request data as a float; NaN and infinity are rejected"""
+    value = float(data.get(field, default))
+    if not math.isfinite(value):
+        raise ValueError(f'{field} must be a finite number')
+    return value
+
+def disease_input(data, age, gender):
+    """Build DiseasePrediction input from request data and patient demographics"""
+    systolic, diastolic = parse_blood_pressure(data.get('blood_pressure'))
+    patient_data = {
+        'age': age,
+        'gender': gender,
+        'blood_pressure_systolic': vital(data, 'blood_pressure_systolic', systolic),
+        'blood_pressure_diastolic': vital(data, 'blood_pressure_diastolic', diastolic),
+        'glucose_level': vital(data, 'glucose_level', 100),
+    }
+    for symptom in SYMPTOMS:
+        patient_data[symptom] = int(data.get(symptom, 0))
+    return patient_data
+
+def explain_requested(request):
+    """True when the request asks for feature contributions (?explain=true or "explain": true)"""
+    value = request.query_params.get('explain')
+    if value is None and isinstance(request.data, dict):
+        value = request.data.get('explain')
+    return str(value).lower() in ('true', '1', 'yes')
+
 class PatientViewSet(viewsets.ModelViewSet):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
@@ -16,56 +47,134 @@ class PatientViewSet(viewsets.ModelViewSet):
         patient = self.get_object()
         
         try:
-            model_path = os.path.join(settings.ML_MODELS_PATH, 'disease_prediction_model.pkl')
-            model = joblib.load(model_path)
-            
-            # Extract features from request
-            features = [[
-                patient.age,
-                1 if patient.gender == 'M' else 0,
-                float(request.data.get('blood_pressure', 120)),
-                float(request.data.get('glucose_level', 100)),
-                float(request.data.get('temperature', 37)),
-            ]]
-            
-            prediction = model.predict(features)
-            probability = model.predict_proba(features)
+            patient_data = disease_input(request.data, patient.age, patient.gender)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            result = DiseasePrediction().predict(patient_data, explain=explain_requested(request))
             
-            return Response({
+            response = {
                 'patient_id': patient.patient_id,
-                'predicted_disease': prediction[0],
-                'confidence': float(max(probability[0])),
-            })
+                'predicted_disease': result['disease'],
+                'confidence': result['confidence'],
+            }
+            if 'explanation' in result:
+                response['explanation'] = result['explanation']
+            return Response(response)
         except Exception as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=False, methods=['post'])
+    def predict_disease_batch(self, request):
+        """
+        Score many symptom/vital records in one request.
+        
+        Each record identifies the patient either with `patient` (primary key)
+        or with explicit `age` and `gender`, plus the same fields accepted by
+        predict_disease. Results are returned in input order. With
+        explain=true, at most ML_EXPLAIN_MAX_ROWS records are accepted.
+        """
+        records = request.data.get('records') if isinstance(request.data, dict) else request.data
+        if not isinstance(records, list) or not records:
+            return Response(
+                {'error': 'records must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        explain = explain_requested(request)
+        max_rows = settings.ML_EXPLAIN_MAX_ROWS if explain else settings.ML_BATCH_MAX_ROWS
+        if len(records) > max_rows:
+            return Response(
+                {'error': f'At most {max_rows} records can be scored per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Patient primary keys by record, None for records with age and gender
+        patient_keys = []
+        for index, record in enumerate(records):
+            try:
+                patient_keys.append(int(record['patient']) if 'patient' in record else None)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                return Response(
+                    {'error': f'Invalid record {index}: {e!r}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        patients = Patient.objects.only('id', 'patient_id', 'date_of_birth', 'gender').in_bulk(
+            {key for key in patient_keys if key is not None}
+        )
+        for index, key in enumerate(patient_keys):
+            if key is not None and key not in patients:
+                return Response(
+                    {'error': f'Invalid record {index}: patient {key} not found'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        inputs = []
+        for index, (record, key) in enumerate(zip(records, patient_keys)):
+            try:
+                if key is not None:
+                    patient = patients[key]
+                    age, gender = patient.age, patient.gender
+                else:
+                    age, gender = int(record['age']), record['gender']
+                inputs.append(disease_input(record, age, gender))
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                return Response(
+                    {'error': f'Invalid record {index}: {e!r}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        try:
+            results = DiseasePrediction().predict_batch(inputs, explain=explain)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        predictions = []
+        for key, result in zip(patient_keys, results):
+            patient = patients.get(key)
+            prediction = {
+                'patient_id': patient.patient_id if patient else None,
+                'predicted_disease': result['disease'],
+                'confidence': result['confidence'],
+            }
+            if explain:
+                prediction['explanation'] = result['explanation']
+            predictions.append(prediction)
+        return Response({'count': len(predictions), 'predictions': predictions})
+    
     @action(detail=True, methods=['post'])
     def calculate_risk(self, request, pk=None):
         patient = self.get_object()
         
         try:
-            model_path = os.path.join(settings.ML_MODELS_PATH, 'risk_scoring_model.pkl')
-            model = joblib.load(model_path)
-            
-            features = [[
-                patient.age,
-                int(request.data.get('pregnancy', 0)),
-                float(request.data.get('glucose', 100)),
-                float(request.data.get('blood_pressure', 120)),
-                float(request.data.get('heart_rate', 75)),
-                float(request.data.get('weight', 70)),
-            ]]
+            systolic, diastolic = parse_blood_pressure(request.data.get('blood_pressure'))
+            patient_data = {
+                'age': patient.age,
+                'pregnancy': int(request.data.get('pregnancy', 0)),
+                'glucose': float(request.data.get('glucose', 100)),
+                'blood_pressure_systolic': systolic,
+                'blood_pressure_diastolic': diastolic,
+                'heart_rate': float(request.data.get('heart_rate', 75)),
+                'weight': float(request.data.get('weight', 70)),
+                'bmi': float(request.data.get('bmi', 25)),
+            }
             
-            risk_score = model.predict(features)[0]
+            result = RiskScoring().calculate_risk(patient_data, explain=explain_requested(request))
             
-            return Response({
+            response = {
                 'patient_id': patient.patient_id,
-                'risk_score': float(risk_score),
-                'risk_level': 'High' if risk_score > 0.7 else 'Medium' if risk_score > 0.4 else 'Low',
-            })
+                'risk_score': result['risk_score'],
+                'risk_level': result['risk_level'],
+            }
+            if 'explanation' in result:
+                response['explanation'] = result['explanation']
+            return Response(response)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -81,4 +190,12 @@ class MedicalHistoryViewSet(viewsets.ModelViewSet):
         patient_id = self.request.query_params.get('patient_id')
         if patient_id:
             queryset = queryset.filter(patient_id=patient_id)
+        min_risk_score = self.request.query_params.get('min_risk_score')
+        if min_risk_score:
+            try:
+                min_risk_score = float(min_risk_score)
+            except ValueError:
+                raise ValidationError({'min_risk_score': 'Must be a number'})
+            # risk_score is indexed and kept current by drain_risk_queue
+            queryset = queryset.filter(risk_score__gte=min_risk_score).order_by('-risk_score')
         return queryset
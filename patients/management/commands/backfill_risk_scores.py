@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from patients.services import backfill_risk_scores
+import time
+
+class Command(BaseCommand):
+    help = 'Compute risk_score for historical medical histories with vitals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Histories scored per chunk (default: 1000)')
+        parser.add_argument('--rescore', action='store_true',
+                            help='Also recompute histories that already have a risk score')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = backfill_risk_scores(
+            chunk_size=options['chunk_size'],
+            rescore=options['rescore'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Scored {count} medical histories in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from patients.services import drain_risk_queue
+import time
+
+class Command(BaseCommand):
+    help = 'Re-score risk for patients queued by new or updated medical histories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Patients re-scored per batch (default: 500)')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when the queue is empty (default: 5)')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit instead of running as a worker')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.perf_counter()
+                patients, histories = drain_risk_queue(batch_size=options['batch_size'])
+                if patients:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(self.style.SUCCESS(
+                        f'✓ Re-scored {histories} medical histories for {patients} patients in {elapsed:.2f}s'
+                    ))
+                    continue
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskScoreQueue',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='risk_queue_entry', serialize=False, to='patients.patient')),
+                ('queued_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'risk_score_queue',
+                'ordering': ['queued_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='medicalhistory',
+            name='risk_score',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, max_digits=3, null=True),
+        ),
+    ]
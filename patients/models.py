@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from core.models import User, Woreda
 
 class Patient(models.Model):
@@ -82,17 +83,46 @@ class MedicalHistory(models.Model):
     
     # ML Predictions
     predicted_disease = models.CharField(max_length=100, blank=True)
-    risk_score = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
+    risk_score = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True, db_index=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     
+    VITAL_FIELDS = ['blood_pressure', 'heart_rate', 'weight', 'height', 'glucose_level']
+    
     class Meta:
         db_table = 'medical_histories'
         ordering = ['-visit_date']
         verbose_name_plural = 'Medical Histories'
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # risk_score is filled in by the risk queue worker (drain_risk_queue)
+        if self.has_vitals:
+            RiskScoreQueue.mark(self.patient_id)
+    
     def __str__(self):
         return f"{self.patient.full_name} - {self.diagnosis} - {self.visit_date.date()}"
+    
+    @property
+    def has_vitals(self):
+        return any(getattr(self, field) not in (None, '') for field in self.VITAL_FIELDS)
+
+
+class RiskScoreQueue(models.Model):
+    """Patients whose medical histories need their risk_score recomputed"""
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='risk_queue_entry')
+    queued_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        db_table = 'risk_score_queue'
+        ordering = ['queued_at']
+    
+    def __str__(self):
+        return f"{self.patient_id} queued at {self.queued_at}"
+    
+    @classmethod
+    def mark(cls, patient_id):
+        cls.objects.update_or_create(patient_id=patient_id, defaults={'queued_at': timezone.now()})
 
 
 class Allergy(models.Model):
@@ -0,0 +1,107 @@
+"""
+Incremental ML risk scoring for medical histories
+
+Saving a MedicalHistory with vitals queues its patient in RiskScoreQueue.
+drain_risk_queue() re-scores the queued patients' histories in batches and
+writes risk_score back, so high-risk lists are a query on an indexed column
+instead of a model call per request.
+"""
+
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from ml_models.features import risk_matrix
+from ml_models.predict import RiskScoring
+from .models import MedicalHistory, RiskScoreQueue
+
+
+def with_vitals(histories):
+    """Restrict a MedicalHistory queryset to rows with at least one vital sign"""
+    condition = ~Q(blood_pressure='')
+    for field in MedicalHistory.VITAL_FIELDS:
+        if field != 'blood_pressure':
+            condition |= Q(**{f'{field}__isnull': False})
+    return histories.filter(condition)
+
+
+def score_histories(histories, chunk_size=1000):
+    """
+    Compute and store risk_score for every row of a MedicalHistory queryset.
+
+    The whole feature matrix is scored with one model call; results are
+    written with bulk_update in chunks of `chunk_size` rows.
+
+    Returns:
+        number of histories scored
+    """
+    ids, matrix = risk_matrix(histories)
+    if not ids:
+        return 0
+
+    scores = np.clip(np.round(RiskScoring().score_matrix(matrix), 2), 0, 1)
+    updates = [
+        MedicalHistory(id=history_id, risk_score=Decimal(f'{score:.2f}'))
+        for history_id, score in zip(ids, scores.tolist())
+    ]
+    for offset in range(0, len(updates), chunk_size):
+        with transaction.atomic():
+            MedicalHistory.objects.bulk_update(updates[offset:offset + chunk_size], ['risk_score'])
+    return len(updates)
+
+
+def drain_risk_queue(batch_size=500):
+    """
+    Re-score the histories of up to `batch_size` queued patients.
+
+    A queue entry is removed only if it still has the queued_at it was read
+    with: the histories saved before that mark were committed before the
+    entry was read, so they are in the scored set, while a history saved
+    (or committed) later marks the entry again and keeps it for the next
+    call.
+
+    Returns:
+        (patients drained, histories scored)
+    """
+    entries = list(
+        RiskScoreQueue.objects.order_by('queued_at').values_list('patient_id', 'queued_at')[:batch_size]
+    )
+    if not entries:
+        return 0, 0
+
+    patient_ids = [patient_id for patient_id, _ in entries]
+    scored = score_histories(with_vitals(MedicalHistory.objects.filter(patient_id__in=patient_ids)))
+    for start in range(0, len(entries), 100):
+        unchanged = Q()
+        for patient_id, queued_at in entries[start:start + 100]:
+            unchanged |= Q(patient_id=patient_id, queued_at=queued_at)
+        RiskScoreQueue.objects.filter(unchanged).delete()
+    return len(entries), scored
+
+
+def backfill_risk_scores(chunk_size=1000, rescore=False):
+    """
+    Score historical medical histories in chunks of `chunk_size` rows.
+
+    Only rows without a risk_score are scored unless `rescore` is set.
+    Chunks are walked in primary-key order, so an interrupted backfill can
+    simply be run again.
+
+    Returns:
+        number of histories scored
+    """
+    histories = with_vitals(MedicalHistory.objects.all())
+    if not rescore:
+        histories = histories.filter(risk_score__isnull=True)
+    histories = histories.order_by('id')
+
+    total = 0
+    last_id = 0
+    while True:
+        chunk_ids = list(histories.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_size])
+        if not chunk_ids:
+            return total
+        total += score_histories(MedicalHistory.objects.filter(id__in=chunk_ids), chunk_size)
+        last_id = chunk_ids[-1]
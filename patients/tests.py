@@ -0,0 +1,84 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from core.models import User
+
+from . import services
+from .models import MedicalHistory, Patient, RiskScoreQueue
+
+
+def add_patient(first_name='Abebe'):
+    return Patient.objects.create(
+        first_name=first_name, last_name='Kebede', date_of_birth=date(1980, 1, 1), gender='M',
+        phone='0911000000', address='Addis Ababa', emergency_contact_name='Almaz',
+        emergency_contact_phone='0911000001',
+    )
+
+
+def add_history(patient):
+    return MedicalHistory.objects.create(
+        patient=patient, diagnosis='Checkup', symptoms='fever', treatment='Rest',
+        blood_pressure='120/80', heart_rate=70,
+    )
+
+
+class DrainRiskQueueTest(TestCase):
+    def setUp(self):
+        self.patient = add_patient()
+        self.other = add_patient('Kebede')
+        add_history(self.patient)
+        add_history(self.other)
+
+    def test_drained_entries_are_removed(self):
+        with mock.patch.object(services, 'score_histories', return_value=2) as score_histories:
+            self.assertEqual(services.drain_risk_queue(), (2, 2))
+        self.assertEqual(score_histories.call_args.args[0].count(), 2)
+        self.assertFalse(RiskScoreQueue.objects.exists())
+
+    def test_history_saved_while_scoring_stays_queued(self):
+        """A history committed after the scoring query keeps its patient queued"""
+        queued_at = RiskScoreQueue.objects.get(patient=self.patient).queued_at
+
+        def score_histories(histories):
+            count = histories.count()
+            # Marked before the drain started, but committed only now
+            with mock.patch('django.utils.timezone.now', return_value=queued_at + timedelta(microseconds=1)):
+                add_history(self.patient)
+            return count
+
+        with mock.patch.object(services, 'score_histories', score_histories):
+            self.assertEqual(services.drain_risk_queue(), (2, 2))
+        self.assertEqual(list(RiskScoreQueue.objects.values_list('patient_id', flat=True)), [self.patient.pk])
+
+
+class PredictDiseaseApiTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='doctor', role='doctor'))
+        self.patient = add_patient()
+
+    def test_non_finite_vitals_are_rejected(self):
+        for value in ['nan', 'inf', '-Infinity']:
+            response = self.client.post(
+                f'/api/patients/{self.patient.pk}/predict_disease/', {'glucose_level': value}, format='json'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('glucose_level', response.json()['error'])
+
+            response = self.client.post(
+                '/api/patients/predict_disease_batch/',
+                {'records': [{'patient': self.patient.pk, 'glucose_level': value}]}, format='json',
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('glucose_level', response.json()['error'])
+
+    def test_unknown_patient_in_batch(self):
+        response = self.client.post(
+            '/api/patients/predict_disease_batch/',
+            {'records': [{'patient': self.patient.pk}, {'patient': self.patient.pk + 100}]}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], f'Invalid record 1: patient {self.patient.pk + 100} not found')
@@ -4,9 +4,8 @@ from django.contrib import messages
 from django.db.models import Q
 from .models import Patient, MedicalHistory, Allergy
 from .forms import PatientForm, MedicalHistoryForm
-import joblib
-import os
-from django.conf import settings
+from ml_models.features import disease_matrix_from_values
+from ml_models.predict import DiseasePrediction
 
 @login_required
 def patient_list(request):
@@ -83,19 +82,11 @@ def add_medical_history(request, patient_id):
             
             # ML Disease Prediction
             try:
-                model_path = os.path.join(settings.ML_MODELS_PATH, 'disease_prediction_model.pkl')
-                if os.path.exists(model_path):
-                    model = joblib.load(model_path)
-                    # Prepare features for prediction
-                    features = [[
-                        patient.age,
-                        1 if patient.gender == 'M' else 0,
-                        float(history.blood_pressure.split('/')[0]) if history.blood_pressure else 120,
-                        float(history.glucose_level) if history.glucose_level else 100,
-                        float(history.temperature) if history.temperature else 37,
-                    ]]
-                    prediction = model.predict(features)
-                    history.predicted_disease = prediction[0]
+                features = disease_matrix_from_values([(
+                    patient.date_of_birth, patient.gender, history.symptoms,
+                    history.blood_pressure, history.glucose_level,
+                )])
+                history.predicted_disease = DiseasePrediction().predict_matrix(features)[0]['disease']
             except Exception as e:
                 print(f"ML Prediction Error: {e}")
             
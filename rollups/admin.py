@@ -0,0 +1,6 @@
+from django.contrib import admin
+from .models import RollupWatermark
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ['rollup', 'watermark', 'refreshed_at', 'days_refreshed']
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import api_views
+
+urlpatterns = [
+    path('appointments/', api_views.appointment_rollup, name='appointment_rollup'),
+    path('lab-tests/', api_views.lab_test_rollup, name='lab_test_rollup'),
+    path('prescriptions/', api_views.prescription_rollup, name='prescription_rollup'),
+    path('revenue/', api_views.revenue_rollup, name='revenue_rollup'),
+]
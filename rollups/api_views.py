@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from .models import AppointmentDaily, LabTestDaily, PrescriptionDaily, RevenueDaily, RollupWatermark
+
+# Days covered when the request names no start
+DEFAULT_RANGE_DAYS = 30
+
+def date_range(request):
+    """(start, end) from ?start=YYYY-MM-DD&end=YYYY-MM-DD, both inclusive"""
+    try:
+        end = date.fromisoformat(request.query_params['end']) if 'end' in request.query_params else timezone.localdate()
+        start = (
+            date.fromisoformat(request.query_params['start']) if 'start' in request.query_params
+            else end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+        )
+    except ValueError:
+        raise ValidationError({'error': 'start and end must be dates (YYYY-MM-DD)'})
+    if start > end:
+        raise ValidationError({'error': 'start must not be after end'})
+    return start, end
+
+def group_by(request, choices):
+    value = request.query_params.get('group_by', choices[0])
+    if value not in choices:
+        raise ValidationError({'error': f"group_by must be one of: {', '.join(choices)}"})
+    return value
+
+def rollup_rows(model, request, groups, fields):
+    """Rollup rows in the requested range, summed per requested group"""
+    start, end = date_range(request)
+    group = group_by(request, list(groups))
+    rows = (
+        model.objects.filter(day__gte=start, day__lte=end)
+        .values(*groups[group])
+        .annotate(**{field: Sum(field) for field in fields})
+        .order_by(*groups[group])
+    )
+    return start, end, group, list(rows)
+
+def respond(name, start, end, group, rows):
+    watermark = RollupWatermark.objects.filter(rollup=name).values_list('watermark', flat=True).first()
+    return Response({
+        'start': start,
+        'end': end,
+        'group_by': group,
+        'as_of': watermark,
+        'rows': rows,
+    })
+
+@api_view(['GET'])
+def appointment_rollup(request):
+    """Appointments and no-show rate per day, doctor or patient woreda"""
+    start, end, group, rows = rollup_rows(AppointmentDaily, request, {
+        'day': ['day'],
+        'doctor': ['doctor_id', 'doctor__user__first_name', 'doctor__user__last_name'],
+        'woreda': ['woreda_id', 'woreda__name'],
+    }, ['total', 'scheduled', 'completed', 'cancelled', 'no_show'])
+    for row in rows:
+        finished = row['completed'] + row['no_show']
+        row['no_show_rate'] = round(row['no_show'] / finished, 4) if finished else None
+    return respond('appointments', start, end, group, rows)
+
+@api_view(['GET'])
+def lab_test_rollup(request):
+    """Lab tests and average turnaround per requested day or test type"""
+    start, end, group, rows = rollup_rows(LabTestDaily, request, {
+        'day': ['day'],
+        'test_type': ['test_type'],
+    }, ['requested', 'completed', 'cancelled', 'turnaround_seconds', 'turnaround_count'])
+    for row in rows:
+        seconds, count = row.pop('turnaround_seconds'), row.pop('turnaround_count')
+        row['avg_turnaround_hours'] = round(seconds / count / 3600, 2) if count else None
+    return respond('lab_tests', start, end, group, rows)
+
+@api_view(['GET'])
+def prescription_rollup(request):
+    """Prescriptions written per day"""
+    start, end, group, rows = rollup_rows(PrescriptionDaily, request, {
+        'day': ['day'],
+    }, ['total', 'dispensed', 'cancelled', 'item_lines', 'item_quantity'])
+    return respond('prescriptions', start, end, group, rows)
+
+@api_view(['GET'])
+def revenue_rollup(request):
+    """Payments received per day or payment method"""
+    start, end, group, rows = rollup_rows(RevenueDaily, request, {
+        'day': ['day'],
+        'payment_method': ['payment_method'],
+    }, ['payments', 'amount'])
+    return respond('revenue', start, end, group, rows)
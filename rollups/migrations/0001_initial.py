@@ -0,0 +1,97 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('doctors', '0001_initial'),
+        ('core', '0002_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrescriptionDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('total', models.IntegerField(default=0)),
+                ('dispensed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('item_lines', models.IntegerField(default=0)),
+                ('item_quantity', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'rollup_prescriptions_daily',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('rollup', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('watermark', models.DateTimeField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('days_refreshed', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'rollup_watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='RevenueDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_method', models.CharField(max_length=20)),
+                ('payments', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'db_table': 'rollup_revenue_daily',
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['day', 'payment_method'], name='rollup_reve_day_aabb16_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LabTestDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('test_type', models.CharField(max_length=100)),
+                ('requested', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('turnaround_seconds', models.FloatField(default=0)),
+                ('turnaround_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'rollup_lab_tests_daily',
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['day', 'test_type'], name='rollup_lab__day_eac054_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AppointmentDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+                ('scheduled', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('no_show', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='doctors.doctor')),
+                ('woreda', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.woreda')),
+            ],
+            options={
+                'db_table': 'rollup_appointments_daily',
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['day', 'doctor'], name='rollup_appo_day_aa83b7_idx')],
+            },
+        ),
+    ]
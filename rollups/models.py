@@ -0,0 +1,76 @@
+from django.db import models
+from core.models import Woreda
+from doctors.models import Doctor
+
+class AppointmentDaily(models.Model):
+    """Appointments per day, doctor and patient woreda, by status"""
+    day = models.DateField()
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='+')
+    woreda = models.ForeignKey(Woreda, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    total = models.IntegerField(default=0)
+    scheduled = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    no_show = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'rollup_appointments_daily'
+        ordering = ['day']
+        indexes = [models.Index(fields=['day', 'doctor'])]
+
+
+class LabTestDaily(models.Model):
+    """Lab tests per requested day and test type, with turnaround of the completed ones"""
+    day = models.DateField()
+    test_type = models.CharField(max_length=100)
+    requested = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    turnaround_seconds = models.FloatField(default=0)
+    turnaround_count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'rollup_lab_tests_daily'
+        ordering = ['day']
+        indexes = [models.Index(fields=['day', 'test_type'])]
+
+
+class PrescriptionDaily(models.Model):
+    """Prescriptions written per day, by status, with their items"""
+    day = models.DateField(unique=True)
+    total = models.IntegerField(default=0)
+    dispensed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    item_lines = models.IntegerField(default=0)
+    item_quantity = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'rollup_prescriptions_daily'
+        ordering = ['day']
+
+
+class RevenueDaily(models.Model):
+    """Payments received per day and payment method"""
+    day = models.DateField()
+    payment_method = models.CharField(max_length=20)
+    payments = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        db_table = 'rollup_revenue_daily'
+        ordering = ['day']
+        indexes = [models.Index(fields=['day', 'payment_method'])]
+
+
+class RollupWatermark(models.Model):
+    """Source rows changed up to this time are reflected in a rollup"""
+    rollup = models.CharField(max_length=50, primary_key=True)
+    watermark = models.DateTimeField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+    days_refreshed = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'rollup_watermarks'
+    
+    def __str__(self):
+        return f"{self.rollup} @ {self.watermark}"
@@ -0,0 +1,212 @@
+"""
+Incremental refresh of the daily rollup tables
+
+Each rollup keeps a watermark: the time its last refresh started. A refresh
+finds the days touched by source rows changed since the watermark (by
+updated_at, or created_at/dispensed_at where a table has no updated_at),
+recomputes those days from the source tables with one grouped query per
+chunk of days and replaces their rollup rows in a transaction.
+
+The watermark is read back with an overlap, so rows committed by
+transactions that were still open when the previous refresh started are
+not missed. Changes that leave no timestamp behind (deleted rows, an
+appointment moved to another date, queryset.update() without updated_at)
+are picked up by recomputing a trailing window of days (`recent_days`) or
+everything (`full`).
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from appointments.models import Appointment
+from billing.models import Payment
+from laboratory.models import LabTest
+from pharmacy.models import Prescription
+
+from .models import AppointmentDaily, LabTestDaily, PrescriptionDaily, RevenueDaily, RollupWatermark
+
+# Re-read this much before the watermark to catch late-committing transactions
+OVERLAP = timedelta(minutes=5)
+# Days recomputed per grouped query and transaction
+CHUNK_DAYS = 100
+
+
+def local_day(field):
+    return TruncDate(field, tzinfo=timezone.get_current_timezone())
+
+
+def day_bounds(days):
+    """Aware datetimes from the start of the first day to the end of the last"""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(min(days), time.min), tz)
+    end = timezone.make_aware(datetime.combine(max(days) + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+# Appointments: keyed by appointment date
+
+def appointment_days(since):
+    rows = Appointment.objects.all()
+    if since is not None:
+        rows = rows.filter(updated_at__gt=since)
+    return rows.values_list('appointment_date', flat=True).distinct()
+
+
+def appointment_rows(days):
+    return [
+        AppointmentDaily(**row) for row in
+        Appointment.objects.filter(appointment_date__in=days)
+        .values('doctor_id', day=F('appointment_date'), woreda_id=F('patient__woreda_id'))
+        .annotate(
+            total=Count('id'),
+            scheduled=Count('id', filter=Q(status__in=['scheduled', 'confirmed'])),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            no_show=Count('id', filter=Q(status='no_show')),
+        )
+        .order_by()
+    ]
+
+
+# Lab tests: keyed by the local day they were requested
+
+def lab_test_days(since):
+    rows = LabTest.objects.all()
+    if since is not None:
+        rows = rows.filter(updated_at__gt=since)
+    return rows.annotate(day=local_day('requested_date')).values_list('day', flat=True).distinct()
+
+
+def lab_test_rows(days):
+    start, end = day_bounds(days)
+    completed = Q(status='completed', completed_date__isnull=False)
+    rows = (
+        LabTest.objects.filter(requested_date__gte=start, requested_date__lt=end)
+        .annotate(day=local_day('requested_date'))
+        .filter(day__in=days)
+        .values('day', 'test_type')
+        .annotate(
+            requested=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            turnaround_count=Count('id', filter=completed),
+            turnaround=Sum(
+                ExpressionWrapper(F('completed_date') - F('requested_date'), output_field=DurationField()),
+                filter=completed,
+            ),
+        )
+        .order_by()
+    )
+    objects = []
+    for row in rows:
+        turnaround = row.pop('turnaround')
+        row['turnaround_seconds'] = turnaround.total_seconds() if turnaround else 0.0
+        objects.append(LabTestDaily(**row))
+    return objects
+
+
+# Prescriptions: keyed by the local day they were written
+
+def prescription_days(since):
+    rows = Prescription.objects.all()
+    if since is not None:
+        rows = rows.filter(Q(created_at__gt=since) | Q(dispensed_at__gt=since))
+    return rows.annotate(day=local_day('created_at')).values_list('day', flat=True).distinct()
+
+
+def prescription_rows(days):
+    start, end = day_bounds(days)
+    return [
+        PrescriptionDaily(**row) for row in
+        Prescription.objects.filter(created_at__gte=start, created_at__lt=end)
+        .annotate(day=local_day('created_at'))
+        .filter(day__in=days)
+        .values('day')
+        .annotate(
+            total=Count('id', distinct=True),
+            dispensed=Count('id', filter=Q(status='dispensed'), distinct=True),
+            cancelled=Count('id', filter=Q(status='cancelled'), distinct=True),
+            item_lines=Count('items'),
+            item_quantity=Sum('items__quantity', default=0),
+        )
+        .order_by()
+    ]
+
+
+# Revenue: payments keyed by the local day they were received
+
+def revenue_days(since):
+    rows = Payment.objects.all()
+    if since is not None:
+        rows = rows.filter(created_at__gt=since)
+    return rows.annotate(day=local_day('created_at')).values_list('day', flat=True).distinct()
+
+
+def revenue_rows(days):
+    start, end = day_bounds(days)
+    return [
+        RevenueDaily(**row) for row in
+        Payment.objects.filter(created_at__gte=start, created_at__lt=end)
+        .annotate(day=local_day('created_at'))
+        .filter(day__in=days)
+        .values('day', 'payment_method')
+        .annotate(payments=Count('id'), amount=Sum('amount'))
+        .order_by()
+    ]
+
+
+# Rollup name -> (rollup model, days touched since a time, rows of some days)
+ROLLUPS = {
+    'appointments': (AppointmentDaily, appointment_days, appointment_rows),
+    'lab_tests': (LabTestDaily, lab_test_days, lab_test_rows),
+    'prescriptions': (PrescriptionDaily, prescription_days, prescription_rows),
+    'revenue': (RevenueDaily, revenue_days, revenue_rows),
+}
+
+
+def refresh(name, full=False, recent_days=0, today=None):
+    """
+    Bring one rollup up to date.
+
+    Args:
+        name: key of ROLLUPS
+        full: recompute every day present in the source table
+        recent_days: also recompute the last N days (up to today),
+            touched or not
+
+    Returns:
+        number of days recomputed
+    """
+    model, touched_days, rows = ROLLUPS[name]
+    started = timezone.now()
+    watermark = RollupWatermark.objects.filter(rollup=name).first()
+    since = None if full or watermark is None else watermark.watermark - OVERLAP
+
+    days = {day for day in touched_days(since) if day is not None}
+    if full:
+        # Days whose source rows are all gone
+        days.update(model.objects.values_list('day', flat=True).distinct())
+    today = today or timezone.localdate()
+    days.update(today - timedelta(days=offset) for offset in range(recent_days))
+
+    days = sorted(days)
+    for offset in range(0, len(days), CHUNK_DAYS):
+        chunk = days[offset:offset + CHUNK_DAYS]
+        with transaction.atomic():
+            objects = rows(chunk)
+            model.objects.filter(day__in=chunk).delete()
+            model.objects.bulk_create(objects)
+
+    RollupWatermark.objects.update_or_create(
+        rollup=name, defaults={'watermark': started, 'days_refreshed': len(days)}
+    )
+    return len(days)
+
+
+def refresh_all(names=None, full=False, recent_days=0):
+    """refresh() every rollup; returns {name: days recomputed}"""
+    return {name: refresh(name, full, recent_days) for name in names or ROLLUPS}
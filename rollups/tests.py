@@ -0,0 +1,60 @@
+from datetime import date, time, timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from appointments.models import Appointment
+from appointments.tests import add_doctor, add_patient
+
+from . import services
+from .models import AppointmentDaily, RollupWatermark
+
+
+class AppointmentRollupTest(TestCase):
+    def setUp(self):
+        self.doctor = add_doctor('doctor', time(8, 0))
+        patient = add_patient()
+        self.appointments = [
+            Appointment.objects.create(
+                patient=patient, doctor=self.doctor, appointment_date=day,
+                appointment_time=time(hour, 0), reason='Checkup', status=status,
+            )
+            for day, hour, status in [
+                (date(2024, 1, 22), 9, 'scheduled'),
+                (date(2024, 1, 22), 10, 'completed'),
+                (date(2024, 1, 23), 9, 'confirmed'),
+            ]
+        ]
+        # Last changed well before any refresh watermark
+        Appointment.objects.update(updated_at=timezone.now() - timedelta(days=1))
+
+    def daily(self):
+        return {
+            row.day: (row.total, row.scheduled, row.completed, row.no_show)
+            for row in AppointmentDaily.objects.filter(doctor=self.doctor)
+        }
+
+    def test_refresh(self):
+        self.assertEqual(services.refresh('appointments'), 2)
+        self.assertEqual(self.daily(), {date(2024, 1, 22): (2, 1, 1, 0), date(2024, 1, 23): (1, 1, 0, 0)})
+        self.assertTrue(RollupWatermark.objects.filter(rollup='appointments').exists())
+
+        # Only the day of the changed appointment is recomputed
+        appointment = self.appointments[2]
+        appointment.status = 'no_show'
+        appointment.save()
+        self.assertEqual(services.refresh('appointments'), 1)
+        self.assertEqual(self.daily()[date(2024, 1, 23)], (1, 0, 0, 1))
+        # The 23rd is still within the watermark overlap, the 24th and 25th are recent
+        self.assertEqual(services.refresh('appointments', recent_days=2, today=date(2024, 1, 25)), 3)
+
+    def test_full_refresh_catches_untimestamped_changes(self):
+        services.refresh('appointments')
+        # Moved without touching updated_at: invisible to an incremental refresh
+        Appointment.objects.filter(appointment_date=date(2024, 1, 23)).update(appointment_date=date(2024, 1, 24))
+        RollupWatermark.objects.update(watermark=timezone.now())
+        services.refresh('appointments')
+        self.assertIn(date(2024, 1, 23), self.daily())
+
+        self.assertEqual(services.refresh('appointments', full=True), 3)
+        self.assertEqual(self.daily(), {date(2024, 1, 22): (2, 1, 1, 0), date(2024, 1, 24): (1, 1, 0, 0)})